@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+from collections import OrderedDict
+
+# Compare reclassifying historical queries one extraction call at a time with
+# extract_categories_and_zipcode_many, against a stub model with a fixed delay; runs fully offline
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'brightpoint', 'referral_chatbot'))
+import bedrockAgent
+import extractionCache
+from benchmark_extraction_cache import StubExtractionModel, load_categories, synthetic_queries, setup_offline
+
+def run(extract, queries, categories, call_delay, per_query_delay):
+    """
+    Classify the queries with a cold cache
+
+    Returns:
+        tuple: (model calls, queries sent to the model, wall-clock seconds)
+    """
+    model = StubExtractionModel(categories, call_delay, per_query_delay)
+    setup_offline(categories, model)
+    extractionCache._lru = OrderedDict()
+
+    start = time.perf_counter()
+    extract(queries)
+    return model.calls, model.queries, time.perf_counter() - start
+
+def benchmark_bulk_extraction(csv_file_path, query_count, distinct_count, call_delay, per_query_delay):
+    """
+    Reclassify a set of historical queries with one call per query, then in bulk
+    """
+    categories = load_categories(csv_file_path)
+    queries = synthetic_queries(categories, query_count, distinct_count)
+
+    print(f"{len(queries)} historical queries ({distinct_count} distinct questions, reworded), "
+          f"batches of {bedrockAgent.EXTRACTION_BATCH_SIZE} with {bedrockAgent.EXTRACTION_BATCH_CONCURRENCY} in flight")
+    print(f"Stub model: {call_delay * 1000:.0f} ms per request plus {per_query_delay * 1000:.0f} ms per query answered")
+    for label, extract in (("one call per query", lambda batch: [bedrockAgent.extract_categories_and_zipcode(query) for query in batch]),
+                           ("extract_many", bedrockAgent.extract_categories_and_zipcode_many)):
+        calls, model_queries, elapsed = run(extract, queries, categories, call_delay, per_query_delay)
+        print(f"  {label:<20} model calls {calls:>5} ({model_queries} queries sent), wall-clock {elapsed:.2f} s")
+
+if __name__ == "__main__":
+    # Define your variables here
+    csv_file_path = "ProviderReferralData.csv"
+    query_count = 5000
+    distinct_count = 5000
+    call_delay = 0.05
+    per_query_delay = 0.002
+
+    # Run the benchmark
+    benchmark_bulk_extraction(csv_file_path, query_count, distinct_count, call_delay, per_query_delay)
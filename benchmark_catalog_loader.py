@@ -0,0 +1,130 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+from decimal import Decimal
+
+# Compare the chatbot's two cold-start catalog paths, each in a fresh interpreter
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'brightpoint', 'referral_chatbot'))
+
+# DynamoDB returns Scan results in pages of up to 1 MB
+SCAN_PAGE_BYTES = 1024 * 1024
+
+def make_items(csv_file_path, row_count):
+    """
+    Build row_count referrals from the CSV's rows, each with its own referral_id and
+    a zip code spread over a thousand Illinois zips
+    """
+    from csv_to_ddb import clean_csv_row
+    import csv
+
+    with open(csv_file_path, 'r', encoding='utf-8') as file:
+        rows = [clean_csv_row(row) for row in csv.DictReader(file)]
+
+    items = []
+    for i in range(row_count):
+        item = dict(rows[i % len(rows)])
+        item['referral_id'] = f"referral-{i}"
+        item['id'] = f"item-{i}"
+        item['Service Area Zip Code'] = Decimal(60001 + i % 1000)
+        items.append(item)
+    return items
+
+def write_scan_pages(items, path):
+    """
+    Write items as the JSON Scan pages DynamoDB would send, one page per line
+    """
+    from boto3.dynamodb.types import TypeSerializer
+
+    serializer = TypeSerializer()
+    with open(path, 'w', encoding='utf-8') as output:
+        page = []
+        page_bytes = 0
+        for item in items:
+            wire_item = {key: serializer.serialize(value) for key, value in item.items()}
+            page.append(wire_item)
+            page_bytes += len(json.dumps(wire_item))
+            if page_bytes >= SCAN_PAGE_BYTES:
+                output.write(json.dumps({'Items': page}) + '\n')
+                page = []
+                page_bytes = 0
+        if page:
+            output.write(json.dumps({'Items': page}) + '\n')
+
+def current_rss_mb():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+def load_in_child(mode, path):
+    """
+    Runs in the child interpreter: load the catalog one way and report time and memory
+    """
+    from boto3.dynamodb.types import TypeDeserializer
+    import catalogIndex
+    import catalogSnapshot
+
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    if mode == 'scan':
+        # What the boto3 resource does with each page: parse the JSON, then deserialize every attribute
+        deserializer = TypeDeserializer()
+        items = []
+        with open(path, 'r', encoding='utf-8') as pages:
+            for line in pages:
+                for wire_item in json.loads(line)['Items']:
+                    items.append({key: deserializer.deserialize(value) for key, value in wire_item.items()})
+        index = catalogIndex.build_index_from_items(items)
+    else:
+        index = catalogIndex.build_index_from_snapshot(catalogSnapshot.CatalogSnapshot(path))
+    load_ms = (time.perf_counter() - start) * 1000
+
+    print(json.dumps({
+        "rows": index["item_count"],
+        "load_ms": load_ms,
+        "rss_added_mb": current_rss_mb() - rss_before
+    }))
+
+def run_child(mode, path):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode, path],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def benchmark_catalog_loader(csv_file_path, row_counts):
+    """
+    Time and measure the memory of building the catalog index from Scan pages and from a snapshot,
+    at several catalog sizes. The Scan path is measured without network time, which it also pays in Lambda.
+    """
+    from catalogSnapshot import write_catalog_snapshot
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        print("rows      path      cold load      RSS added")
+        for row_count in row_counts:
+            items = make_items(csv_file_path, row_count)
+            scan_path = os.path.join(work_dir, 'scan_pages.jsonl')
+            snapshot_path = os.path.join(work_dir, 'catalog_snapshot.bin')
+            write_scan_pages(items, scan_path)
+            write_catalog_snapshot(items, snapshot_path, catalog_version=1)
+
+            for mode, path in (('scan', scan_path), ('snapshot', snapshot_path)):
+                result = run_child(mode, path)
+                print(f"{row_count:<9} {mode:<9} {result['load_ms']:>9.1f} ms  {result['rss_added_mb']:>9.1f} MB")
+            print(f"{'':<9} snapshot file {os.path.getsize(snapshot_path) / (1024 * 1024):.1f} MB, "
+                  f"scan pages {os.path.getsize(scan_path) / (1024 * 1024):.1f} MB")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        load_in_child(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+
+    # Define your variables here
+    csv_file_path = "ProviderReferralData.csv"
+    row_counts = (1000, 10000, 100000)
+
+    # Run the benchmark
+    benchmark_catalog_loader(csv_file_path, row_counts)
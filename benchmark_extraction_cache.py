@@ -0,0 +1,183 @@
+import os
+import re
+import sys
+import csv
+import json
+import time
+import random
+import threading
+from collections import OrderedDict
+
+# Replay a query stream through the chatbot's extraction path with a stub model, to count the
+# Bedrock calls the extraction cache saves; runs fully offline
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'brightpoint', 'referral_chatbot'))
+import bedrockAgent
+import extractionCache
+import getServiceCategories
+import localExtractor
+
+QUERY_TEMPLATES = [
+    "where can i find {topic}",
+    "I need {topic} for my family",
+    "is there any {topic} near {zip}",
+    "who offers {topic} around {zip}?",
+    "my mom needs {topic}, can you help",
+    "looking for {topic} that is free",
+]
+
+# Ways users retype the same question, which the cache key normalizes away
+def variant(query, rng):
+    return rng.choice([query, query.capitalize(), query.upper(), query + "?", query.replace(" ", "  "), query + "!!"])
+
+class InMemoryTable:
+    """
+    Stands in for the extraction_cache table: GetItem and PutItem on a dict shared by every simulated container
+    """
+
+    def __init__(self):
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def get_item(self, Key):
+        with self.lock:
+            item = self.items.get(Key['cache_key'])
+        return {'Item': dict(item)} if item else {}
+
+    def put_item(self, Item):
+        with self.lock:
+            self.items[Item['cache_key']] = dict(Item)
+        return {}
+
+class StubExtractionModel:
+    """
+    Answers extraction prompts (single and batch) the way Bedrock would, after a fixed delay,
+    and counts the calls and the queries they carried
+    """
+
+    def __init__(self, categories, call_delay=0.0, per_query_delay=0.0):
+        self.categories = categories
+        self.call_delay = call_delay
+        self.per_query_delay = per_query_delay
+        self.calls = 0
+        self.queries = 0
+        self.lock = threading.Lock()
+
+    def answer(self, query):
+        lowered = query.lower()
+        zip_match = localExtractor.ZIP_PATTERN.search(query)
+        return {
+            "service_categories": [category for category in self.categories if category.split()[0].lower() in lowered],
+            "zipcode": zip_match.group(1) if zip_match else None
+        }
+
+    def __call__(self, prompt, max_tokens=1000):
+        if 'QUERIES:' in prompt:
+            queries = [json.loads(match) for match in re.findall(r'^\s*\d+\. (".*")$', prompt, re.MULTILINE)]
+            reply = {"results": [dict(self.answer(query), id=i) for i, query in enumerate(queries)]}
+        else:
+            queries = [re.search(r'User Query: "(.*)"', prompt).group(1)]
+            reply = self.answer(queries[0])
+        with self.lock:
+            self.calls += 1
+            self.queries += len(queries)
+        time.sleep(self.call_delay + self.per_query_delay * len(queries))
+        return json.dumps(reply)
+
+def load_categories(csv_file_path):
+    """
+    Service category names from the referral CSV the table is loaded from
+    """
+    with open(csv_file_path, 'r', encoding='utf-8-sig') as csvfile:
+        return sorted({(row.get('Service Category Type') or '').strip() for row in csv.DictReader(csvfile)} - {''})
+
+def synthetic_queries(categories, query_count, distinct_count, seed=0):
+    """
+    A query stream where a few questions are asked often and most rarely (Zipf-like),
+    each asked in slightly different wordings
+    """
+    rng = random.Random(seed)
+    distinct = []
+    for i in range(distinct_count):
+        topic = rng.choice(categories).lower()
+        distinct.append(rng.choice(QUERY_TEMPLATES).format(topic=topic, zip=60001 + i % 500))
+    weights = [1 / (rank + 1) for rank in range(distinct_count)]
+    return [variant(query, rng) for query in rng.choices(distinct, weights=weights, k=query_count)]
+
+def setup_offline(categories, model):
+    """
+    Point the extraction path at the stub model, a fixed category list and an in-memory shared tier.
+    The local extractor is turned off so every query needs the model or the cache.
+    """
+    getServiceCategories.getUniqueCategories = lambda: list(categories)
+    bedrockAgent.invoke_extraction_model = model
+    localExtractor.LOCAL_EXTRACTOR_MIN_CONFIDENCE = 2.0
+    extractionCache.extraction_cache_table = InMemoryTable()
+
+def replay(queries, categories, container_count, container_lifetime, use_memory, use_shared, seed=0):
+    """
+    Send the queries to container_count containers at random; each container is replaced
+    by a cold one after serving container_lifetime queries
+
+    Returns:
+        tuple: (model calls, cache counters, per-query extraction timings in ms)
+    """
+    rng = random.Random(seed)
+    model = StubExtractionModel(categories)
+    setup_offline(categories, model)
+    for counter in extractionCache.cache_stats:
+        extractionCache.cache_stats[counter] = 0
+    if not use_shared:
+        extractionCache.extraction_cache_table.get_item = lambda Key: {}
+    max_entries = extractionCache.EXTRACTION_CACHE_MAX_ENTRIES if use_memory else 0
+    extractionCache.EXTRACTION_CACHE_MAX_ENTRIES = max_entries
+
+    containers = [OrderedDict() for _ in range(container_count)]
+    served = [0] * container_count
+    timings = []
+    for query in queries:
+        slot = rng.randrange(container_count)
+        if served[slot] >= container_lifetime:
+            containers[slot] = OrderedDict()
+            served[slot] = 0
+        served[slot] += 1
+        extractionCache._lru = containers[slot]
+
+        start = time.perf_counter()
+        bedrockAgent.extract_categories_and_zipcode(query)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return model.calls, dict(extractionCache.cache_stats), timings
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def benchmark_extraction_cache(csv_file_path, query_count, distinct_count, container_count, container_lifetime):
+    """
+    Compare Bedrock calls with no cache, with only the per-container tier and with both tiers
+    """
+    categories = load_categories(csv_file_path)
+    queries = synthetic_queries(categories, query_count, distinct_count)
+    default_max_entries = extractionCache.EXTRACTION_CACHE_MAX_ENTRIES
+
+    print(f"{len(queries)} queries ({distinct_count} distinct questions, reworded), {len(categories)} categories, "
+          f"{container_count} containers replaced every {container_lifetime} queries")
+    print("The stub model answers instantly, so extraction times are the cache's own overhead")
+    for label, use_memory, use_shared in (("no cache", False, False), ("memory tier only", True, False),
+                                          ("memory + DynamoDB tiers", True, True)):
+        extractionCache.EXTRACTION_CACHE_MAX_ENTRIES = default_max_entries
+        calls, stats, timings = replay(queries, categories, container_count, container_lifetime, use_memory, use_shared)
+        print(f"  {label:<24} Bedrock calls {calls:>6} ({calls / len(queries):.1%} of queries), "
+              f"memory hits {stats['memory_hits']}, DynamoDB hits {stats['dynamodb_hits']}, evictions {stats['evictions']}, "
+              f"extraction p50 {percentile(timings, 0.5):.3f} ms")
+
+if __name__ == "__main__":
+    # Define your variables here
+    csv_file_path = "ProviderReferralData.csv"
+    query_count = 20000
+    distinct_count = 3000
+    container_count = 10
+    container_lifetime = 500
+
+    # Run the benchmark
+    benchmark_extraction_cache(csv_file_path, query_count, distinct_count, container_count, container_lifetime)
@@ -0,0 +1,95 @@
+import os
+import sys
+import csv
+import time
+import random
+
+# Measure the nearby zip search that ships with the chatbot Lambda; runs fully offline
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'brightpoint', 'referral_chatbot'))
+import nearbyZips
+from catalogSnapshot import CatalogSnapshot
+
+def load_catalog_keys(snapshot_path, csv_file_path):
+    """
+    Read the (category, zip) of every referral, from the catalog snapshot if there is one,
+    otherwise from the referral CSV the table is loaded from
+
+    Returns:
+        tuple: (list of (category, zip) pairs, where they were read from)
+    """
+    if snapshot_path and os.path.exists(snapshot_path):
+        snapshot = CatalogSnapshot(snapshot_path)
+        return [(snapshot.category(row), snapshot.zip_code(row)) for row in range(snapshot.row_count)], snapshot_path
+
+    keys = []
+    with open(csv_file_path, 'r', encoding='utf-8-sig') as csvfile:
+        for row in csv.DictReader(csvfile):
+            category = (row.get('Service Category Type') or '').strip()
+            try:
+                zip_code = int(float(row.get('Service Area Zip Code') or ''))
+            except ValueError:
+                zip_code = None
+            keys.append((category or None, zip_code))
+    return keys, csv_file_path
+
+def synthetic_queries(keys, centroids, query_count, seed=0):
+    """
+    Category + zip queries that the exact lookup can't answer: every category in the catalog,
+    asked about a zip with a centroid where that category has no services
+
+    Returns:
+        list: (category, zip) pairs
+    """
+    covered = {}
+    for category, zip_code in keys:
+        if category and zip_code is not None:
+            covered.setdefault(category, set()).add(zip_code)
+
+    queries = [(category, zip_code) for category in sorted(covered) for zip_code in sorted(centroids)
+               if zip_code not in covered[category]]
+    random.Random(seed).shuffle(queries)
+    return queries[:query_count], covered
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def benchmark_nearby_zips(snapshot_path, csv_file_path, query_count, radii):
+    """
+    Run a synthetic query set through find_nearby_zips and report how often a nearby
+    match would replace the Perplexity fallback
+    """
+    centroids = nearbyZips.load_zip_centroids()
+    if not centroids:
+        print(f"No zip centroids at {nearbyZips.ZIP_CENTROIDS_PATH}; run build_zip_centroids.py first")
+        sys.exit(1)
+
+    keys, source = load_catalog_keys(snapshot_path, csv_file_path)
+    queries, covered = synthetic_queries(keys, centroids, query_count)
+    if not queries:
+        print(f"No category has services in the catalog read from {source}")
+        sys.exit(1)
+
+    print(f"{len(keys)} referrals in {len(covered)} categories (from {source}), {len(centroids)} zip centroids")
+    print(f"{len(queries)} synthetic queries with no exact zip match; max {nearbyZips.NEARBY_ZIP_MAX_ZIPS} nearby zips")
+
+    for radius in radii:
+        hits = 0
+        timings = []
+        for category, zip_code in queries:
+            start = time.perf_counter()
+            nearby = nearbyZips.find_nearby_zips(zip_code, covered[category], radius_miles=radius)
+            timings.append((time.perf_counter() - start) * 1000)
+            hits += bool(nearby)
+        print(f"  {radius:>5.1f} miles: local hit rate {hits / len(queries):.1%} ({hits}/{len(queries)}), "
+              f"lookup p50 {percentile(timings, 0.5):.3f} ms, p95 {percentile(timings, 0.95):.3f} ms")
+
+if __name__ == "__main__":
+    # Define your variables here
+    snapshot_path = "brightpoint/referral_chatbot/catalog_snapshot.bin"   # Used when present
+    csv_file_path = "ProviderReferralData.csv"
+    query_count = 5000
+    radii = (5, 10, nearbyZips.NEARBY_ZIP_RADIUS_MILES, 25)
+
+    # Run the benchmark
+    benchmark_nearby_zips(snapshot_path, csv_file_path, query_count, radii)
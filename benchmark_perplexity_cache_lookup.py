@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+import random
+import hashlib
+from datetime import datetime
+
+# Compare a perplexity_query_cache lookup by filtered Scan (the old lookup) with a GetItem on the
+# derived key, as the table grows. Read costs follow DynamoDB's metering rules and are computed
+# from generated entries, so the benchmark runs offline; migrate_perplexity_cache_keys.py measures
+# GetItem latency on the live table.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'brightpoint', 'perplexity_lambda'))
+from lambda_function import cache_query_id, encode_cached_response
+from benchmark_referral_reads import item_size, read_cost, PAGE_BYTES, READ_UNIT_BYTES
+
+SERVICE_CATEGORIES = ["Food Pantry", "Housing Assistance", "Mental Health Services", "Childcare", "Legal Aid"]
+
+def make_cache_entry(i, rng):
+    """
+    A cache entry shaped like the ones store_query_in_dynamodb writes, for a generated query
+    """
+    category = rng.choice(SERVICE_CATEGORIES)
+    zipcode = str(60001 + rng.randrange(1000))
+    query = f"where can i find {category.lower()} help number {i}"
+    services = [{
+        "agency": f"{category} Agency {i}-{n}",
+        "phone": f"555-{rng.randrange(1000):03d}-{rng.randrange(10000):04d}",
+        "address": f"{rng.randrange(1, 9999)} Main St, Springfield, IL {zipcode}",
+        "website": f"https://agency-{i}-{n}.example.org",
+        "details": {
+            "service_category": category,
+            "hours": "Monday - Friday, 9:00 AM - 5:00 PM",
+            "eligibility": "Residents of the county; call ahead for documents to bring",
+            "referral_process": "Call to schedule an intake appointment",
+            "additional_information": f"Walk-ins accepted on {rng.choice(['Mondays', 'Wednesdays', 'Fridays'])}"
+        }
+    } for n in range(rng.randrange(3, 6))]
+    response_blob = encode_cached_response({
+        "message": f"Here are {category} services near {zipcode}.",
+        "service_categories": [category],
+        "services": services,
+        "zipcode": zipcode,
+        "language": "english"
+    })
+    now = int(time.time())
+    return {
+        "query_id": cache_query_id(query, zipcode),
+        "original_query": query,
+        "english_query": query,
+        "normalized_query": query,
+        "zipcode": zipcode,
+        "language": "english",
+        "language_code": "en",
+        "original_language": "english",
+        "original_language_code": "en",
+        "response_blob": response_blob,
+        "size_bytes": len(response_blob),
+        "timestamp": datetime.now().isoformat(),
+        "stored_at": now,
+        "stale_at": now,
+        "expires_at": now,
+        "hit_count": rng.randrange(50)
+    }
+
+def benchmark_perplexity_cache_lookup(table_sizes, lookup_count):
+    """
+    For each table size, report the requests, read units and hit rate of a lookup for a cached query
+    by single-page Scan (the old lookup), by paginated Scan, and by GetItem on the derived key
+    """
+    rng = random.Random(0)
+    entries = []
+    print("entries   table MB   | old Scan: requests  RCU    hit rate | full Scan: requests  RCU      | GetItem: requests  RCU")
+    for table_size in table_sizes:
+        entries.extend(make_cache_entry(i, rng) for i in range(len(entries), table_size))
+        # A Scan reads items in partition key hash order
+        sizes = [item_size(entry) for entry in sorted(entries, key=lambda entry: hashlib.md5(entry['query_id'].encode('utf-8')).digest())]
+
+        # The old lookup read one Scan page, so only queries cached in the first 1 MB could hit
+        first_page = 0
+        page_bytes = 0
+        for size in sizes:
+            if page_bytes + size > PAGE_BYTES:
+                break
+            page_bytes += size
+            first_page += 1
+        old_units = max(1, -(-page_bytes // READ_UNIT_BYTES)) * 0.5
+        full_requests, full_units = read_cost(sizes)
+
+        # A GetItem reads one item: half a unit per 4 KB, eventually consistent
+        lookups = rng.sample(entries, min(lookup_count, len(entries)))
+        get_units = sum(max(1, -(-item_size(entry) // READ_UNIT_BYTES)) * 0.5 for entry in lookups) / len(lookups)
+
+        print(f"{table_size:<9} {sum(sizes) / (1024 * 1024):>8.1f}   | {1:>17} {old_units:>6.1f} {first_page / len(sizes):>8.1%} "
+              f"| {full_requests:>18} {full_units:>8.1f} | {1:>16} {get_units:>5.2f}")
+
+if __name__ == "__main__":
+    # Define your variables here
+    table_sizes = (1000, 10000, 100000, 250000)
+    lookup_count = 1000
+
+    # Run the benchmark
+    benchmark_perplexity_cache_lookup(table_sizes, lookup_count)
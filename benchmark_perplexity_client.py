@@ -0,0 +1,145 @@
+import os
+import ssl
+import sys
+import json
+import time
+import shutil
+import tempfile
+import threading
+import subprocess
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_RESPONSE = json.dumps({"choices": [{"message": {"content": "**Stub Organization**\n- Phone: 555-123-4567"}}]}).encode('utf-8')
+
+class StubPerplexityHandler(BaseHTTPRequestHandler):
+    """
+    Answers every POST like the chat completions endpoint, keeping connections open.
+    The first `fail_first` requests get a 503, to exercise retries.
+    """
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this, delayed ACKs stall kept-alive responses
+    disable_nagle_algorithm = True
+    fail_first = 0
+    response_delay = 0.0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with StubPerplexityHandler.lock:
+            fail = StubPerplexityHandler.fail_first > 0
+            if fail:
+                StubPerplexityHandler.fail_first -= 1
+        if fail:
+            body = b'{"error": "overloaded"}'
+            self.send_response(503)
+        else:
+            time.sleep(StubPerplexityHandler.response_delay)
+            body = STUB_RESPONSE
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(cert_dir=None):
+    """
+    Start the stub server on a free local port, with TLS when a certificate can be generated
+
+    Returns:
+        tuple: (server, URL of the stub endpoint, SSL context trusting its certificate or None)
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubPerplexityHandler)
+    scheme = 'http'
+    client_context = None
+
+    if cert_dir and shutil.which('openssl'):
+        cert_file = os.path.join(cert_dir, 'cert.pem')
+        key_file = os.path.join(cert_dir, 'key.pem')
+        subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                        '-subj', '/CN=localhost', '-addext', 'subjectAltName=IP:127.0.0.1',
+                        '-keyout', key_file, '-out', cert_file],
+                       check=True, capture_output=True)
+        server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        server_context.load_cert_chain(cert_file, key_file)
+        server.socket = server_context.wrap_socket(server.socket, server_side=True)
+        client_context = ssl.create_default_context(cafile=cert_file)
+        scheme = 'https'
+    else:
+        print("openssl not found, benchmarking without TLS (TCP handshake savings only)")
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://127.0.0.1:{server.server_address[1]}/chat/completions", client_context
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def benchmark_perplexity_client(requests=200, response_delay=0.0):
+    """
+    Compare the pooled Perplexity client against a new connection per request
+    (how query_perplexity called urllib.request.urlopen before), against a local stub server.
+
+    Args:
+        requests (int): Requests per client
+        response_delay (float): Seconds the stub waits before answering
+    """
+    cert_dir = tempfile.mkdtemp()
+    try:
+        server, url, client_context = start_stub_server(cert_dir)
+        StubPerplexityHandler.response_delay = response_delay
+
+        # The client reads its endpoint when imported
+        os.environ['PERPLEXITY_API_URL'] = url
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'brightpoint', 'perplexity_lambda'))
+        import perplexity_client
+        if client_context:
+            perplexity_client.ssl_context = client_context
+
+        payload = {"model": "sonar-reasoning-pro", "messages": [{"role": "user", "content": "food pantry near 60601"}]}
+        headers = {"Authorization": "Bearer stub"}
+
+        new_connection_ms = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            request = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'),
+                                             headers=dict(headers, **{"Content-Type": "application/json"}), method="POST")
+            with urllib.request.urlopen(request, context=client_context) as response:
+                json.loads(response.read())
+            new_connection_ms.append((time.perf_counter() - start) * 1000)
+
+        pooled_ms = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            perplexity_client.post_json(payload, headers)
+            pooled_ms.append((time.perf_counter() - start) * 1000)
+
+        # A warm container: every request after the first reuses the connection
+        print(f"{requests} requests to {url}")
+        print(f"New connection per request: p50 {percentile(new_connection_ms, 0.5):.2f} ms, "
+              f"p95 {percentile(new_connection_ms, 0.95):.2f} ms")
+        print(f"Pooled client:              p50 {percentile(pooled_ms, 0.5):.2f} ms, "
+              f"p95 {percentile(pooled_ms, 0.95):.2f} ms (first request {pooled_ms[0]:.2f} ms)")
+        print(f"Saved per warm request:     {percentile(new_connection_ms, 0.5) - percentile(pooled_ms[1:], 0.5):.2f} ms at p50")
+
+        # Retries: the stub answers 503 twice, then succeeds
+        StubPerplexityHandler.fail_first = 2
+        start = time.perf_counter()
+        perplexity_client.post_json(payload, headers, deadline=time.time() + 30)
+        print(f"Request succeeding on the third attempt took {(time.perf_counter() - start) * 1000:.0f} ms (including backoff)")
+
+        perplexity_client.log_stats()
+        server.shutdown()
+    finally:
+        shutil.rmtree(cert_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    # Define your variables here
+    requests = 200
+    response_delay = 0.0   # Seconds; the real API takes several seconds, which the handshake saving is on top of
+
+    # Run the benchmark
+    benchmark_perplexity_client(requests, response_delay)
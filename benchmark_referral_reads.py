@@ -0,0 +1,125 @@
+import os
+import sys
+import math
+import random
+from decimal import Decimal
+
+# Compare the read capacity a filtered Scan and an index Query consume for the referral lookups
+# the chatbot and the referrals API make. Costs follow DynamoDB's metering rules and are computed
+# from the items themselves, so the benchmark runs offline at any table size.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'brightpoint', 'referral_chatbot'))
+from benchmark_catalog_loader import make_items
+
+CATEGORY_ATTRIBUTE = "Service Category Type"
+ZIP_ATTRIBUTE = "Service Area Zip Code"
+
+# A Scan or Query page reads at most 1 MB; eventually consistent reads cost half a unit per 4 KB
+PAGE_BYTES = 1024 * 1024
+READ_UNIT_BYTES = 4096
+
+def value_size(value):
+    """
+    Stored size of an attribute value, as DynamoDB counts it
+    """
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, bool) or value is None:
+        return 1
+    if isinstance(value, (int, float, Decimal)):
+        digits = len(str(abs(Decimal(value))).replace('.', '').lstrip('0')) or 1
+        return math.ceil(digits / 2) + 1
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return 3 + sum(len(key.encode('utf-8')) + value_size(item) + 1 for key, item in value.items())
+    if isinstance(value, (list, set, tuple)):
+        return 3 + sum(value_size(item) + 1 for item in value)
+    return len(str(value).encode('utf-8'))
+
+def item_size(item):
+    return sum(len(key.encode('utf-8')) + value_size(value) for key, value in item.items())
+
+def read_cost(sizes):
+    """
+    Requests and read units to read items of these sizes, in 1 MB pages
+
+    Returns:
+        tuple: (requests, read capacity units)
+    """
+    requests = 1
+    units = 0.0
+    page_bytes = 0
+    for size in sizes:
+        if page_bytes + size > PAGE_BYTES:
+            units += math.ceil(page_bytes / READ_UNIT_BYTES) * 0.5
+            requests += 1
+            page_bytes = 0
+        page_bytes += size
+    units += max(1, math.ceil(page_bytes / READ_UNIT_BYTES)) * 0.5
+    return requests, units
+
+def sample_lookups(items, lookup_count, seed=0):
+    """
+    Lookups the way the chatbot and the API make them, drawn from (category, zip) pairs
+    present in the table: half category + zip, half zip only
+
+    Returns:
+        list: (category or None, zip) pairs
+    """
+    pairs = sorted({(item[CATEGORY_ATTRIBUTE], int(item[ZIP_ATTRIBUTE])) for item in items
+                    if item.get(CATEGORY_ATTRIBUTE) and item.get(ZIP_ATTRIBUTE) is not None})
+    rng = random.Random(seed)
+    return [(category if i % 2 == 0 else None, zip_code)
+            for i, (category, zip_code) in enumerate(rng.choice(pairs) for _ in range(lookup_count))]
+
+def average(values):
+    return sum(values) / len(values)
+
+def benchmark_referral_reads(csv_file_path, row_counts, lookup_count):
+    """
+    For each table size, report the requests and read units of a full filtered Scan
+    and of the matching index Query for a sample of lookups
+    """
+    rng = random.Random(0)
+    print("rows      lookup           Scan requests  Scan RCU   Query requests  Query RCU  items returned")
+    for row_count in row_counts:
+        items = make_items(csv_file_path, row_count)
+        for item in items:
+            # Spread the repeated CSV rows over the zips at random, so zips mix categories
+            item[ZIP_ATTRIBUTE] = Decimal(60001 + rng.randrange(1000))
+        sizes = [item_size(item) for item in items]
+        # A Scan reads every item whatever the filter, so every lookup costs the same
+        scan_requests, scan_units = read_cost(sizes)
+
+        by_category_zip = {}
+        by_zip = {}
+        for item, size in zip(items, sizes):
+            zip_code = item.get(ZIP_ATTRIBUTE)
+            if zip_code is None:
+                continue
+            by_zip.setdefault(int(zip_code), []).append(size)
+            if item.get(CATEGORY_ATTRIBUTE):
+                by_category_zip.setdefault((item[CATEGORY_ATTRIBUTE], int(zip_code)), []).append(size)
+
+        lookups = sample_lookups(items, lookup_count)
+        for label, with_category in (("category + zip", True), ("zip only", False)):
+            costs = []
+            for category, zip_code in lookups:
+                if (category is not None) != with_category:
+                    continue
+                # The index projects every attribute, so a Query reads the same bytes per item as the table
+                matched = by_category_zip[(category, zip_code)] if with_category else by_zip[zip_code]
+                costs.append(read_cost(matched) + (len(matched),))
+            print(f"{row_count:<9} {label:<16} {scan_requests:>13} {scan_units:>9.1f} "
+                  f"{average([cost[0] for cost in costs]):>16.1f} {average([cost[1] for cost in costs]):>10.1f} "
+                  f"{average([cost[2] for cost in costs]):>15.1f}")
+        print(f"{'':<9} table size {sum(sizes) / (1024 * 1024):.1f} MB, average item {average(sizes):.0f} bytes")
+
+if __name__ == "__main__":
+    # Define your variables here
+    csv_file_path = "ProviderReferralData.csv"
+    row_counts = (10000, 100000)
+    lookup_count = 1000
+
+    # Run the benchmark
+    benchmark_referral_reads(csv_file_path, row_counts, lookup_count)
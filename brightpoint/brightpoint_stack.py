@@ -5,6 +5,8 @@ from aws_cdk import (
     aws_apigateway as apigateway,
     aws_apigatewayv2 as apigatewayv2,
     aws_iam as iam,
+    aws_events as events,
+    aws_events_targets as targets,
     CfnOutput,
     RemovalPolicy,
     Duration
@@ -40,6 +42,67 @@ class BrightpointStack(Stack):
             self, "query_analyticsTable", "query_analytics"
         )
 
+        # New DynamoDB tables
+
+        # Table: referral_catalog_metadata
+        # Holds the service category counts and catalog version the chatbot caches,
+        # kept current by referral writes
+        referral_catalog_metadata_table = dynamodb.Table(
+            self, 'ReferralCatalogMetadataTable',
+            table_name='referral_catalog_metadata',
+            partition_key=dynamodb.Attribute(name='metadata_key', type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=RemovalPolicy.RETAIN,
+        )
+
+        # Table: extraction_cache
+        # Bedrock category/zipcode extraction results shared across chatbot containers,
+        # expired through DynamoDB TTL
+        extraction_cache_table = dynamodb.Table(
+            self, 'ExtractionCacheTable',
+            table_name='extraction_cache',
+            partition_key=dynamodb.Attribute(name='cache_key', type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute='expires_at',
+            removal_policy=RemovalPolicy.RETAIN,
+        )
+
+        # Table: perplexity_semantic_index
+        # Query embeddings of cached Perplexity responses, partitioned by zipcode,
+        # for reusing a response when a query is worded differently
+        perplexity_semantic_index_table = dynamodb.Table(
+            self, 'PerplexitySemanticIndexTable',
+            table_name='perplexity_semantic_index',
+            partition_key=dynamodb.Attribute(name='zip_bucket', type=dynamodb.AttributeType.STRING),
+            sort_key=dynamodb.Attribute(name='query_id', type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=RemovalPolicy.RETAIN,
+        )
+
+        # Table: perplexity_inflight_requests
+        # Short-lived leases held by the Lambda calling Perplexity for a query, so concurrent
+        # requests for the same query wait for its response instead of calling Perplexity too
+        perplexity_inflight_requests_table = dynamodb.Table(
+            self, 'PerplexityInflightRequestsTable',
+            table_name='perplexity_inflight_requests',
+            partition_key=dynamodb.Attribute(name='query_id', type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute='expires_at',
+            removal_policy=RemovalPolicy.RETAIN,
+        )
+
+        # Table: translation_cache
+        # AWS Translate results shared by every Lambda using the shared layer's
+        # translation_cache module, expired through DynamoDB TTL
+        translation_cache_table = dynamodb.Table(
+            self, 'TranslationCacheTable',
+            table_name='translation_cache',
+            partition_key=dynamodb.Attribute(name='cache_key', type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute='expires_at',
+            removal_policy=RemovalPolicy.RETAIN,
+        )
+
         # DynamoDB Tables CDK Configuration for New Environment
 
         # Table: WebSocketConnections
@@ -57,6 +120,7 @@ class BrightpointStack(Stack):
         #     table_name='perplexity_query_cache',
         #     partition_key=dynamodb.Attribute(name='query_id', type=dynamodb.AttributeType.STRING),
         #     billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+        #     time_to_live_attribute='expires_at',
         #     removal_policy=RemovalPolicy.RETAIN,  # Change as needed
         # )
 
@@ -79,6 +143,20 @@ class BrightpointStack(Stack):
         #     removal_policy=RemovalPolicy.RETAIN,  # Change as needed
         # )
 
+        # Global Secondary Indexes for referral_data
+        # (for the imported table these are created by migrate_referral_indexes.py)
+        # referral_data_table.add_global_secondary_index(
+        #     index_name='ServiceCategory-Zip-index',
+        #     partition_key=dynamodb.Attribute(name='Service Category Type', type=dynamodb.AttributeType.STRING),
+        #     sort_key=dynamodb.Attribute(name='Service Area Zip Code', type=dynamodb.AttributeType.NUMBER),
+        #     projection_type=dynamodb.ProjectionType.ALL,
+        # )
+        # referral_data_table.add_global_secondary_index(
+        #     index_name='ServiceAreaZip-index',
+        #     partition_key=dynamodb.Attribute(name='Service Area Zip Code', type=dynamodb.AttributeType.NUMBER),
+        #     projection_type=dynamodb.ProjectionType.ALL,
+        # )
+
         # Table: user_data
         # user_data_table = dynamodb.Table(
         #     self, 'user_dataTable',
@@ -157,6 +235,74 @@ class BrightpointStack(Stack):
             self, "QueryAnalyticsStreamProcessorFn", "query-analytics-stream-processor"
         )
 
+        # Shared layer with modules used by several Lambdas (translation_cache, translation_engine,
+        # catalog_translations). Imported functions can't be given layers by the stack; attach its
+        # ARN to referralChatbotLambda, perplexityLambda, ProcessUserData and ReferralsApiHandler when it changes.
+        shared_layer = lambda_.LayerVersion(
+            self, "SharedLayer",
+            layer_version_name="brightpoint-shared",
+            code=lambda_.Code.from_asset("brightpoint/shared_layer"),
+            compatible_runtimes=[lambda_.Runtime.PYTHON_3_12],
+            description="Modules shared by the Brightpoint Lambda functions",
+            removal_policy=RemovalPolicy.RETAIN
+        )
+
+        # Daily eviction sweep keeping perplexity_query_cache within its size bounds
+        perplexity_cache_eviction_rule = events.Rule(
+            self, "PerplexityCacheEvictionRule",
+            schedule=events.Schedule.cron(minute="0", hour="8"),
+            targets=[targets.LambdaFunction(
+                perplexity_lambda_fn,
+                event=events.RuleTargetInput.from_object({"action": "evictCache"})
+            )]
+        )
+
+        # Imported functions don't get invoke permissions added automatically
+        lambda_.CfnPermission(
+            self, "PerplexityCacheEvictionPermission",
+            action="lambda:InvokeFunction",
+            function_name=perplexity_lambda_fn.function_name,
+            principal="events.amazonaws.com",
+            source_arn=perplexity_cache_eviction_rule.rule_arn
+        )
+
+        # Create cache-warmer Lambda role
+        cache_warmer_role = iam.Role(
+            self, "CacheWarmerRole",
+            role_name="cache-warmer-role",
+            assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
+            description="Role for Cache Warmer Lambda function"
+        )
+
+        # Add policies for cache-warmer role
+        self.add_cache_warmer_role_policies(cache_warmer_role, account_id)
+
+        # Create the cache-warmer function, which pre-populates the Perplexity cache, its
+        # translations and the extraction cache for the most common queries
+        cache_warmer_fn = lambda_.Function(
+            self, "CacheWarmerFn",
+            function_name="cache-warmer",
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            code=lambda_.Code.from_asset("brightpoint/cache_warmer"),
+            handler="lambda_function.lambda_handler",
+            role=cache_warmer_role,
+            timeout=Duration.seconds(900),  # 15 minutes
+            memory_size=512,
+            architecture=lambda_.Architecture.X86_64,
+            environment={
+                "CACHE_WARMER_TOP_N": "200",
+                "CACHE_WARMER_MAX_PERPLEXITY_CALLS": "50",
+                "CACHE_WARMER_CONCURRENCY": "4"
+            }
+        )
+
+        # Warm the caches off-peak, after the eviction sweep (09:00 UTC is early morning in Chicago)
+        events.Rule(
+            self, "CacheWarmerRule",
+            schedule=events.Schedule.cron(minute="0", hour="9"),
+            targets=[targets.LambdaFunction(cache_warmer_fn)]
+        )
+
 
         # Option to create new Lambda functions (commented out as we're using existing ones)
         """
@@ -258,6 +404,7 @@ class BrightpointStack(Stack):
             code=lambda_.Code.from_asset("brightpoint/referral_chatbot"),
             handler="referralChatbotLambda.lambda_handler",
             role=referral_chatbot_role,
+            layers=[shared_layer],
             timeout=Duration.seconds(900),  # 15 minutes
             memory_size=1024,
             architecture=lambda_.Architecture.X86_64
@@ -271,6 +418,7 @@ class BrightpointStack(Stack):
             code=lambda_.Code.from_asset("brightpoint/perplexity_lambda"),
             handler="lambda_function.lambda_handler",
             role=perplexity_lambda_role,
+            layers=[shared_layer],
             timeout=Duration.seconds(900),  # 15 minutes
             memory_size=2048,
             architecture=lambda_.Architecture.X86_64,
@@ -287,6 +435,7 @@ class BrightpointStack(Stack):
             code=lambda_.Code.from_asset("brightpoint/process_user_data"),
             handler="lambda_function.lambda_handler",
             role=process_user_data_role,
+            layers=[shared_layer],
             timeout=Duration.seconds(900),  # 15 minutes
             memory_size=1024,
             architecture=lambda_.Architecture.X86_64
@@ -313,9 +462,15 @@ class BrightpointStack(Stack):
             code=lambda_.Code.from_asset("brightpoint/referrals_api_handler"),
             handler="lambda_function.lambda_handler",
             role=referrals_api_handler_role,
+            layers=[shared_layer],
             timeout=Duration.seconds(300),  # 5 minutes
             memory_size=1024,
-            architecture=lambda_.Architecture.X86_64
+            architecture=lambda_.Architecture.X86_64,
+            environment={
+                # Same table the chatbot reads, so referral writes reach its catalog
+                "REFERRALS_TABLE_NAME": "referral_data",
+                "CATALOG_TABLE_NAME": "referral_data"
+            }
         )
         
         # Create the query-analytics-backfill function
@@ -582,6 +737,42 @@ class BrightpointStack(Stack):
             description="User Data Table Name (Imported)"
         )
 
+        CfnOutput(
+            self, "ReferralCatalogMetadataTableName",
+            value=referral_catalog_metadata_table.table_name,
+            description="Referral Catalog Metadata Table Name"
+        )
+
+        CfnOutput(
+            self, "ExtractionCacheTableName",
+            value=extraction_cache_table.table_name,
+            description="Bedrock Extraction Cache Table Name"
+        )
+
+        CfnOutput(
+            self, "PerplexitySemanticIndexTableName",
+            value=perplexity_semantic_index_table.table_name,
+            description="Perplexity Semantic Cache Index Table Name"
+        )
+
+        CfnOutput(
+            self, "PerplexityInflightRequestsTableName",
+            value=perplexity_inflight_requests_table.table_name,
+            description="Perplexity In-flight Request Lease Table Name"
+        )
+
+        CfnOutput(
+            self, "TranslationCacheTableName",
+            value=translation_cache_table.table_name,
+            description="Shared Translation Cache Table Name"
+        )
+
+        CfnOutput(
+            self, "SharedLayerArn",
+            value=shared_layer.layer_version_arn,
+            description="Shared Lambda Layer ARN (attach to referralChatbotLambda, perplexityLambda, ProcessUserData and ReferralsApiHandler)"
+        )
+
     def add_referral_chatbot_role_policies(self, role, account_id):
         """Add all necessary policies to the referralChatbotLambda role"""
 
@@ -617,11 +808,17 @@ class BrightpointStack(Stack):
                     "dynamodb:UpdateItem",
                     "dynamodb:DeleteItem",
                     "dynamodb:Query",
-                    "dynamodb:Scan"
+                    "dynamodb:Scan",
+                    "dynamodb:BatchGetItem",
+                    "dynamodb:BatchWriteItem"
                 ],
                 resources=[
                     f"arn:aws:dynamodb:us-east-1:{account_id}:table/referral_data",
-                    f"arn:aws:dynamodb:us-east-1:{account_id}:table/user_data"
+                    f"arn:aws:dynamodb:us-east-1:{account_id}:table/referral_data/index/*",
+                    f"arn:aws:dynamodb:us-east-1:{account_id}:table/user_data",
+                    f"arn:aws:dynamodb:us-east-1:{account_id}:table/referral_catalog_metadata",
+                    f"arn:aws:dynamodb:us-east-1:{account_id}:table/extraction_cache",
+                    f"arn:aws:dynamodb:us-east-1:{account_id}:table/translation_cache"
                 ]
             )
         )
@@ -698,6 +895,21 @@ class BrightpointStack(Stack):
             )
         )
 
+        # translation_cache reads and writes translations in batches
+        role.add_to_policy(
+            iam.PolicyStatement(
+                actions=[
+                    "dynamodb:GetItem",
+                    "dynamodb:PutItem",
+                    "dynamodb:BatchGetItem",
+                    "dynamodb:BatchWriteItem"
+                ],
+                resources=[
+                    f"arn:aws:dynamodb:us-east-1:{account_id}:table/translation_cache"
+                ]
+            )
+        )
+
         # Add DynamoDB permissions (full access from policy)
         role.add_to_policy(
             iam.PolicyStatement(
@@ -706,6 +918,30 @@ class BrightpointStack(Stack):
             )
         )
 
+        # Add permission to refresh stale cache entries in the background
+        role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["lambda:InvokeFunction"],
+                resources=[f"arn:aws:lambda:us-east-1:{account_id}:function:perplexityLambda"]
+            )
+        )
+
+        # Add permission to send streamed services to chatbot WebSocket connections
+        role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["execute-api:ManageConnections"],
+                resources=["arn:aws:execute-api:*:*:*/*/POST/@connections/*"]
+            )
+        )
+
+        # Add permission to embed queries for the semantic cache
+        role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["bedrock:InvokeModel"],
+                resources=["arn:aws:bedrock:us-east-1::foundation-model/amazon.titan-embed-text-v2:0"]
+            )
+        )
+
         # Add CloudWatch Logs permissions
         role.add_to_policy(
             iam.PolicyStatement(
@@ -754,6 +990,21 @@ class BrightpointStack(Stack):
             )
         )
 
+        # translation_cache reads and writes translations in batches
+        role.add_to_policy(
+            iam.PolicyStatement(
+                actions=[
+                    "dynamodb:GetItem",
+                    "dynamodb:PutItem",
+                    "dynamodb:BatchGetItem",
+                    "dynamodb:BatchWriteItem"
+                ],
+                resources=[
+                    f"arn:aws:dynamodb:us-east-1:{account_id}:table/translation_cache"
+                ]
+            )
+        )
+
         # Add DynamoDB permissions (full access from policy)
         role.add_to_policy(
             iam.PolicyStatement(
@@ -795,6 +1046,14 @@ class BrightpointStack(Stack):
     def add_query_analytics_backfill_role_policies(self, role, account_id):
         """Add all necessary policies to the query-analytics-backfill role"""
 
+        # Add permission to classify queries with the chatbot's bulk extraction
+        role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["lambda:InvokeFunction"],
+                resources=[f"arn:aws:lambda:us-east-1:{account_id}:function:referralChatbotLambda"]
+            )
+        )
+
         # Add Lambda basic execution with DynamoDB stream permissions
         role.add_to_policy(
             iam.PolicyStatement(
@@ -952,6 +1211,36 @@ class BrightpointStack(Stack):
             )
         )
 
+    def add_cache_warmer_role_policies(self, role, account_id):
+        """Add all necessary policies to the cache-warmer role"""
+
+        # Add Lambda basic execution
+        role.add_managed_policy(
+            iam.ManagedPolicy.from_aws_managed_policy_name("service-role/AWSLambdaBasicExecutionRole")
+        )
+
+        # Add permission to read query frequencies and cache entry lifetimes
+        role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["dynamodb:Scan", "dynamodb:GetItem"],
+                resources=[
+                    f"arn:aws:dynamodb:us-east-1:{account_id}:table/query_analytics",
+                    f"arn:aws:dynamodb:us-east-1:{account_id}:table/perplexity_query_cache"
+                ]
+            )
+        )
+
+        # Add permission to warm entries through the Perplexity and chatbot Lambdas
+        role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["lambda:InvokeFunction"],
+                resources=[
+                    f"arn:aws:lambda:us-east-1:{account_id}:function:perplexityLambda",
+                    f"arn:aws:lambda:us-east-1:{account_id}:function:referralChatbotLambda"
+                ]
+            )
+        )
+
     def add_query_analytics_api_role_policies(self, role, account_id):
         role.add_to_policy(
             iam.PolicyStatement(
@@ -1143,6 +1432,34 @@ class BrightpointStack(Stack):
             )
         )
 
+        # Referral text fields are translated at ingest through translation_cache
+        role.add_to_policy(
+            iam.PolicyStatement(
+                actions=[
+                    "dynamodb:GetItem",
+                    "dynamodb:PutItem",
+                    "dynamodb:BatchGetItem",
+                    "dynamodb:BatchWriteItem"
+                ],
+                resources=[
+                    f"arn:aws:dynamodb:us-east-1:{account_id}:table/translation_cache"
+                ]
+            )
+        )
+
+        # Referral writes bump the catalog version that chatbot containers reload on
+        role.add_to_policy(
+            iam.PolicyStatement(
+                actions=[
+                    "dynamodb:GetItem",
+                    "dynamodb:UpdateItem"
+                ],
+                resources=[
+                    f"arn:aws:dynamodb:us-east-1:{account_id}:table/referral_catalog_metadata"
+                ]
+            )
+        )
+
         # Add various AWS service permissions for DynamoDB operations
         role.add_to_policy(
             iam.PolicyStatement(
@@ -1313,7 +1630,19 @@ class BrightpointStack(Stack):
                     "dynamodb:Query",
                     "dynamodb:Scan"
                 ],
-                resources=[f"arn:aws:dynamodb:us-east-1:{account_id}:table/referral_data"]
+                resources=[
+                    f"arn:aws:dynamodb:us-east-1:{account_id}:table/referral_data",
+                    f"arn:aws:dynamodb:us-east-1:{account_id}:table/referral_data/index/*"
+                ]
+            )
+        )
+
+        # Add permission to translate referral text fields when referrals are written
+        role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=["translate:TranslateText", "translate:TranslateDocument"],
+                resources=["*"]
             )
         )
 
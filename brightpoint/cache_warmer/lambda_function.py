@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import hashlib
+import boto3
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Initialize clients
+dynamodb = boto3.resource('dynamodb', region_name="us-east-1")
+lambda_client = boto3.client('lambda', region_name="us-east-1")
+
+QUERY_ANALYTICS_TABLE = os.environ.get('QUERY_ANALYTICS_TABLE', 'query_analytics')
+PERPLEXITY_CACHE_TABLE = os.environ.get('PERPLEXITY_CACHE_TABLE', 'perplexity_query_cache')
+# Perplexity Lambda that refreshes entries and stores translations (its "warmCache" action)
+PERPLEXITY_LAMBDA_NAME = os.environ.get('PERPLEXITY_LAMBDA_NAME', 'perplexityLambda')
+# Chatbot Lambda that caches category extractions (its "extractMany" action)
+CHATBOT_LAMBDA_NAME = os.environ.get('CHATBOT_LAMBDA_NAME', 'referralChatbotLambda')
+# Most frequent (query, zipcode) pairs from query_analytics to warm
+CACHE_WARMER_TOP_N = int(os.environ.get('CACHE_WARMER_TOP_N', '200'))
+# Cache entries stored this recently (each one after a cache miss) and hit since are warmed too
+CACHE_WARMER_RECENT_DAYS = int(os.environ.get('CACHE_WARMER_RECENT_DAYS', '7'))
+# Entries that would go stale or expire within this long are refreshed now, rather than during the day
+CACHE_WARMER_LOOKAHEAD_SECONDS = int(os.environ.get('CACHE_WARMER_LOOKAHEAD_SECONDS', str(24 * 60 * 60)))
+# Spend cap: Perplexity calls per run
+CACHE_WARMER_MAX_PERPLEXITY_CALLS = int(os.environ.get('CACHE_WARMER_MAX_PERPLEXITY_CALLS', '50'))
+# Perplexity Lambda invocations running at once
+CACHE_WARMER_CONCURRENCY = int(os.environ.get('CACHE_WARMER_CONCURRENCY', '4'))
+# Translations to store on every warmed entry
+CACHE_WARMER_LANGUAGES = [code.strip() for code in os.environ.get('CACHE_WARMER_LANGUAGES', 'es,pl').split(',') if code.strip()]
+# Queries sent to the chatbot per extraction invocation
+CACHE_WARMER_EXTRACTION_CHUNK_SIZE = int(os.environ.get('CACHE_WARMER_EXTRACTION_CHUNK_SIZE', '500'))
+# Don't start warming another entry with less time than this left
+CACHE_WARMER_TIME_RESERVE_MS = int(os.environ.get('CACHE_WARMER_TIME_RESERVE_MS', '120000'))
+
+def lambda_handler(event, context):
+    """
+    Warm the caches for the most common queries during off-peak hours (run on a schedule).
+    Perplexity responses that are missing or would go stale during the day are fetched again,
+    up to CACHE_WARMER_MAX_PERPLEXITY_CALLS, and every warmed entry gets its translations.
+    The queries' category extractions are cached through the chatbot as well.
+
+    Expected input (all optional): {"top_n": 200, "max_perplexity_calls": 50}
+    """
+    top_n = int(event.get('top_n', CACHE_WARMER_TOP_N))
+    max_perplexity_calls = int(event.get('max_perplexity_calls', CACHE_WARMER_MAX_PERPLEXITY_CALLS))
+
+    stats = {"candidates": 0, "refreshed": 0, "translated": 0, "up_to_date": 0,
+             "over_budget": 0, "skipped_for_time": 0, "failed": 0, "extracted": 0}
+
+    try:
+        entries = load_cache_entries()
+        candidates = select_candidates(load_top_pairs(top_n), entries)
+        stats["candidates"] = len(candidates)
+
+        # Decide up front which candidates may call Perplexity, most frequent first
+        now = int(time.time())
+        tasks = []
+        budget = max_perplexity_calls
+        for query, zipcode, query_id in candidates:
+            refresh = needs_refresh(entries.get(query_id), now)
+            if refresh and budget <= 0:
+                stats["over_budget"] += 1
+                if query_id not in entries:
+                    continue
+                refresh = False
+            elif refresh:
+                budget -= 1
+            tasks.append((query, zipcode, refresh))
+
+        def run(task):
+            if context and context.get_remaining_time_in_millis() < CACHE_WARMER_TIME_RESERVE_MS:
+                return "skipped_for_time"
+            return warm_entry(*task)
+
+        with ThreadPoolExecutor(max_workers=CACHE_WARMER_CONCURRENCY) as executor:
+            for outcome in executor.map(run, tasks):
+                stats[outcome] += 1
+
+        stats["extracted"] = warm_extractions([query for query, _, _ in candidates])
+
+        logger.info(f"Cache warming finished: {stats}")
+        return {"statusCode": 200, "body": json.dumps({"stats": stats})}
+
+    except Exception as e:
+        logger.error(f"Error warming caches: {str(e)}")
+        return {"statusCode": 500, "body": json.dumps({"error": str(e), "stats": stats})}
+
+def normalize_zipcode(zipcode):
+    zipcode = str(zipcode).strip() if zipcode is not None else ''
+    return None if zipcode.lower() in ('', 'none', 'unknown') else zipcode
+
+def cache_query_id(user_query, zipcode=None):
+    """
+    perplexity_query_cache key for a query and zipcode; must match cache_query_id in perplexity_lambda
+    """
+    zipcode_value = zipcode if zipcode else "none"
+    return hashlib.sha256(f"{user_query.lower().strip()}|{zipcode_value}".encode('utf-8')).hexdigest()
+
+def scan_all(table, **scan_args):
+    items = []
+    while True:
+        response = table.scan(**scan_args)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        scan_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def load_top_pairs(top_n):
+    """
+    The most frequently asked (query, zipcode) pairs in query_analytics
+
+    Returns:
+        list: (query, zipcode, count), most frequent first
+    """
+    counts = {}
+    for item in scan_all(dynamodb.Table(QUERY_ANALYTICS_TABLE),
+                         ProjectionExpression='query_text, Zipcode, #c',
+                         ExpressionAttributeNames={'#c': 'count'}):
+        query = (item.get('query_text') or '').lower().strip()
+        if not query:
+            continue
+        key = (query, normalize_zipcode(item.get('Zipcode')))
+        counts[key] = counts.get(key, 0) + int(item.get('count', 0))
+
+    ranked = sorted(counts.items(), key=lambda pair: pair[1], reverse=True)[:top_n]
+    return [(query, zipcode, count) for (query, zipcode), count in ranked]
+
+def load_cache_entries():
+    """
+    Lifetimes and usage of every perplexity_query_cache entry, by query_id
+    """
+    items = scan_all(dynamodb.Table(PERPLEXITY_CACHE_TABLE),
+                     ProjectionExpression='query_id, english_query, normalized_query, zipcode, '
+                                          'stored_at, stale_at, expires_at, hit_count')
+    return {item['query_id']: item for item in items}
+
+def select_candidates(top_pairs, entries):
+    """
+    Queries to warm: the top query_analytics pairs, then queries that missed the cache
+    recently (their entries were stored in the last CACHE_WARMER_RECENT_DAYS days) and have been asked again since
+
+    Returns:
+        list: (query, zipcode, query_id), without duplicates
+    """
+    candidates = []
+    seen = set()
+
+    for query, zipcode, _ in top_pairs:
+        query_id = cache_query_id(query, zipcode)
+        if query_id not in seen:
+            seen.add(query_id)
+            candidates.append((query, zipcode, query_id))
+
+    recent_since = int(time.time()) - CACHE_WARMER_RECENT_DAYS * 24 * 60 * 60
+    recent = [entry for entry in entries.values()
+              if int(entry.get('stored_at', 0)) >= recent_since and int(entry.get('hit_count', 0)) > 0]
+    recent.sort(key=lambda entry: int(entry.get('hit_count', 0)), reverse=True)
+    for entry in recent:
+        query = entry.get('english_query') or entry.get('normalized_query')
+        if query and entry['query_id'] not in seen:
+            seen.add(entry['query_id'])
+            candidates.append((query, normalize_zipcode(entry.get('zipcode')), entry['query_id']))
+
+    return candidates
+
+def needs_refresh(entry, now):
+    """
+    Whether a cache entry is missing, or would go stale or expire before the next run
+    """
+    if entry is None:
+        return True
+    horizon = now + CACHE_WARMER_LOOKAHEAD_SECONDS
+    return any(not entry.get(field) or int(entry[field]) <= horizon for field in ('stale_at', 'expires_at'))
+
+def warm_entry(query, zipcode, refresh):
+    """
+    Have the Perplexity Lambda refresh an entry (when refresh is set) and store its translations
+
+    Returns:
+        str: The stats counter for the outcome
+    """
+    try:
+        response = lambda_client.invoke(
+            FunctionName=PERPLEXITY_LAMBDA_NAME,
+            InvocationType='RequestResponse',
+            Payload=json.dumps({
+                "action": "warmCache",
+                "user_query": query,
+                "zipcode": zipcode,
+                "refresh": refresh,
+                "languages": CACHE_WARMER_LANGUAGES
+            })
+        )
+        payload = json.loads(response['Payload'].read().decode('utf-8'))
+        if payload.get('statusCode') != 200:
+            logger.error(f"Warming '{query}' ({zipcode}) failed: {payload}")
+            return "failed"
+        body = json.loads(payload.get('body', '{}'))
+        if body.get('refreshed'):
+            return "refreshed"
+        return "translated" if body.get('translated') else "up_to_date"
+    except Exception as e:
+        logger.error(f"Error warming '{query}' ({zipcode}): {str(e)}")
+        return "failed"
+
+def warm_extractions(queries):
+    """
+    Cache the category extraction for each query through the chatbot's bulk extraction
+
+    Returns:
+        int: Queries extracted
+    """
+    extracted = 0
+    unique_queries = list(dict.fromkeys(queries))
+    for i in range(0, len(unique_queries), CACHE_WARMER_EXTRACTION_CHUNK_SIZE):
+        chunk = unique_queries[i:i + CACHE_WARMER_EXTRACTION_CHUNK_SIZE]
+        try:
+            response = lambda_client.invoke(
+                FunctionName=CHATBOT_LAMBDA_NAME,
+                InvocationType='RequestResponse',
+                Payload=json.dumps({"action": "extractMany", "queries": chunk})
+            )
+            payload = json.loads(response['Payload'].read().decode('utf-8'))
+            if payload.get('statusCode') == 200:
+                extracted += len(chunk)
+            else:
+                logger.error(f"Unexpected extraction response: {payload}")
+        except Exception as e:
+            logger.error(f"Error calling chatbot Lambda: {str(e)}")
+    return extracted
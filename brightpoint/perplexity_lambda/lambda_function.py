@@ -1,13 +1,28 @@
 import json
 import boto3
 import uuid
-import urllib.request
-import urllib.error
+from botocore.exceptions import ClientError
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, List, Optional, Tuple
 import os
 import re
 import copy
+import hashlib
+import time
+import zlib
+from decimal import Decimal
+import semantic_cache
+import perplexity_client
+
+try:
+    import translation_cache
+    import translation_engine
+    import message_catalog
+except ImportError:
+    # The shared layer isn't attached; Translate is called without caching, one text at a time
+    translation_cache = None
+    translation_engine = None
+    message_catalog = None
 
 # Initialize AWS clients with Lambda environment in mind
 def get_boto_clients():
@@ -18,7 +33,8 @@ def get_boto_clients():
         return {
             "dynamodb": session.resource("dynamodb", region_name="us-east-1"),
             "dynamodb_client": session.client('dynamodb', region_name="us-east-1"),
-            "translate": session.client('translate', region_name="us-east-1")  # Add AWS Translate client
+            "translate": session.client('translate', region_name="us-east-1"),  # Add AWS Translate client
+            "lambda": session.client('lambda', region_name="us-east-1")  # For background cache refreshes
         }
     except Exception as e:
         print(f"Error initializing AWS clients: {str(e)}")
@@ -29,12 +45,81 @@ clients = get_boto_clients()
 dynamodb = clients["dynamodb"]
 dynamodb_client = clients["dynamodb_client"]
 translate_client = clients["translate"]  # AWS Translate client
+lambda_client = clients["lambda"]
 query_cache_table = dynamodb.Table("perplexity_query_cache")  # Table to store Perplexity query results
 user_data_table = dynamodb.Table("user_data")  # For user history
+# Leases on queries being sent to Perplexity, so concurrent identical requests share one call
+inflight_table = dynamodb.Table(os.environ.get('PERPLEXITY_INFLIGHT_TABLE', 'perplexity_inflight_requests'))
+# API Gateway Management API clients for streaming to WebSocket connections, by endpoint
+websocket_clients = {}
 
-# Perplexity API configuration
+# Perplexity API configuration (connection settings are in perplexity_client)
 PERPLEXITY_API_KEY = os.environ.get('PERPLEXITY_API_KEY')
-PERPLEXITY_API_URL = "https://api.perplexity.ai/chat/completions"
+
+# Also scan for entries stored under random query_ids (before migrate_perplexity_cache_keys.py has run)
+PERPLEXITY_CACHE_SCAN_FALLBACK = os.environ.get('PERPLEXITY_CACHE_SCAN_FALLBACK', 'false').lower() == 'true'
+
+# Cached responses are deleted (through DynamoDB TTL on expires_at) this long after they're stored
+PERPLEXITY_CACHE_TTL_SECONDS = int(os.environ.get('PERPLEXITY_CACHE_TTL_SECONDS', str(30 * 24 * 60 * 60)))
+# After this long a cached response is still served, but refreshed from Perplexity in the background
+PERPLEXITY_CACHE_FRESH_SECONDS = int(os.environ.get('PERPLEXITY_CACHE_FRESH_SECONDS', str(7 * 24 * 60 * 60)))
+# How long one background refresh holds off others for the same entry
+PERPLEXITY_CACHE_REFRESH_LEASE_SECONDS = int(os.environ.get('PERPLEXITY_CACHE_REFRESH_LEASE_SECONDS', '300'))
+# Bounds the eviction sweep keeps the cache within
+PERPLEXITY_CACHE_MAX_ENTRIES = int(os.environ.get('PERPLEXITY_CACHE_MAX_ENTRIES', '5000'))
+PERPLEXITY_CACHE_MAX_BYTES = int(os.environ.get('PERPLEXITY_CACHE_MAX_BYTES', str(100 * 1024 * 1024)))
+
+# How long the Lambda calling Perplexity for a query holds it; others wait at most this long for its response
+PERPLEXITY_INFLIGHT_LEASE_SECONDS = int(os.environ.get('PERPLEXITY_INFLIGHT_LEASE_SECONDS', '60'))
+# Polling for the response starts this often and backs off to PERPLEXITY_INFLIGHT_POLL_MAX_SECONDS
+PERPLEXITY_INFLIGHT_POLL_SECONDS = float(os.environ.get('PERPLEXITY_INFLIGHT_POLL_SECONDS', '0.25'))
+PERPLEXITY_INFLIGHT_POLL_MAX_SECONDS = float(os.environ.get('PERPLEXITY_INFLIGHT_POLL_MAX_SECONDS', '2'))
+
+# Languages whose translations are kept on cache entries, as response_blob_<code> next to the English response_blob
+TRANSLATED_VARIANT_LANGUAGES = ('es', 'pl')
+
+# Translate calls that failed in this container; a translation that hit any is not cached
+translation_errors = 0
+
+def _json_default(obj):
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def encode_cached_response(response_data: Dict[str, Any]) -> bytes:
+    """
+    Compress a response for storage; one binary attribute costs far fewer read units than nested maps
+    """
+    return zlib.compress(json.dumps(response_data, default=_json_default, separators=(',', ':')).encode('utf-8'))
+
+def decode_cached_response(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Read the response from a cache entry, whether it's stored compressed or (older entries) as a map
+    """
+    if 'response_blob' in item:
+        blob = item['response_blob']
+        return json.loads(zlib.decompress(blob.value if hasattr(blob, 'value') else blob))
+    return item.get('response_data')
+
+def variant_attribute(language_code: str) -> str:
+    return f"response_blob_{language_code}"
+
+def normalize_cache_query(user_query: str) -> str:
+    return user_query.lower().strip()
+
+def cache_query_id(user_query: str, zipcode: Optional[str] = None) -> str:
+    """
+    Deterministic perplexity_query_cache key for a query and zipcode, so a lookup is a single GetItem
+
+    Args:
+        user_query (str): The user's query (in English)
+        zipcode (Optional[str]): User's zipcode
+
+    Returns:
+        str: Hex SHA-256 of the normalized query and zipcode
+    """
+    zipcode_value = zipcode if zipcode else "none"
+    return hashlib.sha256(f"{normalize_cache_query(user_query)}|{zipcode_value}".encode('utf-8')).hexdigest()
 
 def get_language_code(provided_language: str) -> str:
     """
@@ -81,11 +166,15 @@ def translate_text(text: str, source_language: str, target_language: str) -> str
     Returns:
         str: Translated text
     """
+    global translation_errors
     try:
         # If languages are the same, return the original text
         if source_language == target_language:
             return text
 
+        if translation_cache:
+            return translation_cache.translate(text, source_language, target_language, translate_client)
+
         response = translate_client.translate_text(
             Text=text,
             SourceLanguageCode=source_language,
@@ -94,6 +183,7 @@ def translate_text(text: str, source_language: str, target_language: str) -> str
 
         return response.get('TranslatedText', text)
     except Exception as e:
+        translation_errors += 1
         print(f"Error translating text: {str(e)}")
         return text  # Return original text if translation fails
 
@@ -115,13 +205,69 @@ def get_language_name(language_code: str) -> str:
 
     return language_map.get(language_code, 'english')
 
-def translate_response_content(response_data: Dict[str, Any], target_language_code: str) -> Dict[str, Any]:
+def services_message(language_code: str, service_category: str, zipcode: Optional[str] = None) -> str:
     """
-    Translate the content of a response to the target language
+    The message a response opens with ("Here are ... services in ..."), in the response's language
+
+    Args:
+        language_code (str): Language code of the response
+        service_category (str): The query's main service category
+        zipcode (Optional[str]): User's zipcode
+
+    Returns:
+        str: The message
+    """
+    if message_catalog:
+        if zipcode:
+            return message_catalog.get_message('services_found_in_zipcode', language_code,
+                                               service_category=service_category, zipcode=zipcode)
+        return message_catalog.get_message('services_found', language_code, service_category=service_category)
+
+    if language_code == 'es':
+        return f"Aquí están los servicios de {service_category}" + (f" en {zipcode}" if zipcode else "") + "."
+    if language_code == 'pl':
+        return f"Oto usługi {service_category}" + (f" w {zipcode}" if zipcode else "") + "."
+    return f"Here are {service_category} services" + (f" in {zipcode}" if zipcode else "") + "."
+
+def services_message_category(response_data: Dict[str, Any], language_code: str) -> Optional[str]:
+    """
+    The service category a response's message was made from by services_message, if it was
+    """
+    message = response_data.get('message')
+    categories = response_data.get('service_categories')
+    if not message or not isinstance(categories, list):
+        return None
+    for category in categories:
+        if isinstance(category, str) and message == services_message(language_code, category, response_data.get('zipcode')):
+            return category
+    return None
+
+# Fields of a service's details that are translated with the response
+TRANSLATED_DETAIL_FIELDS = ('service_category', 'additional_information', 'referral_process', 'hours', 'eligibility')
+
+def translate_many(texts: List[str], source_language: str, target_language: str) -> Dict[str, str]:
+    """
+    Translate many texts, batched through the shared layer's translation engine when it's attached
+
+    Returns:
+        Dict[str, str]: Translation of each text; texts that failed map to themselves
+    """
+    global translation_errors
+    if translation_engine:
+        translations, failed = translation_engine.translate_strings(texts, source_language, target_language, translate_client)
+        translation_errors += len(failed)
+        return translations
+    return {text: translate_text(text, source_language, target_language) for text in dict.fromkeys(texts)}
+
+def translate_response_content(response_data: Dict[str, Any], target_language_code: str, source_language_code: str = 'en') -> Dict[str, Any]:
+    """
+    Translate the content of a response to the target language. The message, categories and
+    service fields are collected first and translated together.
 
     Args:
         response_data (Dict[str, Any]): The response data
         target_language_code (str): Target language code
+        source_language_code (str): Language the response is in (default: 'en')
 
     Returns:
         Dict[str, Any]: Translated response data
@@ -129,103 +275,50 @@ def translate_response_content(response_data: Dict[str, Any], target_language_co
     try:
         # Make a deep copy to avoid modifying the original
         translated_response = copy.deepcopy(response_data)
-        source_language = 'en'  # Assume source is English
+        source_language = source_language_code
 
         # Update the language field
         target_language_name = get_language_name(target_language_code)
         translated_response['language'] = target_language_name
 
-        # Translate the message field
-        if 'message' in translated_response:
-            translated_response['message'] = translate_text(
-                translated_response['message'],
-                source_language,
-                target_language_code
-            )
-            print(f"Translated message: {translated_response['message']}")
+        # A message from the message catalog is made again in the target language, from the translated category
+        message_category = services_message_category(translated_response, source_language) if message_catalog else None
+
+        # (container, key) of every text to translate: the message, service categories,
+        # and each service's agency name and details
+        slots = []
+        if 'message' in translated_response and message_category is None:
+            slots.append((translated_response, 'message'))
 
-        # Translate service categories
         if 'service_categories' in translated_response and isinstance(translated_response['service_categories'], list):
-            translated_categories = []
-            for category in translated_response['service_categories']:
-                translated_category = translate_text(category, source_language, target_language_code)
-                translated_categories.append(translated_category)
-                print(f"Translated category: {category} -> {translated_category}")
-            translated_response['service_categories'] = translated_categories
-
-        # Translate service details
+            categories = translated_response['service_categories']
+            slots.extend((categories, i) for i in range(len(categories)))
+
         if 'services' in translated_response and isinstance(translated_response['services'], list):
             for service in translated_response['services']:
-                # Translate agency name
                 if 'agency' in service:
-                    original_agency = service['agency']
-                    service['agency'] = translate_text(
-                        original_agency,
-                        source_language,
-                        target_language_code
-                    )
-                    print(f"Translated agency: {original_agency} -> {service['agency']}")
-
-                # Translate service details
-                if 'details' in service:
-                    details = service['details']
-
-                    # Translate service category
-                    if 'service_category' in details:
-                        original_category = details['service_category']
-                        details['service_category'] = translate_text(
-                            original_category,
-                            source_language,
-                            target_language_code
-                        )
-                        print(f"Translated service category: {original_category} -> {details['service_category']}")
-
-                    # Translate additional information
-                    if 'additional_information' in details:
-                        original_info = details['additional_information']
-                        details['additional_information'] = translate_text(
-                            original_info,
-                            source_language,
-                            target_language_code
-                        )
-                        print(f"Translated additional info: {original_info[:30]}... -> {details['additional_information'][:30]}...")
-
-                    # Translate referral process
-                    if 'referral_process' in details:
-                        original_referral = details['referral_process']
-                        details['referral_process'] = translate_text(
-                            original_referral,
-                            source_language,
-                            target_language_code
-                        )
-                        print(f"Translated referral process: {original_referral} -> {details['referral_process']}")
-
-                    # Translate hours
-                    if 'hours' in details:
-                        original_hours = details['hours']
-                        details['hours'] = translate_text(
-                            original_hours,
-                            source_language,
-                            target_language_code
-                        )
-                        print(f"Translated hours: {original_hours} -> {details['hours']}")
-
-                    # Translate eligibility
-                    if 'eligibility' in details:
-                        original_eligibility = details['eligibility']
-                        details['eligibility'] = translate_text(
-                            original_eligibility,
-                            source_language,
-                            target_language_code
-                        )
-                        print(f"Translated eligibility: {original_eligibility} -> {details['eligibility']}")
+                    slots.append((service, 'agency'))
+                details = service.get('details')
+                if isinstance(details, dict):
+                    slots.extend((details, field) for field in TRANSLATED_DETAIL_FIELDS if field in details)
+
+        slots = [(container, key) for container, key in slots if isinstance(container[key], str) and container[key]]
+        translations = translate_many([container[key] for container, key in slots], source_language, target_language_code)
+        for container, key in slots:
+            container[key] = translations.get(container[key], container[key])
+        if message_category is not None:
+            translated_response['message'] = services_message(
+                target_language_code, translations.get(message_category, message_category), translated_response.get('zipcode')
+            )
+        print(f"Translated {len(slots)} response fields ({len(translations)} distinct texts) to {target_language_name}")
 
         return translated_response
     except Exception as e:
         print(f"Error translating response content: {str(e)}")
         return response_data  # Return original response if translation fails
 
-def query_perplexity(user_query: str, zipcode: Optional[str] = None, language: str = 'english') -> Dict[str, Any]:
+def query_perplexity(user_query: str, zipcode: Optional[str] = None, language: str = 'english', deadline: Optional[float] = None,
+                     parser: Optional['ServiceStreamParser'] = None, on_service: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
     """
     Query the Perplexity API with the user's query using structured instructions
 
@@ -233,6 +326,10 @@ def query_perplexity(user_query: str, zipcode: Optional[str] = None, language: s
         user_query (str): The user's query
         zipcode (Optional[str]): User's zipcode for location context
         language (str): Language to respond in
+        deadline (Optional[float]): Epoch seconds by which Perplexity must have responded
+        parser (Optional[ServiceStreamParser]): When given, the response is streamed through it,
+            and its services can be passed on to extract_meaningful_response
+        on_service (Optional[Callable]): Called with each service as soon as the parser completes it
 
     Returns:
         Dict[str, Any]: Response from Perplexity
@@ -312,32 +409,34 @@ When you don't know the answer to something, acknowledge it rather than making u
                 "max_tokens": 1500
             }
 
-            # Using urllib instead of requests
-            data = json.dumps(payload).encode('utf-8')
             headers = {
-                "Authorization": f"Bearer {PERPLEXITY_API_KEY}",
-                "Content-Type": "application/json",
-                "Accept": "application/json"  # Explicitly request JSON response
+                "Authorization": f"Bearer {PERPLEXITY_API_KEY}"
             }
 
             print(f"Trying model: {model}")
             print(f"API Key (first 4 chars): {PERPLEXITY_API_KEY[:4]}...")
             print(f"Requesting response in: {language}")
 
-            req = urllib.request.Request(PERPLEXITY_API_URL, data=data, headers=headers, method="POST")
-
-            with urllib.request.urlopen(req) as response:
-                response_data = response.read().decode('utf-8')
+            # Kept-alive connection, with retries and timeouts bounded by the deadline
+            if parser is None:
+                response_data = perplexity_client.post_json(payload, headers, deadline)
                 print(f"Successfully queried Perplexity using model: {model}")
-                return json.loads(response_data)
-
-        except urllib.error.HTTPError as e:
-            error_body = e.read().decode('utf-8')
-            print(f"Error with model {model}: {error_body}")
-            return {"error": f"API Error: {e.code} - {e.reason}. Details: {error_body}"}
-        except urllib.error.URLError as e:
-            print(f"URL Error: {e.reason}")
-            return {"error": f"URL Error: {e.reason}"}
+                return response_data
+
+            for delta in perplexity_client.post_stream(payload, headers, deadline):
+                for service in parser.feed(delta):
+                    if on_service:
+                        on_service(service)
+            for service in parser.finish():
+                if on_service:
+                    on_service(service)
+            print(f"Successfully streamed {len(parser.services)} services from Perplexity using model: {model}")
+            # Same shape as a non-streamed response
+            return {"choices": [{"message": {"role": "assistant", "content": parser.content}}]}
+
+        except perplexity_client.PerplexityAPIError as e:
+            print(f"Error with model {model}: {str(e)}")
+            return {"error": str(e)}
         except Exception as e:
             print(f"Error querying Perplexity API: {str(e)}")
             return {"error": str(e)}
@@ -346,7 +445,7 @@ When you don't know the answer to something, acknowledge it rather than making u
         print(f"Error in query_perplexity: {str(e)}")
         return {"error": str(e)}
 
-def store_query_in_dynamodb(user_query: str, original_query: str, response_data: Dict[str, Any], zipcode: Optional[str] = None, language: str = 'english', original_language_code: str = 'en') -> None:
+def store_query_in_dynamodb(user_query: str, original_query: str, response_data: Dict[str, Any], zipcode: Optional[str] = None, language: str = 'english', original_language_code: str = 'en') -> Optional[str]:
     """
     Store the query and its response in DynamoDB for future use
 
@@ -357,13 +456,16 @@ def store_query_in_dynamodb(user_query: str, original_query: str, response_data:
         zipcode (Optional[str]): User's zipcode
         language (str): Language name of the response
         original_language_code (str): Original language code
+
+    Returns:
+        Optional[str]: The stored entry's query_id, or None if it couldn't be stored
     """
     try:
-        # Generate a query_id for this entry
-        query_id = str(uuid.uuid4())
+        # The query_id is derived from the query and zipcode; asking again replaces the entry
+        query_id = cache_query_id(user_query, zipcode)
 
         # Create a normalized version of the query for easier matching
-        normalized_query = user_query.lower().strip()
+        normalized_query = normalize_cache_query(user_query)
         zipcode_value = zipcode if zipcode else "none"
 
         # Store English versions of response data in DynamoDB
@@ -371,74 +473,426 @@ def store_query_in_dynamodb(user_query: str, original_query: str, response_data:
         if original_language_code != 'en':
             # If the current response isn't in English, we need to create an English version for storage
             print("Creating English version of response for database storage")
-            english_response = translate_response_content(response_data, 'en')
+            english_response = translate_response_content(response_data, 'en', original_language_code)
             print("Created English version of response for storage")
 
-        # Store in DynamoDB
-        query_cache_table.put_item(
-            Item={
-                "query_id": query_id,
-                "original_query": original_query,
-                "english_query": user_query,
-                "normalized_query": normalized_query,
-                "zipcode": zipcode_value,
-                "language": "english",  # Always stored in English
-                "language_code": "en",  # Always stored in English
-                "original_language": language,  # Remember the original language
-                "original_language_code": original_language_code,  # Remember the original language code
-                "response_data": english_response,
-                "timestamp": datetime.now().isoformat()
-            }
+        response_blob = encode_cached_response(english_response)
+        now = int(time.time())
+        fields = {
+            "original_query": original_query,
+            "english_query": user_query,
+            "normalized_query": normalized_query,
+            "zipcode": zipcode_value,
+            "language": "english",  # Always stored in English
+            "language_code": "en",  # Always stored in English
+            "original_language": language,  # Remember the original language
+            "original_language_code": original_language_code,  # Remember the original language code
+            "response_blob": response_blob,
+            "size_bytes": len(response_blob),
+            "timestamp": datetime.now().isoformat(),
+            "stored_at": now,
+            "stale_at": now + PERPLEXITY_CACHE_FRESH_SECONDS,
+            "expires_at": now + PERPLEXITY_CACHE_TTL_SECONDS
+        }
+
+        # Translations of the previous response are dropped with it; the response Perplexity
+        # gave in the user's language is kept as that language's translation
+        removed = ["response_data", "refresh_lease_until"]
+        for code in TRANSLATED_VARIANT_LANGUAGES:
+            if code == original_language_code:
+                variant_blob = encode_cached_response(response_data)
+                fields[variant_attribute(code)] = variant_blob
+                fields["size_bytes"] += len(variant_blob)
+            else:
+                removed.append(variant_attribute(code))
+
+        # Store in DynamoDB. Replacing an entry (a refresh, or the same question asked
+        # again) keeps its hit count, which the eviction sweep relies on.
+        query_cache_table.update_item(
+            Key={"query_id": query_id},
+            UpdateExpression="SET " + ", ".join(f"#f{i} = :f{i}" for i in range(len(fields))) +
+                             ", hit_count = if_not_exists(hit_count, :zero) REMOVE " + ", ".join(removed),
+            ExpressionAttributeNames={f"#f{i}": name for i, name in enumerate(fields)},
+            ExpressionAttributeValues=dict({f":f{i}": value for i, value in enumerate(fields.values())}, **{":zero": 0})
         )
         print(f"Successfully stored query and response with ID {query_id}")
+        return query_id
 
     except Exception as e:
         print(f"Error storing query in DynamoDB: {str(e)}")
+        return None
 
-def query_dynamodb_for_cached_response(user_query: str, zipcode: Optional[str] = None, language_code: str = 'en') -> Optional[Dict[str, Any]]:
+def get_cached_response_by_id(query_id: str, user_id: str = '', language_code: str = 'en',
+                              on_missing: Optional[Callable[[], None]] = None) -> Optional[Dict[str, Any]]:
     """
-    Check if a similar query exists in DynamoDB cache, and filter by BOTH query AND zipcode.
-    Only returns a cached response when BOTH query and zipcode match exactly.
+    Read a cached response by its query_id, in the requested language.
+    A response past its stale_at is still returned, and a background refresh is started for it.
 
     Args:
-        user_query (str): The user's query (in English)
-        zipcode (Optional[str]): User's zipcode for location context
+        query_id (str): The cache entry's query_id
+        user_id (str): User the response is for (used for referral tracking if it's refreshed)
         language_code (str): Language code for the response
+        on_missing (Optional[Callable]): Called when the entry doesn't exist or has expired
+            (not when it couldn't be read)
 
     Returns:
-        Optional[Dict[str, Any]]: Cached response if found, None otherwise
+        Optional[Dict[str, Any]]: The cached response, or None if it doesn't exist or has expired
     """
     try:
-        # Normalize the query
-        normalized_query = user_query.lower().strip()
-        zipcode_value = zipcode if zipcode else "none"
+        item = query_cache_table.get_item(Key={"query_id": query_id}).get('Item')
+        now = int(time.time())
+        # TTL deletion can lag by up to a couple of days, so check expiry here too
+        if item and item.get('expires_at') and int(item['expires_at']) <= now:
+            print(f"Cached response {query_id} has expired")
+            item = None
+        if not item:
+            if on_missing:
+                on_missing()
+            return None
+
+        cached_response = get_cached_variant(item, language_code)
+
+        query_cache_table.update_item(
+            Key={"query_id": query_id},
+            UpdateExpression="SET last_hit_at = :now ADD hit_count :one",
+            ExpressionAttributeValues={":now": now, ":one": 1}
+        )
 
-        print(f"Looking for cached response with query: '{normalized_query}', zipcode: '{zipcode_value}'")
+        # Entries stored before stale_at existed are refreshed into the current format too
+        if not item.get('stale_at') or int(item['stale_at']) <= now:
+            schedule_cache_refresh(item, user_id, now)
 
-        # Scan the table for a matching query + zipcode (looking only for English responses which we'll translate later)
-        # IMPORTANT: Only return a match when BOTH query and zipcode match
-        filter_expression = "normalized_query = :query AND zipcode = :zip"
-        expression_values = {
-            ":query": normalized_query,
-            ":zip": zipcode_value
-        }
+        return cached_response
+    except Exception as e:
+        print(f"Error reading cached response {query_id}: {str(e)}")
+        return None
 
-        response = query_cache_table.scan(
-            FilterExpression=filter_expression,
-            ExpressionAttributeValues=expression_values
+def get_cached_variant(item: Dict[str, Any], language_code: str) -> Optional[Dict[str, Any]]:
+    """
+    The response on a cache entry in the requested language. A language without a stored
+    translation is translated from English once and saved on the entry, so later hits
+    don't call Translate at all.
+
+    Args:
+        item (Dict[str, Any]): The perplexity_query_cache entry
+        language_code (str): Language code for the response
+
+    Returns:
+        Optional[Dict[str, Any]]: The response in the requested language
+    """
+    if language_code == 'en':
+        return decode_cached_response(item)
+
+    attribute = variant_attribute(language_code)
+    if attribute in item:
+        print(f"Using stored {get_language_name(language_code)} translation of cached response {item['query_id']}")
+        return decode_cached_response({'response_blob': item[attribute]})
+
+    english_response = decode_cached_response(item)
+    if english_response is None or language_code not in TRANSLATED_VARIANT_LANGUAGES:
+        return translate_response_content(english_response, language_code) if english_response else None
+
+    print(f"Translating cached response from English to {get_language_name(language_code)}")
+    errors_before = translation_errors
+    translated_response = translate_response_content(english_response, language_code)
+    if translation_errors != errors_before or translated_response is english_response:
+        # Don't keep a translation that fell back to English anywhere
+        return translated_response
+
+    try:
+        variant_blob = encode_cached_response(translated_response)
+        # Only attach it to the response it was translated from, not one a refresh has since replaced
+        query_cache_table.update_item(
+            Key={"query_id": item['query_id']},
+            UpdateExpression="SET #variant = :blob ADD size_bytes :size",
+            ConditionExpression="attribute_exists(query_id) AND "
+                                + ("stored_at = :stored_at" if 'stored_at' in item else "attribute_not_exists(stored_at)"),
+            ExpressionAttributeNames={"#variant": attribute},
+            ExpressionAttributeValues=dict(
+                {":blob": variant_blob, ":size": len(variant_blob)},
+                **({":stored_at": item['stored_at']} if 'stored_at' in item else {})
+            )
+        )
+        print(f"Stored {get_language_name(language_code)} translation of cached response {item['query_id']}")
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            print(f"Cached response {item['query_id']} changed while translating, translation not stored")
+        else:
+            print(f"Error storing translation of {item['query_id']}: {str(e)}")
+    except Exception as e:
+        print(f"Error storing translation of {item['query_id']}: {str(e)}")
+
+    return translated_response
+
+def schedule_cache_refresh(item: Dict[str, Any], user_id: str, now: int) -> None:
+    """
+    Refresh a stale cache entry in the background by invoking this function asynchronously.
+    A lease on the entry keeps concurrent hits from starting more than one refresh.
+    """
+    query_id = item['query_id']
+    try:
+        query_cache_table.update_item(
+            Key={"query_id": query_id},
+            UpdateExpression="SET refresh_lease_until = :lease",
+            ConditionExpression="attribute_not_exists(refresh_lease_until) OR refresh_lease_until < :now",
+            ExpressionAttributeValues={":lease": now + PERPLEXITY_CACHE_REFRESH_LEASE_SECONDS, ":now": now}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            print(f"Cached response {query_id} is already being refreshed")
+        else:
+            print(f"Error claiming refresh for {query_id}: {str(e)}")
+        return
+
+    try:
+        lambda_client.invoke(
+            FunctionName=os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'perplexityLambda'),
+            InvocationType='Event',
+            Payload=json.dumps({
+                "action": "refreshCache",
+                "user_query": item.get('english_query') or item.get('normalized_query'),
+                "original_query": item.get('original_query') or item.get('english_query'),
+                "zipcode": None if item.get('zipcode') in (None, "none") else item['zipcode'],
+                "user_id": user_id
+            })
+        )
+        print(f"Started background refresh of cached response {query_id}")
+    except Exception as e:
+        print(f"Error starting refresh for {query_id}: {str(e)}")
+
+def refresh_cached_response(event: Dict[str, Any], deadline: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Re-run a cached query against Perplexity and replace its cache entry (invoked by schedule_cache_refresh)
+    """
+    user_query = event.get('user_query')
+    zipcode = event.get('zipcode')
+    if not user_query:
+        return {"statusCode": 400, "body": json.dumps({"status": "error", "message": "user_query parameter is required"})}
+
+    perplexity_start = time.time()
+    perplexity_response = query_perplexity(user_query, zipcode, 'english', deadline)
+    semantic_cache.record_perplexity((time.time() - perplexity_start) * 1000)
+    if "error" in perplexity_response:
+        # The lease runs out and the next stale hit tries again
+        print(f"Refresh failed: {perplexity_response['error']}")
+        return {"statusCode": 500, "body": json.dumps({"status": "error", "message": perplexity_response['error']})}
+
+    formatted_response = extract_meaningful_response(perplexity_response, 'english', zipcode, user_query, event.get('user_id', ''))
+    query_id = store_query_in_dynamodb(user_query, event.get('original_query') or user_query, formatted_response, zipcode, 'english', 'en')
+    return {"statusCode": 200, "body": json.dumps({"status": "success", "query_id": query_id})}
+
+def warm_cached_response(event: Dict[str, Any], deadline: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Make sure a query's cache entry is fresh and has its translations (invoked by the cache-warmer Lambda)
+
+    Expected input:
+    {
+        "action": "warmCache",
+        "user_query": "food pantry",   the query in English
+        "zipcode": "60601",            optional
+        "refresh": true,               query Perplexity and replace the entry first
+        "languages": ["es", "pl"]      translations to store if the entry doesn't have them yet
+    }
+    """
+    user_query = event.get('user_query')
+    zipcode = event.get('zipcode')
+    if not user_query:
+        return {"statusCode": 400, "body": json.dumps({"status": "error", "message": "user_query parameter is required"})}
+
+    refreshed = False
+    if event.get('refresh'):
+        result = refresh_cached_response(event, deadline)
+        if result["statusCode"] != 200:
+            return result
+        refreshed = True
+
+    query_id = cache_query_id(user_query, zipcode)
+    item = query_cache_table.get_item(Key={"query_id": query_id}).get('Item')
+    if not item:
+        return {"statusCode": 404, "body": json.dumps({"status": "error", "message": f"No cache entry {query_id}"})}
+
+    translated = []
+    for code in event.get('languages') or TRANSLATED_VARIANT_LANGUAGES:
+        if code in TRANSLATED_VARIANT_LANGUAGES and variant_attribute(code) not in item:
+            get_cached_variant(item, code)
+            translated.append(code)
+
+    return {"statusCode": 200, "body": json.dumps({"query_id": query_id, "refreshed": refreshed, "translated": translated})}
+
+def evict_cache_entries() -> Dict[str, Any]:
+    """
+    Scheduled sweep keeping perplexity_query_cache within PERPLEXITY_CACHE_MAX_ENTRIES and
+    PERPLEXITY_CACHE_MAX_BYTES. Expired entries go first, then those with the fewest hits
+    per day since they were last used, weighted by size so large, rarely used responses go before small ones.
+    """
+    now = int(time.time())
+    entries = []
+    scan_args = {
+        'ProjectionExpression': "query_id, zipcode, size_bytes, hit_count, last_hit_at, stored_at, expires_at"
+    }
+    while True:
+        response = query_cache_table.scan(**scan_args)
+        entries.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def size_of(entry):
+        # Older entries without size_bytes are counted at a typical compressed size
+        return int(entry.get('size_bytes', 4096))
+
+    def priority(entry):
+        if entry.get('expires_at') and int(entry['expires_at']) <= now:
+            return -1.0
+        last_used = int(entry.get('last_hit_at') or entry.get('stored_at') or 0)
+        idle_days = max(now - last_used, 0) / 86400
+        return (int(entry.get('hit_count', 0)) + 1) / (idle_days + 1) / (size_of(entry) / 1024 + 1)
+
+    entries.sort(key=priority)
+    total_bytes = sum(size_of(entry) for entry in entries)
+    remaining = len(entries)
+    evicted = 0
+
+    with query_cache_table.batch_writer() as batch:
+        for entry in entries:
+            expired = priority(entry) < 0
+            if not expired and remaining <= PERPLEXITY_CACHE_MAX_ENTRIES and total_bytes <= PERPLEXITY_CACHE_MAX_BYTES:
+                break
+            batch.delete_item(Key={"query_id": entry['query_id']})
+            semantic_cache.remove(entry.get('zipcode'), entry['query_id'])
+            remaining -= 1
+            total_bytes -= size_of(entry)
+            evicted += 1
+
+    print(f"Cache eviction: removed {evicted} of {len(entries)} entries, {remaining} left ({total_bytes} bytes)")
+    return {"statusCode": 200, "body": json.dumps({"evicted": evicted, "remaining": remaining, "bytes": total_bytes})}
+
+def acquire_inflight_lease(query_id: str) -> Optional[str]:
+    """
+    Become the one Lambda calling Perplexity for this query, unless another already holds a live lease
+
+    Args:
+        query_id (str): The query's cache key
+
+    Returns:
+        Optional[str]: A lease token to release once the response is cached, or None if another
+        Lambda holds the lease. "" when the lease table can't be reached (call Perplexity without one).
+    """
+    now = int(time.time())
+    lease_token = str(uuid.uuid4())
+    try:
+        inflight_table.put_item(
+            Item={
+                "query_id": query_id,
+                "lease_token": lease_token,
+                "expires_at": now + PERPLEXITY_INFLIGHT_LEASE_SECONDS,
+                "created_at": datetime.now().isoformat()
+            },
+            ConditionExpression="attribute_not_exists(query_id) OR expires_at < :now",
+            ExpressionAttributeValues={":now": now}
         )
+        return lease_token
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return None
+        print(f"Error taking in-flight lease for {query_id}: {str(e)}")
+        return ""
+    except Exception as e:
+        print(f"Error taking in-flight lease for {query_id}: {str(e)}")
+        return ""
+
+def release_inflight_lease(query_id: str, lease_token: Optional[str]) -> None:
+    """
+    Drop a lease taken by acquire_inflight_lease, if this Lambda still holds it
+    """
+    if not lease_token:
+        return
+    try:
+        inflight_table.delete_item(
+            Key={"query_id": query_id},
+            ConditionExpression="lease_token = :token",
+            ExpressionAttributeValues={":token": lease_token}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            print(f"Error releasing in-flight lease for {query_id}: {str(e)}")
+    except Exception as e:
+        print(f"Error releasing in-flight lease for {query_id}: {str(e)}")
+
+def coalesce_perplexity_request(query_id: str, language_code: str = 'en', user_id: str = '', deadline: Optional[float] = None) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Single-flight for Perplexity calls: the first request for a query takes a lease and calls
+    Perplexity; concurrent requests for the same query poll the cache for its response instead.
+    A waiting request calls Perplexity itself if the lease is released or expires without a
+    cached response (the leader failed), or if the deadline comes first.
+
+    Args:
+        query_id (str): The query's cache key
+        language_code (str): Language code for the response
+        user_id (str): User the response is for
+        deadline (Optional[float]): Epoch seconds after which waiting is pointless
+
+    Returns:
+        Tuple: The leader's cached response (with no lease), or None and the lease token
+        to release after calling Perplexity (None or "" when calling without a lease)
+    """
+    wait_start = time.time()
+    # A second round covers a leader that failed: the lease is taken over and Perplexity called
+    for _ in range(2):
+        lease_token = acquire_inflight_lease(query_id)
+        if lease_token is not None:
+            return None, lease_token
+
+        print(f"Perplexity is already being queried for {query_id}, waiting for its response")
+        interval = PERPLEXITY_INFLIGHT_POLL_SECONDS
+        while deadline is None or time.time() + interval < deadline:
+            time.sleep(interval)
+            interval = min(interval * 1.5, PERPLEXITY_INFLIGHT_POLL_MAX_SECONDS)
+
+            cached_response = get_cached_response_by_id(query_id, user_id, language_code)
+            if cached_response:
+                print(f"Reused in-flight Perplexity response for {query_id} after {(time.time() - wait_start) * 1000:.0f} ms")
+                return cached_response, None
+
+            lease = inflight_table.get_item(Key={"query_id": query_id}).get('Item')
+            if not lease or int(lease['expires_at']) < time.time():
+                print(f"In-flight lease for {query_id} ended without a cached response")
+                break
+        else:
+            print(f"Deadline reached waiting for the in-flight request for {query_id}")
+            return None, None
+
+    return None, None
+
+def query_dynamodb_for_cached_response(user_query: str, zipcode: Optional[str] = None, language_code: str = 'en', user_id: str = '') -> Optional[Dict[str, Any]]:
+    """
+    Check if this query exists in the DynamoDB cache for the same zipcode.
+    Only returns a cached response when BOTH query and zipcode match exactly.
+
+    Args:
+        user_query (str): The user's query (in English)
+        zipcode (Optional[str]): User's zipcode for location context
+        language_code (str): Language code for the response
+        user_id (str): User the response is for
+
+    Returns:
+        Optional[Dict[str, Any]]: Cached response if found, None otherwise
+    """
+    try:
+        query_id = cache_query_id(user_query, zipcode)
+        print(f"Looking for cached response {query_id} (query: '{normalize_cache_query(user_query)}', zipcode: '{zipcode if zipcode else 'none'}')")
 
-        items = response.get('Items', [])
-        if items:
-            print(f"Found match with BOTH query and zipcode. Will translate response if needed.")
-            # Return the most recent match
-            items.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
-            cached_response = items[0].get('response_data')
+        cached_response = get_cached_response_by_id(query_id, user_id, language_code)
+        if cached_response:
+            print("Found match with BOTH query and zipcode.")
+            return cached_response
 
-            # The cached response is in English - we'll translate it in the lambda handler
+        if PERPLEXITY_CACHE_SCAN_FALLBACK:
+            cached_response = scan_for_cached_response(user_query, zipcode)
+            if cached_response and language_code != 'en':
+                return translate_response_content(cached_response, language_code)
             return cached_response
 
-        # If no match found with both query and zipcode, return None - no fallback to query-only matching
         print("No exact match with both query and zipcode. No cached response will be returned.")
         return None
 
@@ -446,7 +900,232 @@ def query_dynamodb_for_cached_response(user_query: str, zipcode: Optional[str] =
         print(f"Error querying DynamoDB for cached response: {str(e)}")
         return None
 
-def extract_meaningful_response(perplexity_response: Dict[str, Any], language: str = 'english', zipcode: Optional[str] = None, user_query: str = '', user_id: str = '') -> Dict[str, Any]:
+def scan_for_cached_response(user_query: str, zipcode: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Find a cache entry stored under a random query_id by scanning the whole table.
+    Only used while PERPLEXITY_CACHE_SCAN_FALLBACK is on, until existing entries are migrated.
+
+    Returns:
+        Optional[Dict[str, Any]]: The most recent matching response, or None
+    """
+    scan_args = {
+        'FilterExpression': "normalized_query = :query AND zipcode = :zip",
+        'ExpressionAttributeValues': {
+            ":query": normalize_cache_query(user_query),
+            ":zip": zipcode if zipcode else "none"
+        }
+    }
+    items = []
+    while True:
+        response = query_cache_table.scan(**scan_args)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    if not items:
+        print("No exact match with both query and zipcode. No cached response will be returned.")
+        return None
+
+    print("Found unmigrated match with BOTH query and zipcode.")
+    # Return the most recent match
+    items.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+    return decode_cached_response(items[0])
+
+def categorize_query(user_query: str) -> Tuple[List[str], str]:
+    """
+    Determine service categories based on the query's keywords
+
+    Args:
+        user_query (str): Original user query
+
+    Returns:
+        Tuple[List[str], str]: The service categories, and the main one used for each service
+    """
+    # Keywords for all supported languages
+    food_keywords = ["food", "pantry", "pantries", "comida", "despensa", "żywność", "spiżarnia"]
+    housing_keywords = ["housing", "shelter", "homeless", "vivienda", "refugio", "sin hogar", "mieszkanie", "schronisko", "bezdomny"]
+    child_keywords = ["child", "children", "kid", "niño", "niños", "hijo", "dziecko", "dzieci"]
+    health_keywords = ["health", "medical", "doctor", "salud", "médico", "zdrowie", "lekarz"]
+    education_keywords = ["university", "college", "school", "universidad", "escuela", "uniwersytet", "szkoła"]
+
+    query_lower = user_query.lower()
+
+    if any(keyword in query_lower for keyword in food_keywords):
+        return ["Food Pantry", "Food Assistance", "Emergency Food"], "Food Pantry"
+    elif any(keyword in query_lower for keyword in housing_keywords):
+        return ["Housing", "Homeless Services", "Emergency Shelter"], "Housing"
+    elif any(keyword in query_lower for keyword in child_keywords):
+        return ["Child Care", "Children Services", "Youth Programs"], "Children Services"
+    elif any(keyword in query_lower for keyword in health_keywords):
+        return ["Medical Services", "Healthcare", "Clinics"], "Healthcare"
+    elif any(keyword in query_lower for keyword in education_keywords):
+        return ["Education", "Universities", "Academic Resources"], "Education"
+    else:
+        return ["General Assistance", "Social Services", "Community Resources"], "Social Services"
+
+class ServiceStreamParser:
+    """
+    Parses Perplexity's markdown into structured service objects as it arrives.
+    Each **Organization** block is returned as soon as the next one starts, and the last
+    one when the response ends, so a streamed response yields services one by one.
+    """
+
+    def __init__(self, service_category_main: str, language: str = 'english', zipcode: Optional[str] = None, user_id: str = ''):
+        self.service_category_main = service_category_main
+        self.language = language
+        self.zipcode = zipcode
+        self.user_id = user_id
+        self.content = ""
+        self._pending = ""
+        self._previous_line = ""
+        self.current_org = None
+        self.current_details = {}
+        self.services = []
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Add the next piece of the response
+
+        Returns:
+            List[Dict[str, Any]]: Services completed by this piece
+        """
+        self.content += text
+        self._pending += text
+        completed = []
+        while '\n' in self._pending:
+            line, self._pending = self._pending.split('\n', 1)
+            completed.extend(self._parse_line(line))
+        return completed
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """
+        Parse whatever is left once the response has ended
+
+        Returns:
+            List[Dict[str, Any]]: The last services
+        """
+        completed = []
+        if self._pending:
+            completed.extend(self._parse_line(self._pending))
+            self._pending = ""
+        completed.extend(self._complete_current())
+        return completed
+
+    def _complete_current(self) -> List[Dict[str, Any]]:
+        if not (self.current_org and self.current_details):
+            return []
+
+        # Add an ID to each service
+        if "id" not in self.current_details:
+            self.current_details["id"] = str(uuid.uuid4())
+
+        # Ensure referral_id is set
+        self.current_details["referral_id"] = self.user_id
+
+        service = {
+            "agency": self.current_org,
+            "details": self.current_details
+        }
+        self.services.append(service)
+        self.current_org = None
+        self.current_details = {}
+        return [service]
+
+    def _parse_line(self, raw_line: str) -> List[Dict[str, Any]]:
+        previous_line = self._previous_line
+        self._previous_line = raw_line
+        line = raw_line.strip()
+        current_details = self.current_details
+
+        # Skip empty lines
+        if not line:
+            return []
+
+        # Look for organization names (bolded with **)
+        if line.startswith('**') and line.endswith('**'):
+            # Save previous organization if exists
+            completed = self._complete_current()
+
+            # Start new organization
+            self.current_org = line.strip('*').strip()
+            self.current_details = {
+                "service_category": self.service_category_main,
+                "referral_id": self.user_id,
+                "source": "Perplexity AI",
+                "zipcode": self.zipcode if self.zipcode else ""
+            }
+            return completed
+
+        # Look for address (typically the line after org name)
+        elif self.current_org and previous_line.strip().startswith('**') and not line.startswith('-'):
+            # This is likely the address line
+            address_parts = line.split(',')
+
+            if len(address_parts) >= 1:
+                current_details["address"] = address_parts[0].strip()
+
+            if len(address_parts) >= 2:
+                # Try to extract city and state
+                if len(address_parts) >= 3:
+                    current_details["city"] = address_parts[1].strip()
+                    state_zip = address_parts[2].strip()
+
+                    # Try to extract state
+                    state_match = re.search(r'\b([A-Z]{2})\b', state_zip)
+                    if state_match:
+                        current_details["state"] = state_match.group(1)
+
+                    # Try to extract zipcode
+                    zip_match = re.search(r'\b(\d{5}(?:-\d{4})?)\b', state_zip)
+                    if zip_match and "zipcode" not in current_details:
+                        current_details["zipcode"] = zip_match.group(1)
+
+        # Look for bullet points with details - handle multilingual cases
+        elif self.current_org and line.startswith('-'):
+            line = line[1:].strip()  # Remove the bullet and trim
+
+            # Check for hours in any language
+            hour_prefixes = ['hours:', 'horario:', 'godziny:', 'hora:', 'horas:']
+            if any(line.lower().startswith(prefix) for prefix in hour_prefixes):
+                current_details["hours"] = line
+
+            # Check for phone in any language
+            phone_prefixes = ['phone:', 'teléfono:', 'telefon:', 'tel:']
+            if any(line.lower().startswith(prefix) for prefix in phone_prefixes):
+                current_details["phone"] = line
+
+                # Extract phone number and create referral process in appropriate language
+                phone_parts = line.split(':')
+                if len(phone_parts) > 1:
+                    phone_number = phone_parts[1].strip()
+                    if self.language.lower() == 'spanish':
+                        current_details["referral_process"] = f"Llamar {phone_number}"
+                    elif self.language.lower() == 'polish':
+                        current_details["referral_process"] = f"Zadzwoń {phone_number}"
+                    else:
+                        current_details["referral_process"] = f"Call {phone_number}"
+
+            # Check for eligibility/requirements (multilingual terms)
+            eligibility_terms = [
+                'eligibility:', 'requirements:', 'qualify:', 'who can:',
+                'elegibilidad:', 'requisitos:', 'calificar:', 'quién puede:',
+                'kwalifikowalność:', 'wymagania:', 'kwalifikować:', 'kto może:'
+            ]
+
+            if any(line.lower().startswith(term) for term in eligibility_terms):
+                current_details["eligibility"] = line
+
+            # Additional information for anything else
+            else:
+                if "additional_information" not in current_details:
+                    current_details["additional_information"] = line
+                else:
+                    current_details["additional_information"] += ". " + line
+
+        return []
+
+def extract_meaningful_response(perplexity_response: Dict[str, Any], language: str = 'english', zipcode: Optional[str] = None, user_query: str = '', user_id: str = '', services: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
     """
     Extract the meaningful content from Perplexity's response and format it into structured service objects
 
@@ -456,6 +1135,7 @@ def extract_meaningful_response(perplexity_response: Dict[str, Any], language: s
         zipcode (Optional[str]): User's zipcode
         user_query (str): Original user query
         user_id (str): User's ID for referral tracking
+        services (Optional[List[Dict[str, Any]]]): Services already parsed while the response streamed
 
     Returns:
         Dict[str, Any]: Structured response data with service objects
@@ -467,158 +1147,15 @@ def extract_meaningful_response(perplexity_response: Dict[str, Any], language: s
             content = message.get("content", "")
 
             # Determine service categories based on query
-            service_categories = []
-            service_category_main = ""
-
-            # Keywords for all supported languages
-            food_keywords = ["food", "pantry", "pantries", "comida", "despensa", "żywność", "spiżarnia"]
-            housing_keywords = ["housing", "shelter", "homeless", "vivienda", "refugio", "sin hogar", "mieszkanie", "schronisko", "bezdomny"]
-            child_keywords = ["child", "children", "kid", "niño", "niños", "hijo", "dziecko", "dzieci"]
-            health_keywords = ["health", "medical", "doctor", "salud", "médico", "zdrowie", "lekarz"]
-            education_keywords = ["university", "college", "school", "universidad", "escuela", "uniwersytet", "szkoła"]
-
-            query_lower = user_query.lower()
-
-            if any(keyword in query_lower for keyword in food_keywords):
-                service_categories = ["Food Pantry", "Food Assistance", "Emergency Food"]
-                service_category_main = "Food Pantry"
-            elif any(keyword in query_lower for keyword in housing_keywords):
-                service_categories = ["Housing", "Homeless Services", "Emergency Shelter"]
-                service_category_main = "Housing"
-            elif any(keyword in query_lower for keyword in child_keywords):
-                service_categories = ["Child Care", "Children Services", "Youth Programs"]
-                service_category_main = "Children Services"
-            elif any(keyword in query_lower for keyword in health_keywords):
-                service_categories = ["Medical Services", "Healthcare", "Clinics"]
-                service_category_main = "Healthcare"
-            elif any(keyword in query_lower for keyword in education_keywords):
-                service_categories = ["Education", "Universities", "Academic Resources"]
-                service_category_main = "Education"
-            else:
-                service_categories = ["General Assistance", "Social Services", "Community Resources"]
-                service_category_main = "Social Services"
+            service_categories, service_category_main = categorize_query(user_query)
 
             # Extract and structure service information from the content
-            services = []
-
-            # Parse the content to find organizations and their details
-            lines = content.split('\n')
-            current_org = None
-            current_details = {}
-
-            for i, line in enumerate(lines):
-                line = line.strip()
-
-                # Skip empty lines
-                if not line:
-                    continue
-
-                # Look for organization names (bolded with **)
-                if line.startswith('**') and line.endswith('**'):
-                    # Save previous organization if exists
-                    if current_org and current_details:
-                        # Add an ID to each service
-                        if "id" not in current_details:
-                            current_details["id"] = str(uuid.uuid4())
-
-                        # Ensure referral_id is set
-                        current_details["referral_id"] = user_id
-
-                        # Add to services list
-                        services.append({
-                            "agency": current_org,
-                            "details": current_details
-                        })
-
-                    # Start new organization
-                    current_org = line.strip('*').strip()
-                    current_details = {
-                        "service_category": service_category_main,
-                        "referral_id": user_id,
-                        "source": "Perplexity AI",
-                        "zipcode": zipcode if zipcode else ""
-                    }
-
-                # Look for address (typically the line after org name)
-                elif current_org and i > 0 and lines[i-1].strip().startswith('**') and not line.startswith('-'):
-                    # This is likely the address line
-                    address_parts = line.split(',')
-
-                    if len(address_parts) >= 1:
-                        current_details["address"] = address_parts[0].strip()
-
-                    if len(address_parts) >= 2:
-                        # Try to extract city and state
-                        if len(address_parts) >= 3:
-                            current_details["city"] = address_parts[1].strip()
-                            state_zip = address_parts[2].strip()
-
-                            # Try to extract state
-                            state_match = re.search(r'\b([A-Z]{2})\b', state_zip)
-                            if state_match:
-                                current_details["state"] = state_match.group(1)
-
-                            # Try to extract zipcode
-                            zip_match = re.search(r'\b(\d{5}(?:-\d{4})?)\b', state_zip)
-                            if zip_match and "zipcode" not in current_details:
-                                current_details["zipcode"] = zip_match.group(1)
-
-                # Look for bullet points with details - handle multilingual cases
-                elif current_org and line.startswith('-'):
-                    line = line[1:].strip()  # Remove the bullet and trim
-
-                    # Check for hours in any language
-                    hour_prefixes = ['hours:', 'horario:', 'godziny:', 'hora:', 'horas:']
-                    if any(line.lower().startswith(prefix) for prefix in hour_prefixes):
-                        current_details["hours"] = line
-
-                    # Check for phone in any language
-                    phone_prefixes = ['phone:', 'teléfono:', 'telefon:', 'tel:']
-                    if any(line.lower().startswith(prefix) for prefix in phone_prefixes):
-                        current_details["phone"] = line
-
-                        # Extract phone number and create referral process in appropriate language
-                        phone_parts = line.split(':')
-                        if len(phone_parts) > 1:
-                            phone_number = phone_parts[1].strip()
-                            if language.lower() == 'spanish':
-                                current_details["referral_process"] = f"Llamar {phone_number}"
-                            elif language.lower() == 'polish':
-                                current_details["referral_process"] = f"Zadzwoń {phone_number}"
-                            else:
-                                current_details["referral_process"] = f"Call {phone_number}"
-
-                    # Check for eligibility/requirements (multilingual terms)
-                    eligibility_terms = [
-                        'eligibility:', 'requirements:', 'qualify:', 'who can:',
-                        'elegibilidad:', 'requisitos:', 'calificar:', 'quién puede:',
-                        'kwalifikowalność:', 'wymagania:', 'kwalifikować:', 'kto może:'
-                    ]
-
-                    if any(line.lower().startswith(term) for term in eligibility_terms):
-                        current_details["eligibility"] = line
-
-                    # Additional information for anything else
-                    else:
-                        if "additional_information" not in current_details:
-                            current_details["additional_information"] = line
-                        else:
-                            current_details["additional_information"] += ". " + line
-
-            # Don't forget to add the last organization
-            if current_org and current_details:
-                # Add an ID to each service
-                if "id" not in current_details:
-                    current_details["id"] = str(uuid.uuid4())
-
-                # Ensure referral_id is set
-                current_details["referral_id"] = user_id
-
-                # Add to services list
-                services.append({
-                    "agency": current_org,
-                    "details": current_details
-                })
+            if services is None:
+                parser = ServiceStreamParser(service_category_main, language, zipcode, user_id)
+                parser.feed(content)
+                parser.finish()
+                services = parser.services
+            services = list(services)
 
             # If we couldn't extract any services but have content, create a general service
             if not services and content:
@@ -635,13 +1172,7 @@ def extract_meaningful_response(perplexity_response: Dict[str, Any], language: s
                 })
 
             # Create message for response
-            message = ""
-            if language.lower() == 'spanish':
-                message = f"Aquí están los servicios de {service_category_main}" + (f" en {zipcode}" if zipcode else "") + "."
-            elif language.lower() == 'polish':
-                message = f"Oto usługi {service_category_main}" + (f" w {zipcode}" if zipcode else "") + "."
-            else:
-                message = f"Here are {service_category_main} services" + (f" in {zipcode}" if zipcode else "") + "."
+            message = services_message(get_language_code(language), service_category_main, zipcode)
 
             # Format the response in a structure similar to the requested format
             formatted_response = {
@@ -788,9 +1319,93 @@ def update_user_query_history(user_id: str, user_query: str, original_query: str
     except Exception as e:
         print(f"Error updating user query history: {str(e)}")
 
+def post_to_connection(stream_to: Dict[str, Any], data: Dict[str, Any]) -> bool:
+    """
+    Post a message straight to the chatbot's WebSocket connection
+
+    Args:
+        stream_to (Dict[str, Any]): connection_id, domain_name, stage and request_id from the chatbot
+        data (Dict[str, Any]): Message contents
+
+    Returns:
+        bool: False if the connection has gone away
+    """
+    endpoint_url = f"https://{stream_to['domain_name']}/{stream_to['stage']}"
+    if endpoint_url not in websocket_clients:
+        websocket_clients[endpoint_url] = boto3.client('apigatewaymanagementapi', endpoint_url=endpoint_url)
+    try:
+        websocket_clients[endpoint_url].post_to_connection(
+            ConnectionId=stream_to['connection_id'],
+            Data=json.dumps(data, default=_json_default).encode('utf-8')
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'GoneException':
+            print(f"Connection {stream_to['connection_id']} is gone, no more frames will be sent")
+            return False
+        print(f"Error sending frame to connection {stream_to['connection_id']}: {str(e)}")
+        return True
+    except Exception as e:
+        print(f"Error sending frame to connection {stream_to['connection_id']}: {str(e)}")
+        return True
+
+def send_stream_frame(stream_to: Dict[str, Any], frame: Dict[str, Any]) -> bool:
+    """
+    Post a progressive response frame (tagged with the chatbot's request_id) to the connection
+    """
+    return post_to_connection(stream_to, dict({"request_id": stream_to.get('request_id')}, **frame))
+
+def deliver_response(stream_to: Dict[str, Any], result: Dict[str, Any]) -> None:
+    """
+    Send the response to the connection for a chatbot fallback invoked asynchronously: as enrichment
+    and final frames when stream_to["reply"] is "frames", or as the single message the chatbot used to relay
+    """
+    print(f"Sending response to connection {stream_to['connection_id']}")
+    if stream_to.get('reply') == 'frames':
+        if send_stream_frame(stream_to, {"phase": "enrichment", "perplexity_response": result}):
+            send_stream_frame(stream_to, {"phase": "final", "status": "success" if result.get("statusCode") == 200 else "error"})
+    else:
+        post_to_connection(stream_to, result)
+
+def service_streamer(stream_to: Dict[str, Any]) -> Callable[[Dict[str, Any]], None]:
+    """
+    on_service callback sending each parsed service to the connection as a "service" frame
+    """
+    state = {"index": 0, "connected": True}
+
+    def on_service(service: Dict[str, Any]) -> None:
+        if state["connected"]:
+            state["connected"] = send_stream_frame(stream_to, {"phase": "service", "index": state["index"], "service": service})
+        state["index"] += 1
+
+    return on_service
+
 # Lambda handler
 def lambda_handler(event, context):
+    result = handle_request(event, context)
+    if translation_cache:
+        translation_cache.log_invocation_stats()
+
+    # A chatbot fallback invoked asynchronously gets the response on its WebSocket connection
+    stream_to = event.get('stream_to') or {}
+    if stream_to.get('reply') and not event.get('action'):
+        deliver_response(stream_to, result)
+
+    return result
+
+def handle_request(event, context):
     try:
+        # Background work: stale cache entry refreshes, the scheduled eviction sweep and cache warming
+        # Outbound calls have to finish with enough of the invocation left to store and return the result
+        deadline = perplexity_client.deadline_from_context(context)
+
+        if event.get('action') == 'refreshCache':
+            return refresh_cached_response(event, deadline)
+        if event.get('action') == 'evictCache':
+            return evict_cache_entries()
+        if event.get('action') == 'warmCache':
+            return warm_cached_response(event, deadline)
+
         # Extract parameters from the event
         user_query_original = event.get('user_query', '')
         user_id = event.get('user_id')
@@ -833,28 +1448,41 @@ def lambda_handler(event, context):
             print(f"Translated query to English: {user_query}")
 
         # First check if we have this query cached in DynamoDB (using the English version)
-        cached_response = query_dynamodb_for_cached_response(user_query, zipcode, language_code)
+        cached_response = query_dynamodb_for_cached_response(user_query, zipcode, language_code, user_id)
+
+        # Then for a cached query that is worded differently but asks the same thing
+        query_vector = None
+        if not cached_response:
+            semantic_match, query_vector = semantic_cache.lookup(user_query, zipcode)
+            if semantic_match:
+                print(f"Semantic cache match '{semantic_match['matched_query']}' "
+                      f"(similarity {semantic_match['similarity']:.3f})")
+                cached_response = get_cached_response_by_id(
+                    semantic_match['query_id'], user_id, language_code,
+                    on_missing=lambda: semantic_cache.record_gone(zipcode, semantic_match)
+                )
+                if cached_response:
+                    semantic_cache.record_hit(user_query, zipcode, semantic_match)
+
+        # Concurrent requests for the same query share one Perplexity call
+        query_id = cache_query_id(user_query, zipcode)
+        lease_token = None
+        if not cached_response:
+            cached_response, lease_token = coalesce_perplexity_request(query_id, language_code, user_id, deadline)
 
         if cached_response:
+            # Already in the requested language; translations are stored on the cache entry
             print("Found cached response in DynamoDB")
 
-            # Always translate cached response to requested language
-            # Since we always store in English, we need to translate to requested language
-            if language_code != 'en':
-                print(f"Translating cached response from English to {language_name}")
-                translated_response = translate_response_content(cached_response, language_code)
-            else:
-                translated_response = cached_response
-
             # Update user history with both original and translated queries
-            update_user_query_history(user_id, user_query, original_query, translated_response, zipcode, language_name)
+            update_user_query_history(user_id, user_query, original_query, cached_response, zipcode, language_name)
 
             # Add response_data wrapper to match example format
             response_wrapper = {
                 "user_id": user_id,
                 "zipcode": zipcode,
                 "language": language_name,
-                "response_data": translated_response
+                "response_data": cached_response
             }
 
             return {
@@ -862,41 +1490,59 @@ def lambda_handler(event, context):
                 "body": json.dumps(response_wrapper)
             }
 
-        # If not in cache, query Perplexity with the English query but request response in original language
-        print(f"Querying Perplexity for: {user_query} (response in {language_name})")
-        perplexity_response = query_perplexity(user_query, zipcode, language_name)
-
-        if "error" in perplexity_response:
-            return {
-                "statusCode": 500,
-                "body": json.dumps({
-                    "status": "error",
-                    "message": f"Error from Perplexity API: {perplexity_response['error']}",
-                    "source": "perplexity"
-                })
-            }
+        try:
+            # A progressive WebSocket caller has services sent to it one by one while the response streams in.
+            # A "message" reply is for a client that only takes the single relayed response.
+            stream_to = event.get('stream_to')
+            parser = None
+            on_service = None
+            if stream_to and stream_to.get('reply', 'frames') == 'frames':
+                _, service_category_main = categorize_query(user_query)
+                parser = ServiceStreamParser(service_category_main, language_name, zipcode, user_id)
+                on_service = service_streamer(stream_to)
+
+            # If not in cache, query Perplexity with the English query but request response in original language
+            print(f"Querying Perplexity for: {user_query} (response in {language_name})")
+            perplexity_start = time.time()
+            perplexity_response = query_perplexity(user_query, zipcode, language_name, deadline, parser, on_service)
+            semantic_cache.record_perplexity((time.time() - perplexity_start) * 1000)
+
+            if "error" in perplexity_response:
+                return {
+                    "statusCode": 500,
+                    "body": json.dumps({
+                        "status": "error",
+                        "message": f"Error from Perplexity API: {perplexity_response['error']}",
+                        "source": "perplexity"
+                    })
+                }
 
-        # Extract and format the response - pass the user_id for referral tracking
-        formatted_response = extract_meaningful_response(perplexity_response, language_name, zipcode, user_query, user_id)
+            # Extract and format the response - pass the user_id for referral tracking
+            formatted_response = extract_meaningful_response(perplexity_response, language_name, zipcode, user_query, user_id,
+                                                             parser.services if parser else None)
 
-        # Store the query and response in DynamoDB for future use (store both original and English version)
-        store_query_in_dynamodb(user_query, original_query, formatted_response, zipcode, language_name, language_code)
+            # Store the query and response in DynamoDB for future use (store both original and English version)
+            stored_query_id = store_query_in_dynamodb(user_query, original_query, formatted_response, zipcode, language_name, language_code)
+            semantic_cache.add(user_query, zipcode, stored_query_id, query_vector)
 
-        # Update user history with both original and translated queries
-        update_user_query_history(user_id, user_query, original_query, formatted_response, zipcode, language_name)
+            # Update user history with both original and translated queries
+            update_user_query_history(user_id, user_query, original_query, formatted_response, zipcode, language_name)
 
-        # Add response_data wrapper to match example format
-        response_wrapper = {
-            "user_id": user_id,
-            "zipcode": zipcode,
-            "language": language_name,
-            "response_data": formatted_response
-        }
+            # Add response_data wrapper to match example format
+            response_wrapper = {
+                "user_id": user_id,
+                "zipcode": zipcode,
+                "language": language_name,
+                "response_data": formatted_response
+            }
 
-        return {
-            "statusCode": 200,
-            "body": json.dumps(response_wrapper)
-        }
+            return {
+                "statusCode": 200,
+                "body": json.dumps(response_wrapper)
+            }
+        finally:
+            # Waiting requests find the response in the cache, or call Perplexity themselves
+            release_inflight_lease(query_id, lease_token)
 
     except Exception as e:
         print(f"Error in lambda_handler: {str(e)}")
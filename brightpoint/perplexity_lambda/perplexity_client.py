@@ -0,0 +1,252 @@
+import os
+import ssl
+import json
+import time
+import random
+import socket
+import http.client
+import urllib.parse
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+# Connection settings for the Perplexity API; the connection is kept open between invocations
+PERPLEXITY_API_URL = os.environ.get('PERPLEXITY_API_URL', "https://api.perplexity.ai/chat/completions")
+PERPLEXITY_CONNECT_TIMEOUT_SECONDS = float(os.environ.get('PERPLEXITY_CONNECT_TIMEOUT_SECONDS', '5'))
+# Longest a single attempt waits for a response; capped further by the time left in the invocation
+PERPLEXITY_READ_TIMEOUT_SECONDS = float(os.environ.get('PERPLEXITY_READ_TIMEOUT_SECONDS', '60'))
+# Attempts per request, including the first
+PERPLEXITY_MAX_ATTEMPTS = int(os.environ.get('PERPLEXITY_MAX_ATTEMPTS', '3'))
+PERPLEXITY_BACKOFF_BASE_SECONDS = float(os.environ.get('PERPLEXITY_BACKOFF_BASE_SECONDS', '0.5'))
+PERPLEXITY_BACKOFF_MAX_SECONDS = float(os.environ.get('PERPLEXITY_BACKOFF_MAX_SECONDS', '8'))
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# Don't start an attempt with less than this left before the deadline
+MIN_ATTEMPT_SECONDS = 2.0
+
+# Certificate verification context, shared by every connection this container opens
+ssl_context = ssl.create_default_context()
+
+_parsed_url = urllib.parse.urlparse(PERPLEXITY_API_URL)
+_connection = None
+
+# Per-container counters, logged after every request
+client_stats = {
+    "requests": 0,
+    "connections_opened": 0,
+    "connections_reused": 0,
+    "retries": 0,
+    "connect_ms_total": 0.0,
+}
+
+class PerplexityAPIError(Exception):
+    """
+    The Perplexity API couldn't be reached or returned an error after all attempts
+    """
+    def __init__(self, message: str, status: Optional[int] = None, body: str = ''):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+def _new_connection(timeout: float) -> http.client.HTTPConnection:
+    if _parsed_url.scheme == 'https':
+        return http.client.HTTPSConnection(_parsed_url.netloc, timeout=timeout, context=ssl_context)
+    return http.client.HTTPConnection(_parsed_url.netloc, timeout=timeout)
+
+def close() -> None:
+    """
+    Drop the kept-alive connection; the next request opens a new one
+    """
+    global _connection
+    if _connection is not None:
+        _connection.close()
+        _connection = None
+
+def _get_connection(read_timeout: float) -> Tuple[http.client.HTTPConnection, float]:
+    """
+    The container's open connection, or a new one if there isn't one
+
+    Returns:
+        Tuple: The connection and how long connecting (TCP and TLS handshakes) took in ms, 0 when reused
+    """
+    global _connection
+    if _connection is not None and _connection.sock is not None:
+        client_stats["connections_reused"] += 1
+        _connection.sock.settimeout(read_timeout)
+        return _connection, 0.0
+
+    close()
+    connection = _new_connection(min(PERPLEXITY_CONNECT_TIMEOUT_SECONDS, read_timeout))
+    start = time.perf_counter()
+    connection.connect()
+    connect_ms = (time.perf_counter() - start) * 1000
+    connection.sock.settimeout(read_timeout)
+
+    _connection = connection
+    client_stats["connections_opened"] += 1
+    client_stats["connect_ms_total"] += connect_ms
+    return connection, connect_ms
+
+def backoff_seconds(attempt: int, retry_after: Optional[str] = None) -> float:
+    """
+    Wait before retry number `attempt`: full jitter over an exponentially growing window,
+    or the server's Retry-After when it sends one
+    """
+    if retry_after:
+        try:
+            return min(float(retry_after), PERPLEXITY_BACKOFF_MAX_SECONDS)
+        except ValueError:
+            pass
+    return random.uniform(0, min(PERPLEXITY_BACKOFF_MAX_SECONDS, PERPLEXITY_BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+def deadline_from_context(context: Any, reserve_seconds: float = 5.0) -> Optional[float]:
+    """
+    Deadline (epoch seconds) for outbound calls, leaving reserve_seconds of the invocation for
+    storing and returning the response. None when there's no Lambda context (local runs).
+    """
+    if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+        return None
+    return time.time() + context.get_remaining_time_in_millis() / 1000 - reserve_seconds
+
+def post(payload: Dict[str, Any], headers: Dict[str, str], deadline: Optional[float] = None) -> http.client.HTTPResponse:
+    """
+    POST a JSON payload to the Perplexity API on the kept-alive connection. Retries on
+    429/5xx and connection failures with jittered exponential backoff, as long as the deadline allows.
+
+    Args:
+        payload (Dict[str, Any]): Request body
+        headers (Dict[str, str]): Request headers (Authorization etc.)
+        deadline (Optional[float]): Epoch seconds by which the response must have started
+
+    Returns:
+        http.client.HTTPResponse: A 2xx response whose body hasn't been read yet. The caller must
+        read it fully before the next request, so the connection can be reused.
+
+    Raises:
+        PerplexityAPIError: On a non-retryable status, or when attempts or time run out
+    """
+    body = json.dumps(payload).encode('utf-8')
+    headers = dict(headers, **{"Content-Type": "application/json", "Connection": "keep-alive"})
+    client_stats["requests"] += 1
+    last_error = None
+
+    for attempt in range(PERPLEXITY_MAX_ATTEMPTS):
+        read_timeout = PERPLEXITY_READ_TIMEOUT_SECONDS
+        if deadline is not None:
+            read_timeout = min(read_timeout, deadline - time.time())
+            if read_timeout < MIN_ATTEMPT_SECONDS:
+                break
+
+        connect_ms = 0.0
+        retry_after = None
+        start = time.perf_counter()
+        try:
+            connection, connect_ms = _get_connection(read_timeout)
+            connection.request('POST', _parsed_url.path or '/', body, headers)
+            response = connection.getresponse()
+            ttfb_ms = (time.perf_counter() - start) * 1000 - connect_ms
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+            # Usually the server closed the idle kept-alive connection; reconnect straight away
+            close()
+            last_error = PerplexityAPIError(f"Connection error: {str(e)}")
+            print(f"Perplexity connection dropped ({type(e).__name__}), reconnecting")
+            client_stats["retries"] += 1
+            continue
+        except (socket.timeout, OSError, http.client.HTTPException) as e:
+            close()
+            last_error = PerplexityAPIError(f"URL Error: {str(e)}")
+            print(f"Perplexity request failed after {(time.perf_counter() - start) * 1000:.0f} ms: {str(e)}")
+        else:
+            print(f"Perplexity timings: connect {connect_ms:.0f} ms ({'new' if connect_ms else 'reused'} connection), "
+                  f"time to first byte {ttfb_ms:.0f} ms, status {response.status}, attempt {attempt + 1}")
+            if 200 <= response.status < 300:
+                log_stats()
+                return response
+
+            error_body = response.read().decode('utf-8', errors='replace')
+            if response.will_close:
+                close()
+            last_error = PerplexityAPIError(
+                f"API Error: {response.status} - {response.reason}. Details: {error_body}",
+                status=response.status, body=error_body
+            )
+            if response.status not in RETRYABLE_STATUSES:
+                raise last_error
+            retry_after = response.getheader('Retry-After')
+            print(f"Perplexity returned {response.status}, retryable")
+
+        if attempt + 1 < PERPLEXITY_MAX_ATTEMPTS:
+            wait = backoff_seconds(attempt, retry_after)
+            if deadline is not None and time.time() + wait + MIN_ATTEMPT_SECONDS > deadline:
+                print("Not enough time left to retry the Perplexity request")
+                break
+            print(f"Retrying Perplexity request in {wait:.2f} s")
+            client_stats["retries"] += 1
+            time.sleep(wait)
+
+    log_stats()
+    raise last_error or PerplexityAPIError("Deadline reached before the Perplexity request could be sent")
+
+def post_json(payload: Dict[str, Any], headers: Dict[str, str], deadline: Optional[float] = None) -> Dict[str, Any]:
+    """
+    POST a JSON payload to the Perplexity API and return the decoded JSON response (see post)
+    """
+    response = post(payload, dict(headers, Accept="application/json"), deadline)
+    response_data = response.read().decode('utf-8')
+    if response.will_close:
+        close()
+    return json.loads(response_data)
+
+def post_stream(payload: Dict[str, Any], headers: Dict[str, str], deadline: Optional[float] = None) -> Iterator[str]:
+    """
+    POST a chat completion request with streaming on, and yield the content as it arrives
+    (server-sent events, one `data:` line per chunk). Retries happen only before the
+    response starts; a failure mid-stream is raised to the caller.
+
+    Args:
+        payload (Dict[str, Any]): Request body; "stream": true is added
+        headers (Dict[str, str]): Request headers (Authorization etc.)
+        deadline (Optional[float]): Epoch seconds by which the whole response must have arrived
+
+    Yields:
+        str: Pieces of the completion's content, in order
+
+    Raises:
+        PerplexityAPIError: On an error response, or when the deadline passes mid-stream
+    """
+    start = time.perf_counter()
+    response = post(dict(payload, stream=True), dict(headers, Accept="text/event-stream"), deadline)
+    first_token_ms = None
+    finished = False
+    try:
+        while True:
+            if deadline is not None and time.time() > deadline:
+                raise PerplexityAPIError("Deadline reached while streaming the Perplexity response")
+            line = response.readline()
+            if not line:
+                break
+            line = line.decode('utf-8').strip()
+            if not line.startswith('data:'):
+                continue
+            data = line[len('data:'):].strip()
+            if data == '[DONE]':
+                break
+            choices = json.loads(data).get('choices') or []
+            delta = choices[0].get('delta', {}).get('content') if choices else None
+            if delta:
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - start) * 1000
+                    print(f"Perplexity stream: first content after {first_token_ms:.0f} ms")
+                yield delta
+        finished = True
+    finally:
+        if finished and not response.will_close:
+            # Read the end of the chunked body so the connection can be reused
+            response.read()
+        else:
+            close()
+    print(f"Perplexity stream: complete after {(time.perf_counter() - start) * 1000:.0f} ms")
+
+def log_stats() -> None:
+    opened = client_stats["connections_opened"]
+    average_connect = client_stats["connect_ms_total"] / opened if opened else 0.0
+    print(f"Perplexity client stats: {client_stats['requests']} requests, {opened} connections opened "
+          f"(avg {average_connect:.0f} ms), {client_stats['connections_reused']} reused, {client_stats['retries']} retries")
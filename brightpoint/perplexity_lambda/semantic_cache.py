@@ -0,0 +1,230 @@
+import os
+import json
+import math
+import random
+import operator
+from array import array
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Any, List, Optional, Tuple
+import boto3
+from boto3.dynamodb.conditions import Key
+
+# Query embeddings of cached Perplexity responses, one partition per zipcode
+semantic_index_table = boto3.resource('dynamodb', region_name='us-east-1').Table(
+    os.environ.get('SEMANTIC_CACHE_TABLE', 'perplexity_semantic_index')
+)
+bedrock_runtime = boto3.client('bedrock-runtime', region_name='us-east-1')
+
+SEMANTIC_CACHE_ENABLED = os.environ.get('SEMANTIC_CACHE_ENABLED', 'true').lower() == 'true'
+# Cosine similarity a stored query needs for its response to be reused
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', '0.85'))
+# Queries kept per zipcode; the least recently used are evicted beyond this
+SEMANTIC_CACHE_MAX_ENTRIES_PER_ZIP = int(os.environ.get('SEMANTIC_CACHE_MAX_ENTRIES_PER_ZIP', '200'))
+# Fraction of semantic hits logged with both queries, for reviewing false hits
+SEMANTIC_CACHE_AUDIT_RATE = float(os.environ.get('SEMANTIC_CACHE_AUDIT_RATE', '0.05'))
+EMBEDDING_MODEL_ID = os.environ.get('EMBEDDING_MODEL_ID', 'amazon.titan-embed-text-v2:0')
+EMBEDDING_DIMENSIONS = int(os.environ.get('EMBEDDING_DIMENSIONS', '256'))
+
+# Per-container counters, logged on every lookup
+semantic_stats = {
+    "lookups": 0,
+    "hits": 0,
+    "misses": 0,
+    "audited": 0,
+    "perplexity_calls": 0,
+    "perplexity_ms_total": 0.0,
+    "estimated_ms_saved": 0.0,
+}
+
+def is_enabled() -> bool:
+    return SEMANTIC_CACHE_ENABLED
+
+def zip_bucket(zipcode: Optional[str]) -> str:
+    return str(zipcode) if zipcode else "none"
+
+def similarity(stored: bytes, vector: array) -> float:
+    """
+    Cosine similarity of a stored unit vector (float32 bytes) and a query's unit vector.
+    Plain Python: at 256 dimensions and a few hundred entries per zipcode this takes a few
+    milliseconds, next to the tens of milliseconds of the embedding call, and needs no NumPy layer.
+    """
+    return sum(map(operator.mul, array('f', stored), vector))
+
+def embed_query(user_query: str) -> Optional[array]:
+    """
+    Embed a query with Bedrock
+
+    Returns:
+        Optional[array]: Unit-length float32 vector, or None on failure
+    """
+    try:
+        response = bedrock_runtime.invoke_model(
+            modelId=EMBEDDING_MODEL_ID,
+            body=json.dumps({
+                "inputText": user_query.lower().strip(),
+                "dimensions": EMBEDDING_DIMENSIONS,
+                "normalize": True
+            })
+        )
+        embedding = json.loads(response['body'].read())['embedding']
+        norm = math.sqrt(sum(value * value for value in embedding))
+        return array('f', (value / norm for value in embedding)) if norm > 0 else None
+    except Exception as e:
+        print(f"Error embedding query: {str(e)}")
+        return None
+
+def load_bucket(bucket: str, projection: Optional[str] = None) -> List[Dict[str, Any]]:
+    items = []
+    query_args = {'KeyConditionExpression': Key('zip_bucket').eq(bucket)}
+    if projection:
+        query_args['ProjectionExpression'] = projection
+    while True:
+        response = semantic_index_table.query(**query_args)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        query_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def lookup(user_query: str, zipcode: Optional[str] = None) -> Tuple[Optional[Dict[str, Any]], Optional[array]]:
+    """
+    Find a cached query for the same zipcode that means the same thing as this one.
+    Every stored vector for the zipcode is scored against the query's vector.
+
+    Args:
+        user_query (str): The user's query (in English)
+        zipcode (Optional[str]): User's zipcode
+
+    Returns:
+        Tuple: The match ({"query_id", "matched_query", "similarity"}) or None, and the
+        query's embedding so a miss can be added without embedding it again. The caller
+        reports a match with record_hit once its response is read, or record_gone if the
+        response no longer exists.
+    """
+    if not is_enabled():
+        return None, None
+
+    semantic_stats["lookups"] += 1
+    vector = embed_query(user_query)
+    match = None
+
+    if vector is not None:
+        try:
+            bucket = zip_bucket(zipcode)
+            items = [item for item in load_bucket(bucket)
+                     if len(item['vector'].value) == EMBEDDING_DIMENSIONS * 4]
+            if items:
+                similarities = [similarity(item['vector'].value, vector) for item in items]
+                best = max(range(len(items)), key=similarities.__getitem__)
+                if similarities[best] >= SEMANTIC_CACHE_THRESHOLD:
+                    match = {
+                        "query_id": items[best]['query_id'],
+                        "matched_query": items[best].get('normalized_query'),
+                        "similarity": similarities[best]
+                    }
+        except Exception as e:
+            print(f"Error searching semantic cache: {str(e)}")
+            match = None
+
+    if not match:
+        semantic_stats["misses"] += 1
+        log_stats()
+    return match, vector
+
+def add(user_query: str, zipcode: Optional[str], query_id: str, vector: Optional[array]) -> None:
+    """
+    Index a newly cached Perplexity response under its query's embedding, then evict the
+    least recently used queries for the zipcode beyond SEMANTIC_CACHE_MAX_ENTRIES_PER_ZIP
+
+    Args:
+        user_query (str): The user's query (in English)
+        zipcode (Optional[str]): User's zipcode
+        query_id (str): ID of the response in perplexity_query_cache
+        vector: The query's embedding, from lookup
+    """
+    if not is_enabled() or vector is None or not query_id:
+        return
+
+    try:
+        bucket = zip_bucket(zipcode)
+        now = datetime.now().isoformat()
+        semantic_index_table.put_item(
+            Item={
+                "zip_bucket": bucket,
+                "query_id": query_id,
+                "normalized_query": user_query.lower().strip(),
+                "vector": array('f', vector).tobytes(),
+                "created_at": now,
+                "last_used_at": now,
+                "hit_count": 0
+            }
+        )
+
+        entries = load_bucket(bucket, 'query_id, last_used_at')
+        excess = len(entries) - SEMANTIC_CACHE_MAX_ENTRIES_PER_ZIP
+        if excess > 0:
+            entries.sort(key=lambda entry: entry.get('last_used_at', ''))
+            with semantic_index_table.batch_writer() as batch:
+                for entry in entries[:excess]:
+                    batch.delete_item(Key={'zip_bucket': bucket, 'query_id': entry['query_id']})
+            print(f"Evicted {excess} semantic cache entries for zipcode {bucket}")
+    except Exception as e:
+        print(f"Error adding to semantic cache: {str(e)}")
+
+def remove(zipcode: Optional[str], query_id: str) -> None:
+    """
+    Drop the index entry for a cache entry that has been evicted
+    """
+    try:
+        semantic_index_table.delete_item(Key={'zip_bucket': zip_bucket(zipcode), 'query_id': query_id})
+    except Exception as e:
+        print(f"Error removing {query_id} from semantic cache: {str(e)}")
+
+def record_hit(user_query: str, zipcode: Optional[str], match: Dict[str, Any]) -> None:
+    """
+    Count a semantic hit whose cached response was read; the saving is estimated from the average
+    Perplexity latency seen so far. A sample of hits is logged with both queries so false hits can be reviewed.
+    """
+    try:
+        semantic_index_table.update_item(
+            Key={'zip_bucket': zip_bucket(zipcode), 'query_id': match['query_id']},
+            UpdateExpression="SET last_used_at = :now ADD hit_count :one",
+            ExpressionAttributeValues={':now': datetime.now().isoformat(), ':one': Decimal(1)}
+        )
+    except Exception as e:
+        print(f"Error updating semantic cache entry {match['query_id']}: {str(e)}")
+
+    semantic_stats["hits"] += 1
+    if semantic_stats["perplexity_calls"]:
+        semantic_stats["estimated_ms_saved"] += semantic_stats["perplexity_ms_total"] / semantic_stats["perplexity_calls"]
+    if random.random() < SEMANTIC_CACHE_AUDIT_RATE:
+        semantic_stats["audited"] += 1
+        print("Semantic cache audit sample: " + json.dumps({
+            "query": user_query,
+            "matched_query": match.get("matched_query"),
+            "similarity": round(match["similarity"], 4),
+            "zipcode": zip_bucket(zipcode)
+        }))
+    log_stats()
+
+def record_gone(zipcode: Optional[str], match: Dict[str, Any]) -> None:
+    """
+    Count a match whose cached response has been evicted or has expired as a miss, and drop its index entry
+    """
+    print(f"Semantic cache entry {match['query_id']} points at a response that no longer exists")
+    remove(zipcode, match['query_id'])
+    semantic_stats["misses"] += 1
+    log_stats()
+
+def record_perplexity(elapsed_ms: float) -> None:
+    """
+    Count a Perplexity API call and how long it took
+    """
+    semantic_stats["perplexity_calls"] += 1
+    semantic_stats["perplexity_ms_total"] += elapsed_ms
+
+def log_stats() -> None:
+    if semantic_stats["lookups"]:
+        hit_rate = semantic_stats["hits"] / semantic_stats["lookups"]
+        print(f"Semantic cache stats: {semantic_stats['hits']}/{semantic_stats['lookups']} hits ({hit_rate:.1%}), "
+              f"{semantic_stats['audited']} audited, estimated {semantic_stats['estimated_ms_saved']:.0f} ms of Perplexity latency saved")
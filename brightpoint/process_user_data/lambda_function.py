@@ -3,6 +3,14 @@ import boto3
 from botocore.exceptions import ClientError
 from datetime import datetime
 
+try:
+    import translation_cache
+    import message_catalog
+except ImportError:
+    # The shared layer isn't attached; Translate is called without caching
+    translation_cache = None
+    message_catalog = None
+
 # Initialize the DynamoDB client
 dynamodb_client = boto3.client('dynamodb')
 # Initialize AWS Translate client
@@ -26,6 +34,9 @@ def lambda_handler(event, context):
             'statusCode': 500,
             'body': json.dumps({'error': 'Internal server error', 'details': str(e)})
         }
+    finally:
+        if translation_cache:
+            translation_cache.log_invocation_stats()
 
 def handle_websocket_event(event, context):
     """
@@ -244,6 +255,9 @@ def translate_text(text, target_language):
         if not text or target_language == 'en':
             return text
 
+        if translation_cache:
+            return translation_cache.translate(text, 'en', target_language, translate_client)
+
         response = translate_client.translate_text(
             Text=text,
             SourceLanguageCode='en',  # Source is English
@@ -254,6 +268,27 @@ def translate_text(text, target_language):
         print(f"Translation error: {str(e)}")
         return text  # Return original text if translation fails
 
+def localized_message(message_id, english_message, target_language, **values):
+    """
+    A fixed message in the user's language, from the shared layer's message catalog
+    (no Translate request), or translated when the layer isn't attached
+
+    Args:
+        message_id: Key of the message in message_catalog.MESSAGES
+        english_message: The message in English, with the same placeholders
+        target_language: Target language code ('en', 'es', 'pl')
+        **values: Value of each placeholder
+
+    Returns:
+        The message in the target language
+    """
+    if message_catalog:
+        return message_catalog.get_message(message_id, target_language, **values)
+    message = english_message.format(**values)
+    if target_language == 'en':
+        return message
+    return translate_text(message, target_language)
+
 def get_language_code(language):
     """
     Get language code for AWS Translate
@@ -533,9 +568,7 @@ def get_user_with_feedback_questions(user_id, language='english'):
 
         # Check if user exists
         if 'Item' not in response:
-            message = 'User not found'
-            if needs_translation:
-                message = translate_text(message, lang_code)
+            message = localized_message('user_not_found', 'User not found', lang_code)
 
             return {
                 'statusCode': 404,
@@ -626,13 +659,17 @@ def get_user_with_feedback_questions(user_id, language='english'):
 
             # Generate feedback questions for the top 5 referrals
             for referral in referrals_needing_feedback[:5]:
-                # Create the base question in English
-                english_question = f"Hi {user_id}, Did the referral {referral['agency']}, {referral['address']}, {referral['zipcode']} help you in {referral['service_category']}? Please reply with yes or no."
-
-                # Translate the question if needed
-                question = english_question
-                if needs_translation:
-                    question = translate_text(english_question, lang_code)
+                # The agency and service category are already translated if needed
+                question = localized_message(
+                    'feedback_question',
+                    "Hi {user_id}, Did the referral {agency}, {address}, {zipcode} help you in {service_category}? Please reply with yes or no.",
+                    lang_code,
+                    user_id=user_id,
+                    agency=referral['agency'],
+                    address=referral['address'],
+                    zipcode=referral['zipcode'],
+                    service_category=referral['service_category']
+                )
 
                 feedback_questions.append({
                     'referral_id': referral['referral_id'],
@@ -645,9 +682,7 @@ def get_user_with_feedback_questions(user_id, language='english'):
         formatted_user['referrals'] = formatted_referrals
 
         # Prepare the success message
-        success_message = 'User data retrieved successfully.'
-        if needs_translation:
-            success_message = translate_text(success_message, lang_code)
+        success_message = localized_message('user_data_retrieved', 'User data retrieved successfully.', lang_code)
 
         # Store the language preference in DynamoDB for future use
         if language != 'english':
@@ -681,7 +716,7 @@ def get_user_with_feedback_questions(user_id, language='english'):
     except Exception as e:
         error_message = f'Error retrieving user data: {str(e)}'
         if language.lower() in ['spanish', 'polish']:
-            error_message = translate_text(f'Error retrieving user data', get_language_code(language))
+            error_message = localized_message('user_data_error', 'Error retrieving user data', get_language_code(language))
 
         return {
             'statusCode': 500,
@@ -0,0 +1,164 @@
+import os
+import json
+import boto3
+from datetime import datetime
+from botocore.exceptions import ClientError
+import logging
+
+# Set up logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Initialize clients
+dynamodb_client = boto3.client('dynamodb')
+lambda_client = boto3.client('lambda', region_name="us-east-1")
+
+USER_TABLE_NAME = os.environ.get('USER_TABLE_NAME', 'user_data')
+# Chatbot Lambda that does the extraction (its "extractMany" action)
+CHATBOT_LAMBDA_NAME = os.environ.get('CHATBOT_LAMBDA_NAME', 'referralChatbotLambda')
+# Queries sent to the chatbot per invocation
+BACKFILL_CHUNK_SIZE = int(os.environ.get('BACKFILL_CHUNK_SIZE', '500'))
+# Stop starting new scan pages when less time than this is left, and hand back a start_key instead
+BACKFILL_TIME_RESERVE_MS = int(os.environ.get('BACKFILL_TIME_RESERVE_MS', '120000'))
+
+def lambda_handler(event, context):
+    """
+    Reclassify historical queries in user_data with the current service categories.
+    Each query's extracted categories and zipcode are written back onto its entry in
+    the user's queries map.
+
+    Expected input (all optional):
+    {
+        "since": "2025-01-01T00:00:00",   only reclassify queries asked at or after this time
+        "start_key": {...}                 resume from the start_key a previous run returned
+    }
+    """
+    since = event.get('since')
+    start_key = event.get('start_key')
+
+    stats = {"users": 0, "queries": 0, "updated": 0, "failed": 0}
+
+    try:
+        while True:
+            scan_args = {
+                'TableName': USER_TABLE_NAME,
+                'ProjectionExpression': 'user_id, queries'
+            }
+            if start_key:
+                scan_args['ExclusiveStartKey'] = start_key
+            response = dynamodb_client.scan(**scan_args)
+
+            entries = collect_queries(response.get('Items', []), since)
+            stats["users"] += len(response.get('Items', []))
+            stats["queries"] += len(entries)
+
+            for i in range(0, len(entries), BACKFILL_CHUNK_SIZE):
+                chunk = entries[i:i + BACKFILL_CHUNK_SIZE]
+                results = extract_many([text for _, _, text in chunk])
+                if results is None:
+                    stats["failed"] += len(chunk)
+                    continue
+                for (user_id, query_id, _), result in zip(chunk, results):
+                    if write_classification(user_id, query_id, result):
+                        stats["updated"] += 1
+                    else:
+                        stats["failed"] += 1
+
+            start_key = response.get('LastEvaluatedKey')
+            if not start_key:
+                break
+            if context and context.get_remaining_time_in_millis() < BACKFILL_TIME_RESERVE_MS:
+                logger.info("Running out of time, returning start_key to resume from")
+                break
+
+        logger.info(f"Backfill finished: {stats}")
+        return {
+            "statusCode": 200,
+            "body": json.dumps({
+                "stats": stats,
+                "start_key": start_key
+            })
+        }
+
+    except Exception as e:
+        logger.error(f"Error in backfill: {str(e)}")
+        return {
+            "statusCode": 500,
+            "body": json.dumps({
+                "error": str(e),
+                "stats": stats,
+                "start_key": start_key
+            })
+        }
+
+def collect_queries(items, since=None):
+    """
+    Pull (user_id, query_id, query text) out of scanned user_data items.
+    The English translation is classified when there is one, as the chatbot does.
+    """
+    entries = []
+    for item in items:
+        user_id = item.get('user_id', {}).get('S')
+        queries = item.get('queries', {}).get('M', {})
+        for query_id, query in queries.items():
+            fields = query.get('M', {})
+            text = fields.get('english_query', {}).get('S') or fields.get('query', {}).get('S')
+            if not user_id or not text:
+                continue
+            if since and fields.get('timestamp', {}).get('S', '') < since:
+                continue
+            entries.append((user_id, query_id, text))
+    return entries
+
+def extract_many(queries):
+    """
+    Classify a list of queries with the chatbot's bulk extraction
+
+    Returns:
+        list: One {"service_categories": [...], "zipcode": ...} result per query, or None on failure
+    """
+    try:
+        response = lambda_client.invoke(
+            FunctionName=CHATBOT_LAMBDA_NAME,
+            InvocationType='RequestResponse',
+            Payload=json.dumps({"action": "extractMany", "queries": queries})
+        )
+        payload = json.loads(response['Payload'].read().decode('utf-8'))
+        body = json.loads(payload.get('body', '{}'))
+        results = body.get('results')
+        if payload.get('statusCode') != 200 or not isinstance(results, list) or len(results) != len(queries):
+            logger.error(f"Unexpected extraction response: {payload}")
+            return None
+        return results
+    except Exception as e:
+        logger.error(f"Error calling chatbot Lambda: {str(e)}")
+        return None
+
+def write_classification(user_id, query_id, result):
+    """
+    Store a query's extracted categories and zipcode on its entry in the user's queries map
+    """
+    categories = [str(category) for category in result.get('service_categories') or []]
+    zipcode = result.get('zipcode')
+    try:
+        dynamodb_client.update_item(
+            TableName=USER_TABLE_NAME,
+            Key={'user_id': {'S': user_id}},
+            UpdateExpression="SET queries.#qid.service_categories = :categories, "
+                             "queries.#qid.extracted_zipcode = :zipcode, "
+                             "queries.#qid.classified_at = :classified_at",
+            ConditionExpression="attribute_exists(queries.#qid)",
+            ExpressionAttributeNames={'#qid': query_id},
+            ExpressionAttributeValues={
+                ':categories': {'L': [{'S': category} for category in categories]},
+                ':zipcode': {'S': str(zipcode)} if zipcode else {'NULL': True},
+                ':classified_at': {'S': datetime.now().isoformat()}
+            }
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            logger.info(f"Query {query_id} for user {user_id} was removed, skipping")
+        else:
+            logger.error(f"Error updating query {query_id} for user {user_id}: {str(e)}")
+        return False
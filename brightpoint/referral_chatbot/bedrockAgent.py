@@ -1,14 +1,29 @@
 import json
+import os
 import boto3
 import re
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from decimal import Decimal
 from typing import Dict, Any, List, Optional, Tuple
 import getServiceCategories
+import catalogIndex
+import nearbyZips
+import localExtractor
+import extractionCache
+import categoryMatcher
 import logging
 from boto3.dynamodb.conditions import Attr
 from boto3.dynamodb.types import TypeDeserializer
 import traceback
+import time
+
+try:
+    import catalog_translations
+except ImportError:
+    # The shared layer isn't attached; referrals are formatted in English only
+    catalog_translations = None
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -39,6 +54,81 @@ table = dynamodb.Table("referral_data")
 user_data_table = dynamodb.Table("user_data")
 inference_profile_arn = "us.anthropic.claude-3-7-sonnet-20250219-v1:0"
 
+# Secondary indexes on referral_data (created by migrate_referral_indexes.py)
+REFERRAL_CATEGORY_ZIP_INDEX = os.environ.get('REFERRAL_CATEGORY_ZIP_INDEX', 'ServiceCategory-Zip-index')
+REFERRAL_ZIP_INDEX = os.environ.get('REFERRAL_ZIP_INDEX', 'ServiceAreaZip-index')
+MAX_PARALLEL_QUERIES = 8
+# Bulk extraction: queries packed into one model request, and model requests in flight at once
+EXTRACTION_BATCH_SIZE = int(os.environ.get('EXTRACTION_BATCH_SIZE', '25'))
+EXTRACTION_BATCH_CONCURRENCY = int(os.environ.get('EXTRACTION_BATCH_CONCURRENCY', '4'))
+deserializer = TypeDeserializer()
+
+def invoke_extraction_model(prompt: str, max_tokens: int = 1000) -> str:
+    """
+    Send an extraction prompt to Bedrock and return the text of the reply
+
+    Args:
+        prompt: The prompt to send
+        max_tokens: Upper bound on the reply length
+
+    Returns:
+        str: The model's reply
+    """
+    bedrock_start = time.time()
+    response = bedrock.invoke_model(
+        modelId=inference_profile_arn,
+        body=json.dumps({
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": max_tokens,
+            "system": "You are a specialized assistant that extracts specific structured information from human services queries.",
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ]
+        })
+    )
+
+    # Parse response from Bedrock
+    response_body = json.loads(response['body'].read())
+    content = response_body['content'][0]['text']
+    localExtractor.record_bedrock((time.time() - bedrock_start) * 1000)
+
+    logger.info(f"Response from Bedrock model: {response_body}")
+    return content
+
+def parse_model_json(content: str) -> Optional[Any]:
+    """
+    Parse the JSON in a model reply, tolerating markdown code fences and text around it
+
+    Returns:
+        Optional[Any]: The parsed JSON, or None if the reply doesn't contain any
+    """
+    # Clean up the content - remove markdown code blocks if present
+    content = content.strip()
+    if content.startswith("```json") or content.startswith("```"):
+        content = re.sub(r'^```json\s*', '', content)
+        content = re.sub(r'^```\s*', '', content)
+        content = re.sub(r'\s*```$', '', content)
+
+    try:
+        # Try to parse the content as JSON
+        return json.loads(content)
+
+    except json.JSONDecodeError as e:
+        print(f"JSON parsing failed: {str(e)}")
+
+        # Try to extract JSON from the response if there's extra text
+        json_match = re.search(r'({.*})', content, re.DOTALL)
+        if json_match:
+            try:
+                return json.loads(json_match.group(1))
+            except Exception as e:
+                print(f"Failed to parse extracted JSON: {str(e)}")
+
+        return None
+
 def extract_categories_and_zipcode(query: str) -> Dict[str, Any]:
     """
     Args:
@@ -47,10 +137,33 @@ def extract_categories_and_zipcode(query: str) -> Dict[str, Any]:
         Dict[str, Any]: Parsed response with extracted service categories and zipcode
     """
     try:
-        # Use a valid model ID
-        model_id = inference_profile_arn
-
-        logger.info(f"Fetched service categories {getServiceCategories.getUniqueCategories()}")
+        available_categories = getServiceCategories.getUniqueCategories()
+        logger.info(f"Fetched service categories {available_categories}")
+
+        # Easy queries ("food pantry 60056") are answered locally without a model call
+        local_result, confidence = localExtractor.extract_local(query, available_categories)
+        logger.info(f"Local extraction {local_result} with confidence {confidence}")
+        if confidence >= localExtractor.LOCAL_EXTRACTOR_MIN_CONFIDENCE:
+            localExtractor.record_fast_path()
+            return local_result
+
+        # Same query against the same category list already went through Bedrock
+        cached_result = extractionCache.get_cached_extraction(query, available_categories)
+        if cached_result is not None:
+            logger.info(f"Extraction cache hit {cached_result}")
+            return cached_result
+
+        # Optional vector matcher: answers on its own, or narrows the categories Bedrock is shown
+        prompt_categories = available_categories
+        if categoryMatcher.is_enabled():
+            if categoryMatcher.CATEGORY_MATCHER_MODE == 'answer':
+                matched_result = categoryMatcher.answer(query, available_categories)
+                if matched_result is not None:
+                    logger.info(f"Category matcher answered {matched_result}")
+                    return matched_result
+            else:
+                prompt_categories = categoryMatcher.prune(query, available_categories)
+                logger.info(f"Category matcher candidates {prompt_categories}")
 
         prompt = f"""
         TASK: Extract TWO key pieces of information from this query:
@@ -60,7 +173,7 @@ def extract_categories_and_zipcode(query: str) -> Dict[str, Any]:
         User Query: "{query}"
         
         AVAILABLE SERVICE CATEGORIES IN DATABASE:
-        {', '.join(getServiceCategories.getUniqueCategories())}
+        {', '.join(prompt_categories)}
         
         DETAILED INSTRUCTIONS:
         
@@ -98,63 +211,222 @@ def extract_categories_and_zipcode(query: str) -> Dict[str, Any]:
         The response must be valid, parseable JSON with no additional text.
         """
 
-        response = bedrock.invoke_model(
-            modelId=model_id,
-            body=json.dumps({
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 1000,
-                "system": "You are a specialized assistant that extracts specific structured information from human services queries.",
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            })
-        )
+        result = parse_model_json(invoke_extraction_model(prompt))
+        if not isinstance(result, dict):
+            return {"service_categories": [], "zipcode": None}
+
+        extractionCache.put_cached_extraction(query, available_categories, result)
+        return result
+
+    except Exception as e:
+        print(f"Error in Bedrock API call: {str(e)}")
+        return {"service_categories": [], "zipcode": None}
+
+def extract_batch_with_bedrock(queries: List[str], available_categories: List[str]) -> List[Optional[Dict[str, Any]]]:
+    """
+    Extract categories and zipcodes for several queries with a single model request
+
+    Args:
+        queries: Queries to classify
+        available_categories: Live service category names
+
+    Returns:
+        List[Optional[Dict[str, Any]]]: One result per query, in order; None where the model
+        gave no usable answer for that query
+    """
+    numbered_queries = '\n'.join(f'{i}. {json.dumps(query, ensure_ascii=False)}' for i, query in enumerate(queries))
+    prompt = f"""
+        TASK: For EACH numbered query below, extract:
+        1. ALL RELEVANT SERVICE CATEGORIES that match what the user is asking for
+        2. The specific ZIPCODE where they need these services
+
+        QUERIES:
+        {numbered_queries}
+
+        AVAILABLE SERVICE CATEGORIES IN DATABASE:
+        {', '.join(available_categories)}
+
+        INSTRUCTIONS:
+        - Treat every query on its own; never carry categories or zipcodes from one query to another
+        - Only use categories from the list above, exact matches first, followed by similar/related matches
+        - Consider synonyms and related concepts (e.g., "hungry" → "Food Pantry", "can't pay rent" → "Housing")
+        - If no categories match or relate, use an empty array
+        - The zipcode is the 5-digit zipcode in the query, or null if none is mentioned
+
+        RESPONSE FORMAT:
+        Return ONLY a JSON object with one entry per query, using the query's number as "id":
+        {{
+            "results": [
+                {{"id": 0, "service_categories": ["category1", ...], "zipcode": "5-digit zipcode or null"}},
+                ...
+            ]
+        }}
+
+        The response must be valid, parseable JSON with no additional text.
+        """
+
+    # Roughly 60 tokens per answer, plus room for the wrapper
+    parsed = parse_model_json(invoke_extraction_model(prompt, max_tokens=200 + 60 * len(queries)))
 
-        # Parse response from Bedrock
-        response_body = json.loads(response['body'].read())
-        content = response_body['content'][0]['text']
+    results = [None] * len(queries)
+    if not isinstance(parsed, dict) or not isinstance(parsed.get('results'), list):
+        return results
 
-        logger.info(f"Response from Bedrock model: {response_body}")
+    for entry in parsed['results']:
+        try:
+            i = int(entry.get('id'))
+        except (AttributeError, TypeError, ValueError):
+            continue
+        if 0 <= i < len(queries) and isinstance(entry.get('service_categories'), list):
+            results[i] = {
+                "service_categories": entry['service_categories'],
+                "zipcode": entry.get('zipcode')
+            }
+    return results
+
+def extract_categories_and_zipcode_many(queries: List[str]) -> List[Dict[str, Any]]:
+    """
+    Extract categories and zipcodes for many queries at once, e.g. to reclassify
+    historical queries after a taxonomy change.
+
+    Queries that only differ in case, spacing or punctuation are extracted once. Each
+    distinct query goes through the local extractor, the extraction cache and (in answer
+    mode) the category matcher first; the rest are packed EXTRACTION_BATCH_SIZE to a model request, with at most
+    EXTRACTION_BATCH_CONCURRENCY requests in flight. Queries a batch reply leaves out are
+    retried one at a time.
+
+    Args:
+        queries: The queries to classify
+
+    Returns:
+        List[Dict[str, Any]]: One {"service_categories": [...], "zipcode": ...} result per input query, in order
+    """
+    available_categories = getServiceCategories.getUniqueCategories()
+
+    # Normalized query -> first query seen with that text
+    distinct = {}
+    for query in queries:
+        distinct.setdefault(extractionCache.normalize_query(query or ''), query or '')
+
+    extracted = {}
+    pending = []
+    for key, query in distinct.items():
+        if not key:
+            extracted[key] = {"service_categories": [], "zipcode": None}
+            continue
+
+        local_result, confidence = localExtractor.extract_local(query, available_categories)
+        if confidence >= localExtractor.LOCAL_EXTRACTOR_MIN_CONFIDENCE:
+            extracted[key] = local_result
+            continue
+
+        cached_result = extractionCache.get_cached_extraction(query, available_categories)
+        if cached_result is not None:
+            extracted[key] = cached_result
+            continue
 
-        # Clean up the content - remove markdown code blocks if present
-        content = content.strip()
-        if content.startswith("```json") or content.startswith("```"):
-            content = re.sub(r'^```json\s*', '', content)
-            content = re.sub(r'^```\s*', '', content)
-            content = re.sub(r'\s*```$', '', content)
+        if categoryMatcher.is_enabled() and categoryMatcher.CATEGORY_MATCHER_MODE == 'answer':
+            matched_result = categoryMatcher.answer(query, available_categories)
+            if matched_result is not None:
+                extracted[key] = matched_result
+                continue
 
-        # Extract JSON from response
+        pending.append(key)
+
+    batches = [pending[i:i + EXTRACTION_BATCH_SIZE] for i in range(0, len(pending), EXTRACTION_BATCH_SIZE)]
+
+    def run_batch(batch: List[str]) -> List[Optional[Dict[str, Any]]]:
         try:
-            # Try to parse the content as JSON
-            result = json.loads(content)
-            return result
+            return extract_batch_with_bedrock([distinct[key] for key in batch], available_categories)
+        except Exception as e:
+            logger.error(f"Error in batch extraction: {str(e)}")
+            return [None] * len(batch)
+
+    retries = []
+    if batches:
+        with ThreadPoolExecutor(max_workers=min(EXTRACTION_BATCH_CONCURRENCY, len(batches))) as executor:
+            for batch, batch_results in zip(batches, executor.map(run_batch, batches)):
+                for key, result in zip(batch, batch_results):
+                    if result is None:
+                        retries.append(key)
+                        continue
+                    extracted[key] = result
+                    extractionCache.put_cached_extraction(distinct[key], available_categories, result)
 
-        except json.JSONDecodeError as e:
-            print(f"JSON parsing failed: {str(e)}")
+    for key in retries:
+        extracted[key] = extract_categories_and_zipcode(distinct[key])
 
-            # Try to extract JSON from the response if there's extra text
-            json_match = re.search(r'({.*})', content, re.DOTALL)
-            if json_match:
-                try:
-                    json_str = json_match.group(1)
-                    result = json.loads(json_str)
-                    return result
-                except Exception as e:
-                    print(f"Failed to parse extracted JSON: {str(e)}")
-                    return {"service_categories": [], "zipcode": None}
+    logger.info(f"Bulk extraction: {len(queries)} queries, {len(distinct)} distinct, "
+                f"{len(pending)} sent to Bedrock in {len(batches)} batch requests, {len(retries)} retried singly")
 
-            return {"service_categories": [], "zipcode": None}
+    return [dict(extracted[extractionCache.normalize_query(query or '')]) for query in queries]
 
-    except Exception as e:
-        print(f"Error in Bedrock API call: {str(e)}")
-        return {"service_categories": [], "zipcode": None}
+def query_referral_index(index_name: str, key_condition: str, attribute_names: Dict[str, str],
+                         attribute_values: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Run a paginated Query against a referral_data secondary index.
+    Uses the low-level client (safe to share between threads) and deserializes
+    the items into the same shape the table resource returns.
+    """
+    query_args = {
+        "TableName": "referral_data",
+        "IndexName": index_name,
+        "KeyConditionExpression": key_condition,
+        "ExpressionAttributeNames": attribute_names,
+        "ExpressionAttributeValues": attribute_values
+    }
+
+    items = []
+    while True:
+        response = dynamodb_client.query(**query_args)
+        for item in response.get('Items', []):
+            items.append({key: deserializer.deserialize(value) for key, value in item.items()})
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_args["ExclusiveStartKey"] = response['LastEvaluatedKey']
+
+    return items
+
+def query_services_for_category(category: str, zipcode: Optional[int]) -> List[Dict[str, Any]]:
+    """
+    Query the category/zip index for one service category, optionally narrowed to a zip code
+    """
+    attribute_names = {"#sc": "Service Category Type"}
+    attribute_values = {":category": {"S": category}}
+    key_condition = "#sc = :category"
+
+    if zipcode is not None:
+        attribute_names["#zip"] = "Service Area Zip Code"
+        attribute_values[":zip"] = {"N": str(zipcode)}
+        key_condition += " AND #zip = :zip"
+
+    return query_referral_index(REFERRAL_CATEGORY_ZIP_INDEX, key_condition, attribute_names, attribute_values)
+
+def query_services_by_index(service_categories: Optional[List[str]], zipcode: Optional[int]) -> List[Dict[str, Any]]:
+    """
+    Find services with key-based Queries instead of a filtered Scan.
+    Issues one Query per requested category in parallel, or a single Query
+    on the zip index when only a zip code is given.
+    """
+    if service_categories:
+        categories = list(dict.fromkeys(service_categories))
+        with ThreadPoolExecutor(max_workers=min(len(categories), MAX_PARALLEL_QUERIES)) as executor:
+            results = executor.map(lambda category: query_services_for_category(category, zipcode), categories)
+            return [item for items in results for item in items]
+
+    return query_referral_index(
+        REFERRAL_ZIP_INDEX,
+        "#zip = :zip",
+        {"#zip": "Service Area Zip Code"},
+        {":zip": {"N": str(zipcode)}}
+    )
 
 def query_dynamodb_for_services(service_categories: Optional[List[str]], zipcode: Optional[str]) -> List[Dict[str, Any]]:
     """
-    Query DynamoDB for services matching the given categories and zipcode using scan operation
+    Find services matching the given categories and zipcode.
+    Served from the per-container catalog index, falling back to Queries on the
+    referral_data secondary indexes (or a scan if those are unavailable)
+    when the catalog can't be loaded.
     """
     try:
         print(f"DEBUG - Input parameters: service_categories={service_categories}, zipcode={zipcode}")
@@ -169,6 +441,18 @@ def query_dynamodb_for_services(service_categories: Optional[List[str]], zipcode
             print("Inside Zipcode IF")
             clean_zip = int(zipcode.strip())
 
+        # Answer from the in-memory catalog index when it is available
+        indexed_services = catalogIndex.find_services(table, service_categories, clean_zip if zipcode else None)
+        if indexed_services is not None:
+            logger.info(f"Catalog index returned {len(indexed_services)} services")
+            return indexed_services
+
+        logger.warning("Catalog index unavailable, querying referral_data indexes")
+        try:
+            return query_services_by_index(service_categories, clean_zip if zipcode else None)
+        except Exception as e:
+            logger.error(f"Index query failed, falling back to DynamoDB scan: {str(e)}")
+
         # Create FilterExpression with appropriate conditions
         if service_categories and zipcode:
             filter_expr = Attr('Service Category Type').is_in(service_categories) & Attr('Service Area Zip Code').eq(clean_zip)
@@ -215,8 +499,74 @@ def query_dynamodb_for_services(service_categories: Optional[List[str]], zipcode
         return []
 
 
+def find_nearby_services(service_categories: Optional[List[str]], zipcode: Optional[str]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Find services in the zip codes nearest to the requested one, for use when
+    the exact zip code has no matches.
+
+    Args:
+        service_categories: Optional list of service categories to match
+        zipcode: Zip code the user asked about
+
+    Returns:
+        Tuple[List[Dict[str, Any]], List[str]]: Services sorted by distance (each with a
+        'Distance Miles' value) and the nearby zip codes they came from
+    """
+    try:
+        if not zipcode or not zipcode.strip().isdigit():
+            return [], []
+
+        clean_zip = int(zipcode.strip())
+        covered_zips = catalogIndex.covered_zip_codes(table, service_categories)
+        if covered_zips is None:
+            logger.warning("Catalog index unavailable, skipping nearby zip search")
+            return [], []
+
+        if clean_zip not in nearbyZips.load_zip_centroids():
+            nearbyZips.record_lookup("unknown_zip")
+            return [], []
+
+        nearby = nearbyZips.find_nearby_zips(clean_zip, covered_zips)
+        services = []
+        for nearby_zip, distance in nearby:
+            for service in catalogIndex.find_services(table, service_categories, nearby_zip) or []:
+                service['Distance Miles'] = Decimal(str(round(distance, 1)))
+                services.append(service)
+
+        nearbyZips.record_lookup("local_hits" if services else "no_nearby_services")
+        logger.info(f"Found {len(services)} services in nearby zip codes {[zip_code for zip_code, _ in nearby]}")
+        return services, [f"{zip_code:05d}" for zip_code, _ in nearby]
+    except Exception as e:
+        logger.error(f"Error finding nearby services: {str(e)}")
+        return [], []
+
+def is_catalog_translation_attribute(key: str) -> bool:
+    # Stored catalog translations ("Hours#es" etc.) and their source fingerprint, which
+    # catalog_translations adds at ingest; never shown as details of their own
+    if catalog_translations is not None:
+        return key in catalog_translations.LOCALIZED_ATTRIBUTES
+    # Without the shared layer, go by the attribute naming it uses
+    return '#' in key or key == 'translations_source'
+
+def localized_service_fields(service: Dict[str, Any], language_code: str) -> Dict[str, str]:
+    """
+    A referral's stored translations into a language, by English field name (empty for English,
+    for rows without current translations, or without the shared layer)
+    """
+    if language_code == 'en' or catalog_translations is None:
+        return {}
+    return catalog_translations.localized_fields(service, language_code)
+
+def localized_texts(services: List[Dict[str, Any]], language_code: str) -> set:
+    """
+    Every stored translation format_response uses for these services, so they aren't translated again
+    """
+    return {value for service in services for value in localized_service_fields(service, language_code).values()}
+
 def format_response(services: List[Dict[str, Any]], service_categories: Optional[List[str]],
-                    zipcode: Optional[str] = None, user_id: str = None) -> Dict[str, Any]:
+                    zipcode: Optional[str] = None, user_id: str = None,
+                    nearby_zipcodes: Optional[List[str]] = None, language_code: str = 'en',
+                    store_referrals: bool = True) -> Dict[str, Any]:
     """
     Formats the service data into a JSON response and stores referrals in user_data table.
 
@@ -225,6 +575,10 @@ def format_response(services: List[Dict[str, Any]], service_categories: Optional
         service_categories: Optional list of service categories that were searched for
         zipcode: Optional zipcode that was searched for
         user_id: User ID for storing referrals (required)
+        nearby_zipcodes: Nearby zip codes the services came from, when the zipcode itself had none
+        language_code: Language of the referral fields translated at ingest (organization, hours,
+            eligibility, availability, referral process); other text stays in English
+        store_referrals: Whether to add the services to the user's referrals
 
     Returns:
         JSON formatted response
@@ -265,6 +619,14 @@ def format_response(services: List[Dict[str, Any]], service_categories: Optional
         else:
             response_data["message"] = "Here are the services that match your query."
 
+        if nearby_zipcodes:
+            response_data["nearby_zipcodes"] = nearby_zipcodes
+            nearby_str = ", ".join(nearby_zipcodes)
+            if service_categories and len(service_categories) > 0:
+                response_data["message"] = f"I couldn't find any {categories_str} services in the {zipcode} area, but here are services in nearby zip codes ({nearby_str})."
+            else:
+                response_data["message"] = f"I couldn't find any services in the {zipcode} area, but here are services in nearby zip codes ({nearby_str})."
+
         # Format service details and add referral_id to each service
         for i, service in enumerate(services):
             # Set referral_id to be the same as user_id
@@ -272,6 +634,8 @@ def format_response(services: List[Dict[str, Any]], service_categories: Optional
 
             # Handle Organization field (was Agency)
             organization_name = service.get('\ufeffOrganization', service.get('Organization', 'Unnamed Service'))
+            localized = localized_service_fields(service, language_code)
+            organization_name = localized.get('Organization', organization_name)
 
             service_details = {
                 "agency": organization_name,  # Keep output field name as "agency" for backward compatibility
@@ -281,12 +645,12 @@ def format_response(services: List[Dict[str, Any]], service_categories: Optional
             # Add referral process if available
             referral = service.get('Referral Process', '')
             if referral and referral.lower() != 'not specified':
-                service_details["details"]["referral_process"] = referral
+                service_details["details"]["referral_process"] = localized.get('Referral Process', referral)
 
             # Add hours if available
             hours = service.get('Hours', '')
             if hours and hours.lower() != 'information not found':
-                service_details["details"]["hours"] = hours
+                service_details["details"]["hours"] = localized.get('Hours', hours)
 
             # Add referral_id to details
             service_details["details"]["referral_id"] = user_id
@@ -294,17 +658,18 @@ def format_response(services: List[Dict[str, Any]], service_categories: Optional
             # Add eligibility if available
             eligibility = service.get('Eligibility Requirements', '')
             if eligibility and eligibility.lower() != 'not specified':
-                service_details["details"]["eligibility"] = eligibility
+                service_details["details"]["eligibility"] = localized.get('Eligibility Requirements', eligibility)
 
             # Add service availability if available
             availability = service.get('Service Availability', '')
             if availability and availability.lower() != 'not specified':
-                service_details["details"]["service_availability"] = availability
+                service_details["details"]["service_availability"] = localized.get('Service Availability', availability)
 
             # Add any other fields that might be useful
             for key, value in service.items():
                 if key not in ['\ufeffOrganization', 'Organization', 'Referral Process', 'Hours',
-                             'Eligibility Requirements', 'Service Availability', 'referral_id'] and value:
+                             'Eligibility Requirements', 'Service Availability', 'referral_id'] and value \
+                        and not is_catalog_translation_attribute(key):
                     # Don't duplicate data we've already included
                     service_details["details"][key.lower().replace(" ", "_")] = value
 
@@ -312,7 +677,7 @@ def format_response(services: List[Dict[str, Any]], service_categories: Optional
             response_data["services"].append(service_details)
 
         # Always attempt to store referrals if services were found
-        if services:
+        if services and store_referrals:
             print(f"Services found, adding referrals for user {user_id}")
             add_referrals_to_user_data(user_id, services)
 
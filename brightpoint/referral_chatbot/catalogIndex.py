@@ -0,0 +1,230 @@
+import os
+import time
+import logging
+import threading
+from decimal import Decimal
+from typing import Dict, Any, List, Optional, Iterable, Tuple, Callable
+import catalogSnapshot
+import getServiceCategories
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# How long a loaded catalog is trusted before it is re-read from referral_data
+CATALOG_INDEX_TTL_SECONDS = int(os.environ.get('CATALOG_INDEX_TTL_SECONDS', '900'))
+# After a failed refresh, the previous catalog is served this long before the next attempt
+CATALOG_INDEX_RETRY_SECONDS = 30
+# A catalog whose version hasn't changed is still reloaded once it is this old, so writes
+# that didn't bump the version (console edits, a failed bump) show up eventually
+CATALOG_INDEX_MAX_AGE_SECONDS = int(os.environ.get('CATALOG_INDEX_MAX_AGE_SECONDS', str(4 * CATALOG_INDEX_TTL_SECONDS)))
+
+# Per-container catalog state. Lambda reuses the module between invocations,
+# so the catalog is only read on cold start or when the TTL expires.
+_catalog_lock = threading.Lock()
+_catalog = {
+    "loaded_at": 0.0,
+    "built_at": 0.0,        # when the index was last built from the catalog data
+    "source": None,
+    "version": None,        # catalog version the index was built from
+    "item_count": 0,
+    "get_item": None,       # position -> item
+    "by_category_zip": {},  # category -> zip -> [position]
+    "by_category": {},      # category -> [position]
+    "by_zip": {},           # zip -> [position]
+}
+
+def normalize_zip(value: Any) -> Optional[int]:
+    """
+    Convert a stored 'Service Area Zip Code' value to the integer key used by the index.
+    Only numeric values are indexed, matching the numeric comparison the Scan filter performs.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, Decimal)):
+        if value % 1 != 0:
+            return None
+        return int(value)
+    return None
+
+def build_catalog_index(keys: Iterable[Tuple[Optional[str], Optional[int]]], item_count: int,
+                        get_item: Callable[[int], Dict[str, Any]], source: str,
+                        version: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    Build the category -> zip -> items maps
+
+    Args:
+        keys: (category, zip) for every catalog position, in table order
+        item_count: Number of catalog items
+        get_item: Returns the item stored at a position
+        source: Where the catalog was loaded from, for logging
+        version: Catalog version from the metadata item, if known
+
+    Returns:
+        Dict[str, Any]: Index maps keyed by category and zip code
+    """
+    by_category_zip = {}
+    by_category = {}
+    by_zip = {}
+
+    for position, (category, zip_code) in enumerate(keys):
+        if isinstance(category, str):
+            by_category.setdefault(category, []).append(position)
+            if zip_code is not None:
+                by_category_zip.setdefault(category, {}).setdefault(zip_code, []).append(position)
+
+        if zip_code is not None:
+            by_zip.setdefault(zip_code, []).append(position)
+
+    now = time.time()
+    return {
+        "loaded_at": now,
+        "built_at": now,
+        "source": source,
+        "version": version,
+        "item_count": item_count,
+        "get_item": get_item,
+        "by_category_zip": by_category_zip,
+        "by_category": by_category,
+        "by_zip": by_zip,
+    }
+
+def build_index_from_items(items: List[Dict[str, Any]], version: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    Index items read from referral_data
+    """
+    keys = ((item.get('Service Category Type'), normalize_zip(item.get('Service Area Zip Code'))) for item in items)
+    return build_catalog_index(keys, len(items), items.__getitem__, "dynamodb", version)
+
+def build_index_from_snapshot(snapshot: catalogSnapshot.CatalogSnapshot, version: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    Index a catalog snapshot using only its category and zip columns; rows are decoded on lookup
+    """
+    keys = ((snapshot.category(row), snapshot.zip_code(row)) for row in range(snapshot.row_count))
+    return build_catalog_index(keys, snapshot.row_count, snapshot.row, "snapshot", version)
+
+def load_catalog_items(table) -> List[Dict[str, Any]]:
+    """
+    Read every item of referral_data with a paginated Scan
+    """
+    response = table.scan()
+    items = response.get('Items', [])
+
+    while 'LastEvaluatedKey' in response:
+        response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+        items.extend(response.get('Items', []))
+
+    return items
+
+def refresh_catalog_index(table) -> None:
+    """
+    Load the catalog and swap it in as the current index.
+    Uses the snapshot shipped with the code when it is fresh, otherwise reads referral_data.
+    """
+    global _catalog
+
+    start = time.time()
+    # Read the version before the data, so a write that lands during the load triggers another reload
+    version = getServiceCategories.get_catalog_version()
+    snapshot = catalogSnapshot.load_catalog_snapshot(version)
+    if snapshot is not None:
+        _catalog = build_index_from_snapshot(snapshot, version)
+    else:
+        _catalog = build_index_from_items(load_catalog_items(table), version)
+    logger.info(f"Catalog index loaded {_catalog['item_count']} referral items from {_catalog['source']} "
+                f"in {(time.time() - start) * 1000:.1f} ms")
+
+def invalidate_catalog_index() -> None:
+    """
+    Force the next lookup to reload the catalog
+    """
+    with _catalog_lock:
+        _catalog["loaded_at"] = 0.0
+
+def ensure_catalog_index(table) -> bool:
+    """
+    Make sure a usable index is loaded, refreshing it when the TTL has expired.
+
+    Returns:
+        bool: True if an index is available, False if the catalog could not be loaded
+    """
+    # get_item is only missing while no catalog has loaded yet (a failed first load is backing off)
+    if time.time() - _catalog["loaded_at"] < CATALOG_INDEX_TTL_SECONDS:
+        return _catalog["get_item"] is not None
+
+    with _catalog_lock:
+        # Another thread may have refreshed while we waited for the lock
+        if time.time() - _catalog["loaded_at"] < CATALOG_INDEX_TTL_SECONDS:
+            return _catalog["get_item"] is not None
+        try:
+            # Nothing was written since the index was built, so keep it without reloading
+            version = getServiceCategories.get_catalog_version()
+            if (_catalog["item_count"] > 0 and version is not None and version == _catalog["version"]
+                    and time.time() - _catalog["built_at"] < CATALOG_INDEX_MAX_AGE_SECONDS):
+                _catalog["loaded_at"] = time.time()
+                return True
+
+            refresh_catalog_index(table)
+            return True
+        except Exception as e:
+            logger.error(f"Error loading catalog index: {str(e)}")
+            # Back off instead of having every request retry the load while DynamoDB is struggling
+            _catalog["loaded_at"] = time.time() - CATALOG_INDEX_TTL_SECONDS + CATALOG_INDEX_RETRY_SECONDS
+            # Keep serving the previous catalog if there is one
+            return _catalog["item_count"] > 0
+
+def find_services(table, service_categories: Optional[List[str]], zipcode: Optional[int]) -> Optional[List[Dict[str, Any]]]:
+    """
+    Look up services in the in-memory catalog.
+
+    Returns the same items (as shallow copies) that a Scan with
+    'Service Category Type' IN categories AND 'Service Area Zip Code' = zipcode would return.
+
+    Args:
+        table: referral_data table resource, used only when the catalog needs (re)loading
+        service_categories: Optional list of categories to match exactly
+        zipcode: Optional numeric zip code
+
+    Returns:
+        Optional[List[Dict[str, Any]]]: Matching items, or None if the catalog is unavailable
+    """
+    if not ensure_catalog_index(table):
+        return None
+
+    catalog = _catalog
+    positions = []
+
+    if service_categories and zipcode is not None:
+        for category in set(service_categories):
+            positions.extend(catalog["by_category_zip"].get(category, {}).get(zipcode, []))
+    elif service_categories:
+        for category in set(service_categories):
+            positions.extend(catalog["by_category"].get(category, []))
+    elif zipcode is not None:
+        positions.extend(catalog["by_zip"].get(zipcode, []))
+
+    # Return items in table order, the same order the Scan produced
+    positions.sort()
+
+    # Copy so callers can't modify the cached catalog
+    get_item = catalog["get_item"]
+    return [dict(get_item(position)) for position in positions]
+
+def covered_zip_codes(table, service_categories: Optional[List[str]]) -> Optional[List[int]]:
+    """
+    List the zip codes that have at least one service in the given categories
+    (or any service when no categories are given).
+
+    Returns:
+        Optional[List[int]]: Covered zip codes, or None if the catalog is unavailable
+    """
+    if not ensure_catalog_index(table):
+        return None
+
+    catalog = _catalog
+    if not service_categories:
+        return list(catalog["by_zip"])
+
+    covered = set()
+    for category in set(service_categories):
+        covered.update(catalog["by_category_zip"].get(category, {}))
+    return list(covered)
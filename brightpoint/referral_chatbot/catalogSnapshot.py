@@ -0,0 +1,275 @@
+import os
+import json
+import mmap
+import time
+import struct
+import logging
+from array import array
+from decimal import Decimal
+from typing import Dict, Any, List, Optional, Iterator
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Snapshot of referral_data compiled by build_catalog_snapshot.py and shipped with the Lambda code
+CATALOG_SNAPSHOT_PATH = os.environ.get(
+    'CATALOG_SNAPSHOT_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalog_snapshot.bin')
+)
+# Snapshots older than this are ignored and the catalog is read from DynamoDB instead
+CATALOG_SNAPSHOT_MAX_AGE_SECONDS = int(os.environ.get('CATALOG_SNAPSHOT_MAX_AGE_SECONDS', str(7 * 24 * 60 * 60)))
+
+SNAPSHOT_MAGIC = b"BPCSNAP1"
+SNAPSHOT_FORMAT_VERSION = 1
+
+# Columns stored as dictionary codes (few distinct values, repeated on many rows)
+DICTIONARY_COLUMNS = ["Service Category Type", "City", "Organization"]
+# Column stored as a plain integer array
+ZIP_COLUMN = "Service Area Zip Code"
+
+MISSING_CODE = 0xFFFFFFFF
+MISSING_ZIP = -1
+
+# File layout (integers in native byte order, sections 4-byte aligned):
+#
+#   8 bytes   magic "BPCSNAP1"
+#   uint32    header length
+#   bytes     JSON header: built_at, row_count, dictionaries, text column names, section offsets
+#   sections  uint32 codes per dictionary column   (row_count each, MISSING_CODE if absent)
+#             int32 zip column                      (row_count, MISSING_ZIP if absent)
+#             uint32 text offsets                   (row_count * text_columns + 1)
+#             text blob                             (UTF-8, each cell prefixed with its type, 'S' or 'N')
+
+def write_catalog_snapshot(items: List[Dict[str, Any]], path: str, built_at: Optional[float] = None,
+                           catalog_version: Optional[int] = None, source: str = "table") -> Dict[str, Any]:
+    """
+    Compile referral_data items into a snapshot file
+
+    Args:
+        items: Items in the shape the boto3 DynamoDB resource returns
+        path: Output file path
+        built_at: Build time (epoch seconds), defaults to now
+        catalog_version: Optional catalog version the snapshot was built from
+        source: "table" (referral_data) or "csv". CSV builds have generated referral_ids,
+            so the Lambda never loads them; they are for local benchmarks only.
+
+    Returns:
+        Dict[str, Any]: The snapshot header that was written
+    """
+    text_columns = sorted({key for item in items for key in item if key not in DICTIONARY_COLUMNS and key != ZIP_COLUMN})
+
+    dictionaries = {column: [] for column in DICTIONARY_COLUMNS}
+    dictionary_lookup = {column: {} for column in DICTIONARY_COLUMNS}
+    codes = {column: array('I') for column in DICTIONARY_COLUMNS}
+    zips = array('i')
+    offsets = array('I', [0])
+    blob = bytearray()
+    # Values of dictionary/zip columns that can't be encoded natively are kept as text cells
+    overflow_columns = set()
+
+    for item in items:
+        for column in DICTIONARY_COLUMNS:
+            value = item.get(column)
+            if isinstance(value, str):
+                if value not in dictionary_lookup[column]:
+                    dictionary_lookup[column][value] = len(dictionaries[column])
+                    dictionaries[column].append(value)
+                codes[column].append(dictionary_lookup[column][value])
+            else:
+                codes[column].append(MISSING_CODE)
+                if value is not None:
+                    overflow_columns.add(column)
+
+        zip_value = item.get(ZIP_COLUMN)
+        if isinstance(zip_value, (int, Decimal)) and not isinstance(zip_value, bool) and zip_value % 1 == 0 and 0 <= zip_value < 2 ** 31:
+            zips.append(int(zip_value))
+        else:
+            zips.append(MISSING_ZIP)
+            if zip_value is not None:
+                overflow_columns.add(ZIP_COLUMN)
+
+    text_columns = sorted(set(text_columns) | overflow_columns)
+
+    for row, item in enumerate(items):
+        for column in text_columns:
+            value = item.get(column)
+            # Skip values already stored in a dictionary or the zip column
+            native = (column in DICTIONARY_COLUMNS and codes[column][row] != MISSING_CODE) or \
+                     (column == ZIP_COLUMN and zips[row] != MISSING_ZIP)
+            if value is None or native:
+                pass
+            elif isinstance(value, (int, Decimal)) and not isinstance(value, bool):
+                blob.extend(b"N" + str(value).encode('utf-8'))
+            else:
+                blob.extend(b"S" + str(value).encode('utf-8'))
+            offsets.append(len(blob))
+
+    header = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "built_at": built_at if built_at is not None else time.time(),
+        "catalog_version": catalog_version,
+        "source": source,
+        "row_count": len(items),
+        "dictionaries": dictionaries,
+        "text_columns": text_columns,
+        "sections": {}
+    }
+
+    # Section offsets depend on the header length, so lay the sections out relative to the body first
+    body = bytearray()
+    sections = {}
+    for column in DICTIONARY_COLUMNS:
+        sections[f"codes:{column}"] = len(body)
+        body.extend(codes[column].tobytes())
+    sections["zip"] = len(body)
+    body.extend(zips.tobytes())
+    sections["text_offsets"] = len(body)
+    body.extend(offsets.tobytes())
+    sections["text_blob"] = len(body)
+    body.extend(blob)
+    header["sections"] = sections
+    header["text_blob_length"] = len(blob)
+
+    header_bytes = bytearray(json.dumps(header).encode('utf-8'))
+    # Pad with spaces, which JSON ignores, so the sections stay 4-byte aligned
+    header_bytes.extend(b' ' * (-len(header_bytes) % 4))
+
+    with open(path, 'wb') as output:
+        output.write(SNAPSHOT_MAGIC)
+        output.write(struct.pack('<I', len(header_bytes)))
+        output.write(header_bytes)
+        output.write(body)
+
+    return header
+
+class CatalogSnapshot:
+    """
+    Read-only, memory-mapped view of a catalog snapshot.
+    Only the header is parsed on load; rows are decoded when they are requested.
+    """
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as snapshot_file:
+            self._mmap = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:8] != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a catalog snapshot")
+
+        header_length = struct.unpack_from('<I', self._mmap, 8)[0]
+        # Snapshots written before the header was space-padded have NUL padding
+        self.header = json.loads(bytes(self._mmap[12:12 + header_length]).rstrip(b'\0').decode('utf-8'))
+        if self.header.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported catalog snapshot format {self.header.get('format_version')}")
+
+        body_start = 12 + header_length
+        sections = self.header["sections"]
+        self.row_count = self.header["row_count"]
+        self.built_at = self.header["built_at"]
+        self.catalog_version = self.header.get("catalog_version")
+        self.source = self.header.get("source", "table")
+        self.dictionaries = self.header["dictionaries"]
+        self.text_columns = self.header["text_columns"]
+
+        view = memoryview(self._mmap)
+        self.codes = {
+            column: view[body_start + sections[f"codes:{column}"]:
+                         body_start + sections[f"codes:{column}"] + 4 * self.row_count].cast('I')
+            for column in DICTIONARY_COLUMNS
+        }
+        self.zips = view[body_start + sections["zip"]:body_start + sections["zip"] + 4 * self.row_count].cast('i')
+        offsets_count = self.row_count * len(self.text_columns) + 1
+        self.text_offsets = view[body_start + sections["text_offsets"]:
+                                 body_start + sections["text_offsets"] + 4 * offsets_count].cast('I')
+        self.text_blob = view[body_start + sections["text_blob"]:
+                              body_start + sections["text_blob"] + self.header["text_blob_length"]]
+
+    @property
+    def age_seconds(self) -> float:
+        return time.time() - self.built_at
+
+    def category(self, row: int) -> Optional[str]:
+        code = self.codes["Service Category Type"][row]
+        return None if code == MISSING_CODE else self.dictionaries["Service Category Type"][code]
+
+    def zip_code(self, row: int) -> Optional[int]:
+        value = self.zips[row]
+        return None if value == MISSING_ZIP else value
+
+    def categories(self) -> List[str]:
+        return list(self.dictionaries["Service Category Type"])
+
+    def row(self, row: int) -> Dict[str, Any]:
+        """
+        Decode one row into the same item shape the boto3 DynamoDB resource returns
+        """
+        item = {}
+
+        for column in DICTIONARY_COLUMNS:
+            code = self.codes[column][row]
+            if code != MISSING_CODE:
+                item[column] = self.dictionaries[column][code]
+
+        zip_value = self.zips[row]
+        if zip_value != MISSING_ZIP:
+            item[ZIP_COLUMN] = Decimal(zip_value)
+
+        base = row * len(self.text_columns)
+        for index, column in enumerate(self.text_columns):
+            start = self.text_offsets[base + index]
+            end = self.text_offsets[base + index + 1]
+            if start == end:
+                continue
+            cell = bytes(self.text_blob[start:end])
+            text = cell[1:].decode('utf-8')
+            item[column] = Decimal(text) if cell[:1] == b"N" else text
+
+        return item
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        for row in range(self.row_count):
+            yield self.row(row)
+
+_snapshot = None
+_snapshot_checked = False
+
+def load_catalog_snapshot(catalog_version: Optional[Any] = None) -> Optional[CatalogSnapshot]:
+    """
+    Load the snapshot shipped with the code, once per container.
+
+    Args:
+        catalog_version: Current catalog version from the metadata item, if known. A snapshot built
+            from that version is current whatever its age; one built from another version is stale.
+
+    Returns:
+        Optional[CatalogSnapshot]: The snapshot, or None if it is missing, unreadable or stale
+    """
+    global _snapshot, _snapshot_checked
+
+    if not _snapshot_checked:
+        _snapshot_checked = True
+        if os.path.exists(CATALOG_SNAPSHOT_PATH):
+            try:
+                start = time.time()
+                _snapshot = CatalogSnapshot(CATALOG_SNAPSHOT_PATH)
+                logger.info(f"Loaded catalog snapshot with {_snapshot.row_count} rows in {(time.time() - start) * 1000:.2f} ms")
+            except Exception as e:
+                logger.error(f"Error loading catalog snapshot: {str(e)}")
+                _snapshot = None
+            if _snapshot is not None and _snapshot.source != "table":
+                # Its referral_ids were generated at build time and don't resolve in referral_data
+                logger.error(f"Catalog snapshot was built from {_snapshot.source}, not referral_data; ignoring it")
+                _snapshot = None
+
+    if _snapshot is not None and catalog_version is not None:
+        # A snapshot without a version predates every version bump, so it is stale once there is one
+        if _snapshot.catalog_version != catalog_version:
+            logger.info(f"Catalog snapshot is from version {_snapshot.catalog_version}, "
+                        f"catalog is at {catalog_version}, using DynamoDB")
+            return None
+        return _snapshot
+
+    if _snapshot is not None and _snapshot.age_seconds > CATALOG_SNAPSHOT_MAX_AGE_SECONDS:
+        logger.info(f"Catalog snapshot is stale ({_snapshot.age_seconds:.0f}s old), using DynamoDB")
+        return None
+
+    return _snapshot
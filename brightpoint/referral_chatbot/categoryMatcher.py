@@ -0,0 +1,167 @@
+import os
+import math
+import zlib
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+import localExtractor
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPy isn't in the Lambda runtime; without a layer providing it the matcher stays off
+    np = None
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# off: not used; answer: return its categories when confident, without calling Bedrock;
+# prune: only show Bedrock its top candidate categories
+CATEGORY_MATCHER_MODE = os.environ.get('CATEGORY_MATCHER_MODE', 'off').lower()
+# Cosine similarity the best category needs for the matcher to answer on its own
+CATEGORY_MATCHER_MIN_SCORE = float(os.environ.get('CATEGORY_MATCHER_MIN_SCORE', '0.2'))
+# Categories kept in the Bedrock prompt in prune mode
+CATEGORY_MATCHER_PRUNE_TOP_K = int(os.environ.get('CATEGORY_MATCHER_PRUNE_TOP_K', '8'))
+# In answer mode, other categories are returned when they score at least this fraction of the best one
+RELATIVE_SCORE = 0.8
+
+# Hashed feature space: word features and character 3-5 grams share 2^14 buckets
+FEATURE_BUCKETS = 1 << 14
+NGRAM_SIZES = (3, 4, 5)
+# Words that say nothing about which category is meant
+IGNORED_WORDS = localExtractor.STOPWORDS | {"and", "services", "service", "support", "assistance", "programs", "resources"}
+
+# Matrix for the current category list, rebuilt when the list changes
+_model_lock = threading.Lock()
+_model = {"categories": None, "matrix": None, "idf": None}
+
+if CATEGORY_MATCHER_MODE in ('answer', 'prune') and np is None:
+    logger.warning("CATEGORY_MATCHER_MODE is set but NumPy isn't available, category matcher disabled")
+
+def is_enabled() -> bool:
+    return CATEGORY_MATCHER_MODE in ('answer', 'prune') and np is not None
+
+def _bucket(feature: str) -> int:
+    # crc32 rather than hash(), which changes between processes
+    return zlib.crc32(feature.encode('utf-8')) & (FEATURE_BUCKETS - 1)
+
+def word_features(word: str, is_stem: bool = False) -> List[int]:
+    """
+    Hashed features of one word: the word itself and its character n-grams.
+    A stem ("pantr") gets no end marker, so its n-grams also match longer words ("pantry", "pantries").
+    """
+    features = [] if is_stem else [_bucket('w:' + word)]
+    marked = '<' + word + ('' if is_stem else '>')
+    for size in NGRAM_SIZES:
+        for start in range(len(marked) - size + 1):
+            features.append(_bucket('c:' + marked[start:start + size]))
+    return features
+
+def text_features(text: str) -> List[int]:
+    words = localExtractor.TOKEN_PATTERN.findall(localExtractor.normalize(text))
+    features = []
+    for word in words:
+        if word not in IGNORED_WORDS and len(word) > 1 and not word.isdigit():
+            features.extend(word_features(word))
+    return features
+
+def category_features(category: str) -> List[int]:
+    """
+    Features describing a category: its name, plus the synonyms and translations of every
+    local extractor concept that maps onto it
+    """
+    features = text_features(category)
+    for concept in localExtractor._normalized_concepts.values():
+        if localExtractor.concept_covers(concept, category):
+            for stem in concept["stems"]:
+                features.extend(word_features(stem, is_stem=len(stem) > 3))
+    return features
+
+def _weights(features: List[int]) -> Dict[int, float]:
+    # Sublinear term frequency, so a repeated n-gram doesn't dominate
+    counts = {}
+    for feature in features:
+        counts[feature] = counts.get(feature, 0) + 1
+    return {feature: 1.0 + math.log(count) for feature, count in counts.items()}
+
+def build_model(categories: List[str]) -> Dict[str, Any]:
+    """
+    Build the TF-IDF matrix for a category list: one L2-normalized row per category
+    """
+    documents = [_weights(category_features(category)) for category in categories]
+
+    document_frequency = {}
+    for document in documents:
+        for feature in document:
+            document_frequency[feature] = document_frequency.get(feature, 0) + 1
+    total = len(documents)
+    idf = np.full(FEATURE_BUCKETS, math.log(1 + total) + 1.0, dtype=np.float32)
+    for feature, frequency in document_frequency.items():
+        idf[feature] = math.log((1 + total) / (1 + frequency)) + 1.0
+
+    matrix = np.zeros((total, FEATURE_BUCKETS), dtype=np.float32)
+    for row, document in enumerate(documents):
+        for feature, weight in document.items():
+            matrix[row, feature] = weight * idf[feature]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms > 0, norms, 1.0)
+
+    return {"categories": list(categories), "matrix": matrix, "idf": idf}
+
+def get_model(categories: List[str]) -> Dict[str, Any]:
+    with _model_lock:
+        if _model["categories"] != categories:
+            _model.update(build_model(categories))
+            logger.info(f"Built category matcher for {len(categories)} categories")
+        return dict(_model)
+
+def score_categories(query: str, categories: List[str]) -> List[Tuple[str, float]]:
+    """
+    Score every category against a query with one matrix-vector product
+
+    Returns:
+        List[Tuple[str, float]]: (category, cosine similarity), best first
+    """
+    if not categories:
+        return []
+    model = get_model(categories)
+
+    vector = np.zeros(FEATURE_BUCKETS, dtype=np.float32)
+    for feature, weight in _weights(text_features(query)).items():
+        vector[feature] = weight * model["idf"][feature]
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        return [(category, 0.0) for category in categories]
+
+    scores = model["matrix"] @ (vector / norm)
+    order = np.argsort(-scores, kind='stable')
+    return [(categories[i], float(scores[i])) for i in order]
+
+def answer(query: str, categories: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    Extract categories and a zipcode if the matcher is confident enough to skip Bedrock
+
+    Returns:
+        Optional[Dict[str, Any]]: {"service_categories": [...], "zipcode": ...}, or None to fall through to Bedrock
+    """
+    zipcodes = list(dict.fromkeys(localExtractor.ZIP_PATTERN.findall(query)))
+    if len(zipcodes) > 1:
+        return None
+
+    scored = score_categories(query, categories)
+    if not scored or scored[0][1] < CATEGORY_MATCHER_MIN_SCORE:
+        return None
+    cutoff = max(CATEGORY_MATCHER_MIN_SCORE, scored[0][1] * RELATIVE_SCORE)
+    return {
+        "service_categories": [category for category, score in scored if score >= cutoff],
+        "zipcode": zipcodes[0] if zipcodes else None
+    }
+
+def prune(query: str, categories: List[str]) -> List[str]:
+    """
+    Candidate categories for the Bedrock prompt: the best CATEGORY_MATCHER_PRUNE_TOP_K,
+    or every category when nothing in the query matches
+    """
+    scored = score_categories(query, categories)
+    candidates = [category for category, score in scored[:CATEGORY_MATCHER_PRUNE_TOP_K] if score > 0]
+    return candidates or categories
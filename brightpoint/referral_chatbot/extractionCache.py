@@ -0,0 +1,126 @@
+import os
+import re
+import time
+import json
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+import boto3
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Shared tier: Bedrock extraction results, readable by every container
+extraction_cache_table = boto3.resource('dynamodb', region_name='us-east-1').Table(
+    os.environ.get('EXTRACTION_CACHE_TABLE', 'extraction_cache')
+)
+# How long a shared entry lives (enforced by the table's TTL on expires_at)
+EXTRACTION_CACHE_TTL_SECONDS = int(os.environ.get('EXTRACTION_CACHE_TTL_SECONDS', str(7 * 24 * 60 * 60)))
+# Maximum number of entries in the per-container tier
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.environ.get('EXTRACTION_CACHE_MAX_ENTRIES', '1000'))
+
+PUNCTUATION_PATTERN = re.compile(r'[^\w\s]')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# Per-container tier: cache key -> result, least recently used first
+_lru_lock = threading.Lock()
+_lru = OrderedDict()
+
+# Counters since the container started, and for the current invocation
+cache_stats = {"memory_hits": 0, "dynamodb_hits": 0, "misses": 0, "evictions": 0, "writes": 0}
+invocation_stats = dict.fromkeys(cache_stats, 0)
+
+def normalize_query(query: str) -> str:
+    """
+    Reduce a query to the text that matters for extraction, so "Where are food pantries?"
+    and "where are  food pantries" share an entry
+    """
+    text = unicodedata.normalize('NFKC', query).casefold()
+    text = PUNCTUATION_PATTERN.sub(' ', text)
+    return WHITESPACE_PATTERN.sub(' ', text).strip()
+
+def taxonomy_version(categories: List[str]) -> str:
+    """
+    Fingerprint of the category list the extraction was made against.
+    Any change to the list gives new keys, so old entries are never read again.
+    """
+    return hashlib.sha256('\n'.join(sorted(categories)).encode('utf-8')).hexdigest()[:16]
+
+def cache_key(query: str, categories: List[str]) -> str:
+    return f"{taxonomy_version(categories)}#{hashlib.sha256(normalize_query(query).encode('utf-8')).hexdigest()}"
+
+def _count(counter: str) -> None:
+    cache_stats[counter] += 1
+    invocation_stats[counter] += 1
+
+def _remember(key: str, result: Dict[str, Any]) -> None:
+    with _lru_lock:
+        _lru[key] = result
+        _lru.move_to_end(key)
+        while len(_lru) > EXTRACTION_CACHE_MAX_ENTRIES:
+            _lru.popitem(last=False)
+            _count("evictions")
+
+def get_cached_extraction(query: str, categories: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    Look up a previous extraction for this query and category list
+
+    Returns:
+        Optional[Dict[str, Any]]: A copy of the cached result, or None on a miss
+    """
+    key = cache_key(query, categories)
+
+    with _lru_lock:
+        result = _lru.get(key)
+        if result is not None:
+            _lru.move_to_end(key)
+    if result is not None:
+        _count("memory_hits")
+        return json.loads(json.dumps(result))
+
+    try:
+        item = extraction_cache_table.get_item(Key={'cache_key': key}).get('Item')
+        # TTL deletion can lag by hours, so check expiry here too
+        if item and int(item.get('expires_at', 0)) > time.time():
+            result = json.loads(item['result'])
+            _remember(key, result)
+            _count("dynamodb_hits")
+            return json.loads(json.dumps(result))
+    except Exception as e:
+        logger.error(f"Error reading extraction cache: {str(e)}")
+
+    _count("misses")
+    return None
+
+def put_cached_extraction(query: str, categories: List[str], result: Dict[str, Any]) -> None:
+    """
+    Store a successful extraction in both tiers
+    """
+    key = cache_key(query, categories)
+    _remember(key, json.loads(json.dumps(result)))
+
+    try:
+        now = int(time.time())
+        extraction_cache_table.put_item(Item={
+            'cache_key': key,
+            'normalized_query': normalize_query(query),
+            'result': json.dumps(result),
+            'created_at': now,
+            'expires_at': now + EXTRACTION_CACHE_TTL_SECONDS
+        })
+        _count("writes")
+    except Exception as e:
+        logger.error(f"Error writing extraction cache: {str(e)}")
+
+def log_invocation_stats() -> None:
+    """
+    Log this invocation's cache counters next to the container totals, then reset them
+    """
+    if any(invocation_stats.values()):
+        logger.info(f"Extraction cache: invocation {invocation_stats}, container {cache_stats}, "
+                    f"{len(_lru)} entries in memory")
+    for counter in invocation_stats:
+        invocation_stats[counter] = 0
@@ -1,4 +1,12 @@
+import os
+import time
+import threading
 import boto3
+from datetime import datetime
+from decimal import Decimal
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+import catalogSnapshot
 
 # Initialize AWS clients for Lambda environment
 def get_boto_clients():
@@ -12,15 +20,123 @@ def get_boto_clients():
 clients = get_boto_clients()
 dynamodb = clients["dynamodb"]
 table = dynamodb.Table("referral_data")
-unique_categories = set()
+SERVICE_CATEGORY_INDEX = os.environ.get("REFERRAL_CATEGORY_ZIP_INDEX", "ServiceCategory-Zip-index")
+
+# Single item holding per-category referral counts and a catalog version, kept current on referral writes
+metadata_table = dynamodb.Table(os.environ.get("CATALOG_METADATA_TABLE", "referral_catalog_metadata"))
+TAXONOMY_METADATA_KEY = "service_categories"
+# How long the category list is reused before the metadata item is read again
+TAXONOMY_TTL_SECONDS = int(os.environ.get("TAXONOMY_TTL_SECONDS", "300"))
+# After a failed read, the previous taxonomy is served this long before the next attempt
+TAXONOMY_RETRY_SECONDS = 30
+
+# Per-container taxonomy cache
+_taxonomy_lock = threading.Lock()
+_taxonomy = {"loaded_at": 0.0, "categories": None, "version": None}
+
+def get_item_category(item):
+    # Look for Service Category Type including with ZWNBSP character
+    return item.get("Service Category Type") or item.get("\ufeffService Category Type")
+
+def bootstrap_taxonomy():
+    """
+    Create the taxonomy metadata item from a full scan of referral_data.
+    Only runs when the item doesn't exist yet; afterwards referral writes keep it current.
+
+    Returns:
+        dict: The metadata item
+    """
+    category_counts = {}
+    response = table.scan()
+    while True:
+        for item in response.get('Items', []):
+            service_category = get_item_category(item)
+            if service_category:
+                category_counts[service_category] = category_counts.get(service_category, 0) + 1
+        if 'LastEvaluatedKey' in response:
+            response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+        else:
+            break
+
+    metadata = {
+        "metadata_key": TAXONOMY_METADATA_KEY,
+        "category_counts": {category: Decimal(count) for category, count in category_counts.items()},
+        "version": Decimal(1),
+        "updated_at": datetime.now().isoformat()
+    }
+    try:
+        # Don't overwrite an item another container or a referral write created meanwhile
+        metadata_table.put_item(Item=metadata, ConditionExpression="attribute_not_exists(metadata_key)")
+        print(f"Bootstrapped taxonomy metadata with {len(category_counts)} categories")
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        metadata = metadata_table.get_item(Key={"metadata_key": TAXONOMY_METADATA_KEY}).get("Item", metadata)
+    return metadata
+
+def load_taxonomy():
+    """
+    Read the taxonomy metadata item (one GetItem), bootstrapping it if missing
+
+    Returns:
+        tuple: (sorted category names, catalog version)
+    """
+    response = metadata_table.get_item(Key={"metadata_key": TAXONOMY_METADATA_KEY})
+    metadata = response.get("Item") or bootstrap_taxonomy()
+
+    categories = sorted({
+        category.strip() for category, count in metadata.get("category_counts", {}).items()
+        if count > 0 and category.strip()
+    })
+    return categories, metadata.get("version")
+
+def get_taxonomy():
+    """
+    Return the cached taxonomy, reloading it when the TTL has expired.
+    A warm call does no I/O; a cold one costs a single GetItem.
+
+    Returns:
+        dict: {"categories": list or None if unavailable, "version": catalog version or None}
+    """
+    global _taxonomy
+
+    if time.time() - _taxonomy["loaded_at"] < TAXONOMY_TTL_SECONDS:
+        return _taxonomy
+
+    with _taxonomy_lock:
+        if time.time() - _taxonomy["loaded_at"] < TAXONOMY_TTL_SECONDS:
+            return _taxonomy
+        try:
+            categories, version = load_taxonomy()
+            _taxonomy = {"loaded_at": time.time(), "categories": categories, "version": version}
+        except Exception as e:
+            print(f"Error loading taxonomy metadata: {str(e)}")
+            # Back off instead of having every call retry the GetItem; keep serving the previous taxonomy if there is one
+            _taxonomy = dict(_taxonomy, loaded_at=time.time() - TAXONOMY_TTL_SECONDS + TAXONOMY_RETRY_SECONDS)
+        return _taxonomy
+
+def get_catalog_version():
+    """
+    Catalog version from the metadata item; changes whenever a referral is written
+    """
+    return get_taxonomy()["version"]
 
 def getUniqueCategories():
+    taxonomy = get_taxonomy()
+    if taxonomy["categories"] is not None:
+        return list(taxonomy["categories"])
+
+    # Categories are stored in the snapshot's category dictionary, so no Scan is needed when it is fresh
+    snapshot = catalogSnapshot.load_catalog_snapshot()
+    if snapshot is not None:
+        return sorted({category.strip() for category in snapshot.categories() if category.strip()})
+
+    unique_categories = set()
     try:
         response = table.scan()
         while True:
             for item in response.get('Items', []):
-                # Look for Service Category Type including with ZWNBSP character
-                service_category = item.get("Service Category Type") or item.get("\ufeffService Category Type")
+                service_category = get_item_category(item)
                 if service_category:
                     unique_categories.add(service_category.strip())
             if 'LastEvaluatedKey' in response:
@@ -69,36 +185,44 @@ def getUniqueCategories():
         ]
 
 def get_services_by_category(service_category):
+    """
+    Yield the services in a category, one index Query page at a time
+
+    Args:
+        service_category (str): Exact category name
+
+    Yields:
+        dict: Service summary for each referral in the category
+    """
     try:
-        # Try with and without ZWNBSP character since we've seen inconsistencies
-        response = table.scan(
-            FilterExpression="#sc = :category OR #sc2 = :category",
-            ExpressionAttributeNames={
-                "#sc": "Service Category Type",
-                "#sc2": "\ufeffService Category Type"
-            },
-            ExpressionAttributeValues={":category": service_category}
-        )
-
-        if "Items" not in response or not response["Items"]:
-            print(f"No results found for category: {service_category}")
-            return []
-
-        # Extract relevant service information
-        services = [
-            {
-                "referral_id": item.get("referral_id", ""),
-                "service_area_zip_code": item.get("Service Area Zip Code", ""),  # Updated from "zipcode"
-                "organization": item.get("\ufeffOrganization", item.get("Organization", "")),  # Updated from "agency"
-                "contact": item.get("Phone", ""),
-                "eligibility": item.get("Eligibility Requirements", ""),
-                "service_availability": item.get("Service Availability", ""),
-            }
-            for item in response.get("Items", [])
-        ]
+        # Key-based lookup on the category/zip index instead of a filtered scan
+        query_args = {
+            "IndexName": SERVICE_CATEGORY_INDEX,
+            "KeyConditionExpression": Key("Service Category Type").eq(service_category)
+        }
+        response = table.query(**query_args)
+        service_count = 0
+
+        while True:
+            # Extract relevant service information
+            for item in response.get("Items", []):
+                service_count += 1
+                yield {
+                    "referral_id": item.get("referral_id", ""),
+                    "service_area_zip_code": item.get("Service Area Zip Code", ""),  # Updated from "zipcode"
+                    "organization": item.get("\ufeffOrganization", item.get("Organization", "")),  # Updated from "agency"
+                    "contact": item.get("Phone", ""),
+                    "eligibility": item.get("Eligibility Requirements", ""),
+                    "service_availability": item.get("Service Availability", ""),
+                }
 
-        print(f"Found {len(services)} services for category: {service_category}")
-        return services
+            if "LastEvaluatedKey" not in response:
+                break
+            response = table.query(ExclusiveStartKey=response["LastEvaluatedKey"], **query_args)
+
+        if not service_count:
+            print(f"No results found for category: {service_category}")
+        else:
+            print(f"Found {service_count} services for category: {service_category}")
     except Exception as e:
         print(f"Error querying DynamoDB: {str(e)}")
-        return []
\ No newline at end of file
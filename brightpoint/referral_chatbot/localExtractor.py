@@ -0,0 +1,285 @@
+import os
+import re
+import logging
+import unicodedata
+from typing import Dict, Any, List, Tuple
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Bedrock is only called when the local extractor's confidence is below this
+LOCAL_EXTRACTOR_MIN_CONFIDENCE = float(os.environ.get('LOCAL_EXTRACTOR_MIN_CONFIDENCE', '0.75'))
+
+ZIP_PATTERN = re.compile(r'(?<!\d)(\d{5})(?:-\d{4})?(?!\d)')
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# Words that carry no service meaning in English, Spanish and Polish queries
+STOPWORDS = {
+    # English
+    "a", "an", "the", "i", "im", "me", "my", "we", "our", "you", "your", "is", "are", "am", "be", "do", "does",
+    "can", "could", "would", "will", "please", "need", "needs", "want", "looking", "look", "find", "finding",
+    "get", "getting", "help", "where", "what", "which", "who", "how", "any", "some", "there", "near", "nearby",
+    "around", "close", "closest", "area", "in", "at", "on", "for", "to", "of", "and", "or", "with", "by",
+    "from", "zip", "zipcode", "code", "services", "service", "programs", "program", "resources", "options",
+    "place", "places", "local", "free", "available", "open", "today", "now", "know", "tell", "show", "list",
+    "hi", "hello", "thanks", "thank", "this", "that", "these", "those", "it", "us", "support", "assistance",
+    # Spanish
+    "el", "la", "los", "las", "un", "una", "unos", "unas", "de", "del", "en", "y", "o", "para", "por", "con",
+    "que", "donde", "dónde", "hay", "necesito", "necesitamos", "busco", "buscando", "ayuda", "cerca", "mi", "mis",
+    "yo", "es", "son", "esta", "estan", "quiero", "puedo", "servicios", "servicio", "zona", "codigo", "postal",
+    "al", "gratis", "hola", "gracias", "como", "cual",
+    # Polish
+    "gdzie", "jest", "są", "w", "na", "oraz", "lub", "dla", "z", "ze", "potrzebuję",
+    "potrzebuje", "szukam", "pomoc", "pomocy", "blisko", "obok", "moim", "mojej", "mój", "moja", "kod",
+    "pocztowy", "usługi", "usług", "jak", "czy", "mnie", "proszę", "dziękuję", "darmowe", "okolicy",
+}
+
+# Words that turn a request around ("not food", "sin vivienda"); left to Bedrock
+NEGATIONS = {"not", "no", "dont", "don't", "without", "except", "nunca", "sin", "excepto", "nie", "bez", "oprócz"}
+
+# Concepts the chatbot is asked about. "stems" are matched against query words (prefix match,
+# exact match for stems of three letters or fewer); "category_keys" pick out the matching
+# categories in the live taxonomy by whole word of the category name (plurals included).
+# Stems that are common in unrelated requests ("hit", "beat") are left to Bedrock.
+CONCEPTS = {
+    "food": {
+        "stems": ["food", "pantr", "hungr", "meal", "grocer", "nutrition", "snap", "wic",
+                  "comida", "aliment", "despens", "hambre",
+                  "żywn", "jedzen", "spiżarn", "głod", "posił"],
+        "category_keys": ["food", "pantry", "nutrition", "nutritional", "meal", "snap", "wic"]
+    },
+    "housing": {
+        "stems": ["housing", "shelter", "homeless", "rent", "evict", "apartment",
+                  "vivienda", "refugio", "albergue", "alquiler", "renta", "desalojo",
+                  "mieszka", "schronis", "bezdomn", "czynsz", "eksmis"],
+        "category_keys": ["housing", "shelter", "homeless", "homelessness", "rent", "rental"]
+    },
+    "mental_health": {
+        "stems": ["mental", "depress", "anxiety", "counsel", "therap", "suicid", "psychiatr",
+                  "depresi", "ansiedad", "terapi", "consejer", "psicolog",
+                  "psychi", "psycholog", "depresj", "lęk"],
+        "category_keys": ["mental", "counseling", "behavioral"]
+    },
+    "substance_use": {
+        "stems": ["substance", "addict", "alcohol", "drug", "opioid", "rehab", "sober", "detox",
+                  "adicci", "droga",
+                  "uzależn", "alkohol", "narkot", "odwyk"],
+        "category_keys": ["substance", "addiction"]
+    },
+    "medical": {
+        "stems": ["medical", "doctor", "clinic", "health", "hospital", "prescription",
+                  "medic", "salud",
+                  "lekarz", "zdrow", "przychodni", "szpital"],
+        "category_keys": ["medical", "clinic", "hospital", "healthcare"]
+    },
+    "dental": {
+        "stems": ["dental", "dentist", "teeth", "tooth",
+                  "dentista",
+                  "dentyst"],
+        "category_keys": ["dental"]
+    },
+    "employment": {
+        "stems": ["job", "jobs", "employ", "career", "resume", "hiring", "unemploy",
+                  "trabajo", "empleo",
+                  "praca", "pracy", "zatrudn", "bezroboc"],
+        "category_keys": ["employment", "job", "career", "workforce"]
+    },
+    "children": {
+        "stems": ["child", "kid", "kids", "daycare", "youth", "infant", "baby", "babies", "toddler",
+                  "nino", "infan", "guarder", "bebe", "juvenil",
+                  "dzieck", "dzieci", "przedszk", "niemowl", "młodzież"],
+        "category_keys": ["child", "children", "childcare", "youth", "kid", "infant"]
+    },
+    "education": {
+        "stems": ["school", "educat", "ged", "tutor", "college", "literacy", "esl",
+                  "escuela", "educaci", "clases",
+                  "szkoł", "eduk", "nauk"],
+        "category_keys": ["education", "educational", "school", "literacy", "ged"]
+    },
+    "legal": {
+        "stems": ["legal", "lawyer", "attorney", "court", "immigra",
+                  "abogad", "inmigra",
+                  "prawn", "adwokat", "prawnik"],
+        "category_keys": ["legal", "law", "immigration", "immigrant"]
+    },
+    "violence": {
+        "stems": ["abuse", "domestic", "violence", "assault", "abused",
+                  "violencia", "abuso",
+                  "przemoc"],
+        "category_keys": ["violence", "abuse", "assault"]
+    },
+    "transportation": {
+        "stems": ["transport", "ride", "rides", "bus",
+                  "transporte",
+                  "dojazd"],
+        "category_keys": ["transport", "transportation"]
+    },
+    "financial": {
+        "stems": ["utilit", "electric", "bill", "bills", "financial", "cash", "money",
+                  "factura", "dinero", "luz",
+                  "rachun", "pieniądz", "pieniędz"],
+        "category_keys": ["utility", "financial", "cash"]
+    },
+    "clothing": {
+        "stems": ["cloth", "coat", "coats", "furniture",
+                  "ropa",
+                  "ubrani", "odzież"],
+        "category_keys": ["clothing", "clothes", "household"]
+    },
+}
+
+# Evidence strengths, before penalties
+NAME_MATCH_CONFIDENCE = 0.95
+CONCEPT_MATCH_CONFIDENCE = 0.85
+TOKEN_MATCH_CONFIDENCE = 0.65
+# A concept that maps onto more than CONCEPT_FANOUT_LIMIT categories is too vague to skip Bedrock
+CONCEPT_FANOUT_LIMIT = 2
+CONCEPT_FANOUT_CONFIDENCE = 0.7
+# Confidence lost per query word the extractor couldn't account for
+UNEXPLAINED_WORD_PENALTY = 0.05
+
+# Per-container counters, logged on every extraction
+extractor_stats = {
+    "queries": 0,
+    "fast_path": 0,
+    "bedrock": 0,
+    "bedrock_ms_total": 0.0,
+    "estimated_ms_saved": 0.0,
+}
+
+def normalize(text: str) -> str:
+    """
+    Lowercase and strip accents (ł and ż-style letters that don't decompose are kept)
+    """
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+def stem_matches(stem: str, token: str) -> bool:
+    if len(stem) <= 3:
+        return token == stem or token == stem + "s"
+    return token.startswith(stem)
+
+def key_matches(key: str, word: str) -> bool:
+    """
+    Whether a concept's category key is a word of a category name, singular or plural
+    """
+    return word in (key, key + "s", key + "es") or (key.endswith("y") and word == key[:-1] + "ies")
+
+def concept_covers(concept: Dict[str, List[str]], category: str) -> bool:
+    """
+    Whether a normalized concept maps onto a category, by whole words of the category name
+    """
+    words = TOKEN_PATTERN.findall(normalize(category))
+    return any(key_matches(key, word) for key in concept["category_keys"] for word in words)
+
+# Stems normalized the same way as queries, computed once
+_normalized_concepts = {
+    name: {
+        "stems": [normalize(stem) for stem in concept["stems"]],
+        "category_keys": [normalize(key) for key in concept["category_keys"]]
+    }
+    for name, concept in CONCEPTS.items()
+}
+_category_stopwords = {"and", "services", "service", "support", "assistance", "&", "programs", "resources"}
+
+def extract_local(query: str, categories: List[str]) -> Tuple[Dict[str, Any], float]:
+    """
+    Extract service categories and a zipcode without calling a model.
+
+    Args:
+        query: The user's query
+        categories: Live service category names
+
+    Returns:
+        Tuple[Dict[str, Any], float]: {"service_categories": [...], "zipcode": str or None}
+        in the same shape Bedrock returns, and a confidence between 0 and 1
+    """
+    zipcodes = list(dict.fromkeys(ZIP_PATTERN.findall(query)))
+    zipcode = zipcodes[0] if zipcodes else None
+
+    text = normalize(ZIP_PATTERN.sub(' ', query))
+    tokens = TOKEN_PATTERN.findall(text)
+    explained = [False] * len(tokens)
+
+    scores = {}   # category -> evidence strength
+
+    # 1. Category names written out in the query ("food pantry", "mental health")
+    for category in categories:
+        name = normalize(category)
+        words = [word for word in TOKEN_PATTERN.findall(name) if word not in _category_stopwords]
+        if not words:
+            continue
+        phrase = ' '.join(words)
+        if re.search(r'\b' + re.escape(phrase), ' '.join(tokens)):
+            scores[category] = max(scores.get(category, 0), NAME_MATCH_CONFIDENCE)
+            for i, token in enumerate(tokens):
+                if any(stem_matches(word[:5], token) for word in words):
+                    explained[i] = True
+        else:
+            # Some of the category's words, e.g. "pantry" for "Food Pantries and Nutritional Services"
+            for i, token in enumerate(tokens):
+                if token not in STOPWORDS and len(token) > 3 and any(stem_matches(word[:5], token) for word in words if len(word) > 3):
+                    scores[category] = max(scores.get(category, 0), TOKEN_MATCH_CONFIDENCE)
+                    explained[i] = True
+
+    # 2. Synonyms and translations, mapped onto whichever live categories cover the concept.
+    # Words already accounted for by a category name ("health" in "mental health") are skipped.
+    named = list(explained)
+    for concept in _normalized_concepts.values():
+        fired = False
+        for i, token in enumerate(tokens):
+            if not named[i] and any(stem_matches(stem, token) for stem in concept["stems"]):
+                explained[i] = True
+                fired = True
+        if not fired:
+            continue
+        covering = [category for category in categories if concept_covers(concept, category)]
+        strength = CONCEPT_MATCH_CONFIDENCE if len(covering) <= CONCEPT_FANOUT_LIMIT else CONCEPT_FANOUT_CONFIDENCE
+        for category in covering:
+            scores[category] = max(scores.get(category, 0), strength)
+
+    # Strongest evidence first, then taxonomy order (the order Bedrock is shown them in)
+    order = {category: i for i, category in enumerate(categories)}
+    matched = sorted(scores, key=lambda category: (-scores[category], order[category]))
+    result = {"service_categories": matched, "zipcode": zipcode}
+
+    if not matched:
+        return result, 0.0
+
+    confidence = scores[matched[0]]
+    # Single letters are left over from contractions ("i'm", "what's")
+    unexplained = sum(1 for i, token in enumerate(tokens)
+                      if not explained[i] and token not in STOPWORDS and len(token) > 1 and not token.isdigit())
+    confidence -= UNEXPLAINED_WORD_PENALTY * unexplained
+
+    if any(token in NEGATIONS for token in tokens):
+        confidence = min(confidence, 0.3)
+    if len(zipcodes) > 1:
+        # More than one zipcode; leave it to Bedrock to work out which one is meant
+        confidence = min(confidence, 0.5)
+
+    return result, round(max(confidence, 0.0), 2)
+
+def record_fast_path() -> None:
+    """
+    Count a query answered locally; the saving is estimated from the average Bedrock latency seen so far
+    """
+    extractor_stats["queries"] += 1
+    extractor_stats["fast_path"] += 1
+    if extractor_stats["bedrock"]:
+        extractor_stats["estimated_ms_saved"] += extractor_stats["bedrock_ms_total"] / extractor_stats["bedrock"]
+    log_stats()
+
+def record_bedrock(elapsed_ms: float) -> None:
+    """
+    Count a query that needed Bedrock and how long the call took
+    """
+    extractor_stats["queries"] += 1
+    extractor_stats["bedrock"] += 1
+    extractor_stats["bedrock_ms_total"] += elapsed_ms
+    log_stats()
+
+def log_stats() -> None:
+    hit_rate = extractor_stats["fast_path"] / extractor_stats["queries"]
+    logger.info(f"Extractor stats: fast path {extractor_stats['fast_path']}/{extractor_stats['queries']} "
+                f"({hit_rate:.1%}), estimated {extractor_stats['estimated_ms_saved']:.0f} ms of Bedrock latency saved")
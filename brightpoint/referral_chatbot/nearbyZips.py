@@ -0,0 +1,156 @@
+import os
+import csv
+import math
+import time
+import logging
+from typing import Dict, List, Optional, Tuple, Iterable
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Zip code centroids compiled by build_zip_centroids.py and shipped with the Lambda code
+ZIP_CENTROIDS_PATH = os.environ.get(
+    'ZIP_CENTROIDS_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'zip_centroids.csv')
+)
+# How far from the requested zip code to look for services, in miles
+NEARBY_ZIP_RADIUS_MILES = float(os.environ.get('NEARBY_ZIP_RADIUS_MILES', '15'))
+# How many nearby zip codes to return services from
+NEARBY_ZIP_MAX_ZIPS = int(os.environ.get('NEARBY_ZIP_MAX_ZIPS', '3'))
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE_LATITUDE = 69.0
+# Grid cell size in degrees. Each cell is roughly 35 x 25 miles in the Midwest.
+GRID_CELL_DEGREES = 0.5
+
+# Per-container state: zip -> (lat, lon), loaded once
+_centroids = None
+
+# Per-container counters, logged on every lookup so CloudWatch shows how often
+# a nearby match replaces the Perplexity fallback
+nearby_stats = {
+    "lookups": 0,
+    "local_hits": 0,
+    "no_nearby_services": 0,
+    "unknown_zip": 0,
+}
+
+def load_zip_centroids() -> Dict[int, Tuple[float, float]]:
+    """
+    Load the zip centroid table once per container.
+
+    Returns:
+        Dict[int, Tuple[float, float]]: zip -> (latitude, longitude), empty if the file is missing
+    """
+    global _centroids
+
+    if _centroids is None:
+        _centroids = {}
+        if not os.path.exists(ZIP_CENTROIDS_PATH):
+            logger.error(f"Zip centroid file {ZIP_CENTROIDS_PATH} not found, nearby zip search disabled "
+                         f"(build it with build_zip_centroids.py before deploying)")
+            return _centroids
+
+        try:
+            start = time.time()
+            with open(ZIP_CENTROIDS_PATH, 'r', encoding='utf-8') as centroid_file:
+                for row in csv.DictReader(centroid_file):
+                    _centroids[int(row['zip'])] = (float(row['lat']), float(row['lon']))
+            logger.info(f"Loaded {len(_centroids)} zip centroids in {(time.time() - start) * 1000:.1f} ms")
+        except Exception as e:
+            logger.error(f"Error loading zip centroids: {str(e)}")
+            _centroids = {}
+
+    return _centroids
+
+def haversine_miles(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Great-circle distance between two points, in miles
+    """
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(a))
+
+def grid_cell(lat: float, lon: float) -> Tuple[int, int]:
+    return int(math.floor(lat / GRID_CELL_DEGREES)), int(math.floor(lon / GRID_CELL_DEGREES))
+
+class ZipGrid:
+    """
+    Grid-bucket spatial index over a set of zip codes.
+    Zips are bucketed by GRID_CELL_DEGREES cells, so a radius search only
+    measures distances to zips in the cells overlapping the search box.
+    """
+
+    def __init__(self, zip_codes: Iterable[int], centroids: Dict[int, Tuple[float, float]]):
+        self.centroids = centroids
+        self.cells = {}
+        for zip_code in zip_codes:
+            if zip_code in centroids:
+                self.cells.setdefault(grid_cell(*centroids[zip_code]), []).append(zip_code)
+
+    def nearest(self, lat: float, lon: float, radius_miles: float, limit: int,
+                exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Find the zips closest to a point
+
+        Args:
+            lat: Latitude of the search origin
+            lon: Longitude of the search origin
+            radius_miles: Maximum distance
+            limit: Maximum number of zips to return
+            exclude: Zip to leave out (usually the origin zip)
+
+        Returns:
+            List[Tuple[int, float]]: (zip, distance in miles), nearest first
+        """
+        lat_span = radius_miles / MILES_PER_DEGREE_LATITUDE
+        lon_span = radius_miles / (MILES_PER_DEGREE_LATITUDE * max(math.cos(math.radians(lat)), 0.01))
+        min_row, min_col = grid_cell(lat - lat_span, lon - lon_span)
+        max_row, max_col = grid_cell(lat + lat_span, lon + lon_span)
+
+        matches = []
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                for zip_code in self.cells.get((row, col), []):
+                    if zip_code == exclude:
+                        continue
+                    distance = haversine_miles(lat, lon, *self.centroids[zip_code])
+                    if distance <= radius_miles:
+                        matches.append((zip_code, distance))
+
+        matches.sort(key=lambda match: (match[1], match[0]))
+        return matches[:limit]
+
+def find_nearby_zips(zipcode: int, covered_zips: Iterable[int], radius_miles: float = None,
+                     max_zips: int = None) -> List[Tuple[int, float]]:
+    """
+    Find the covered zip codes nearest to a zip code
+
+    Args:
+        zipcode: Zip code the user asked about
+        covered_zips: Zip codes that have matching services
+        radius_miles: Search radius (default NEARBY_ZIP_RADIUS_MILES)
+        max_zips: Maximum number of zips to return (default NEARBY_ZIP_MAX_ZIPS)
+
+    Returns:
+        List[Tuple[int, float]]: (zip, distance in miles), nearest first; empty if the zip is unknown
+    """
+    centroids = load_zip_centroids()
+    origin = centroids.get(zipcode)
+    if origin is None:
+        return []
+
+    grid = ZipGrid(covered_zips, centroids)
+    return grid.nearest(origin[0], origin[1],
+                        radius_miles if radius_miles is not None else NEARBY_ZIP_RADIUS_MILES,
+                        max_zips if max_zips is not None else NEARBY_ZIP_MAX_ZIPS,
+                        exclude=zipcode)
+
+def record_lookup(outcome: str) -> None:
+    """
+    Count a nearby lookup outcome and log the running totals
+    """
+    nearby_stats["lookups"] += 1
+    nearby_stats[outcome] += 1
+    hit_rate = nearby_stats["local_hits"] / nearby_stats["lookups"]
+    logger.info(f"Nearby zip stats: {nearby_stats} (local hit rate {hit_rate:.1%})")
@@ -5,9 +5,20 @@ import logging
 import traceback
 from decimal import Decimal
 import bedrockAgent  # Import the bedrockAgent module
+import extractionCache
 import uuid
 from datetime import datetime
 
+try:
+    import translation_cache
+    import translation_engine
+    import message_catalog
+except ImportError:
+    # The shared layer isn't attached; Translate is called without caching, one text at a time
+    translation_cache = None
+    translation_engine = None
+    message_catalog = None
+
 # Custom JSON encoder for Decimal types
 class DecimalEncoder(json.JSONEncoder):
     """Helper class to convert a DynamoDB item to JSON."""
@@ -33,6 +44,11 @@ dynamodb_client = boto3.client('dynamodb')
 # Initialize AWS Lambda client for calling Perplexity Lambda
 lambda_client = boto3.client('lambda', region_name="us-east-1")
 PERPLEXITY_LAMBDA_ARN = "arn:aws:lambda:us-east-1:108782065617:function:perplexityLambda"
+# WebSocket fallbacks invoke the Perplexity Lambda asynchronously; it replies to the connection itself
+PERPLEXITY_ASYNC_FALLBACK = os.environ.get('PERPLEXITY_ASYNC_FALLBACK', 'true').lower() == 'true'
+
+# Most queries one extractMany invoke may classify (query-analytics-backfill and cache-warmer send up to 500)
+EXTRACT_MANY_MAX_QUERIES = 500
 
 def lambda_handler(event, context):
     """
@@ -66,6 +82,10 @@ def lambda_handler(event, context):
             'message': "An unexpected error occurred",
             'error': str(e)
         })
+    finally:
+        extractionCache.log_invocation_stats()
+        if translation_cache:
+            translation_cache.log_invocation_stats()
 
 def update_user_query_history(user_id, user_query, original_query, response_data, zipcode=None, language='english'):
     """
@@ -237,7 +257,7 @@ def handle_websocket_event(event, context):
 
 def translate_text(text, source_language, target_language):
     """
-    Translate text using AWS Translate
+    Translate text using AWS Translate, through the shared translation cache when the layer is attached
 
     Args:
         text (str): Text to translate
@@ -248,6 +268,8 @@ def translate_text(text, source_language, target_language):
         str: Translated text
     """
     try:
+        if translation_cache:
+            return translation_cache.translate(text, source_language, target_language, translate_client)
         response = translate_client.translate_text(
             Text=text,
             SourceLanguageCode=source_language,
@@ -260,6 +282,26 @@ def translate_text(text, source_language, target_language):
         # Return original text if translation fails
         return text
 
+def localized_message(message_id, english_message, language):
+    """
+    A fixed message in the user's language, from the shared layer's message catalog
+    (no Translate request), or translated when the layer isn't attached
+
+    Args:
+        message_id (str): Key of the message in message_catalog.MESSAGES
+        english_message (str): The message in English
+        language (str): Language name (english, polish, spanish)
+
+    Returns:
+        str: The message in the user's language
+    """
+    language_code = get_language_code(language)
+    if message_catalog:
+        return message_catalog.get_message(message_id, language_code)
+    if language_code == 'en':
+        return english_message
+    return translate_text(english_message, "en", language_code)
+
 def get_language_code(language):
     """
     Convert language name to AWS Translate language code
@@ -299,7 +341,10 @@ def convert_decimal(obj):
     else:
         return obj
 
-def translate_response_data(response_data, target_language_code):
+# Technical fields that stay in English when a response is translated
+UNTRANSLATED_KEYS = ['id', 'referral_id', 'service_area_zip_code', 'zipcode', 'phone', 'status', 'language']
+
+def translate_response_data(response_data, target_language_code, pretranslated=()):
     """
     Recursively translate all string values in a nested dictionary/list.
     Only the values are translated, keys remain in English.
@@ -307,6 +352,7 @@ def translate_response_data(response_data, target_language_code):
     Args:
         response_data: Dictionary or list containing response data
         target_language_code: Target language code for translation
+        pretranslated: Values already in the target language (stored catalog translations), kept as they are
 
     Returns:
         A new structure with translated string values
@@ -318,18 +364,28 @@ def translate_response_data(response_data, target_language_code):
     # First convert any Decimal types to int or float
     response_data = convert_decimal(response_data)
 
+    # Translate all the strings together in batches when the shared layer is attached
+    if translation_engine:
+        result, failed = translation_engine.translate_tree(
+            response_data, "en", target_language_code, translate_client,
+            skip_keys=UNTRANSLATED_KEYS, pretranslated=pretranslated
+        )
+        if failed:
+            logger.error(f"{failed} texts couldn't be translated to {target_language_code}, kept in English")
+        return result
+
     # Handle dictionary objects
     if isinstance(response_data, dict):
         result = {}
         # Process each key-value pair
         for key, value in response_data.items():
             # Skip translation for technical fields that should stay in English
-            if key in ['id', 'referral_id', 'service_area_zip_code', 'zipcode', 'phone', 'status', 'language'] or not value:
+            if key in UNTRANSLATED_KEYS or not value:
                 result[key] = value
                 continue
 
             # Translate string values
-            if isinstance(value, str) and value.strip() and value != "-":
+            if isinstance(value, str) and value.strip() and value != "-" and value not in pretranslated:
                 try:
                     logger.debug(f"Translating '{key}': '{value}' to {target_language_code}")
                     result[key] = translate_text(value, "en", target_language_code)
@@ -339,7 +395,7 @@ def translate_response_data(response_data, target_language_code):
                     result[key] = value  # Keep original on error
             # Recursively process nested dictionaries and lists
             elif isinstance(value, (dict, list)):
-                result[key] = translate_response_data(value, target_language_code)
+                result[key] = translate_response_data(value, target_language_code, pretranslated)
             else:
                 result[key] = value
         return result
@@ -349,7 +405,7 @@ def translate_response_data(response_data, target_language_code):
         result = []
         for item in response_data:
             # Translate string values in the list
-            if isinstance(item, str) and item.strip():
+            if isinstance(item, str) and item.strip() and item not in pretranslated:
                 try:
                     logger.debug(f"Translating list item: '{item}' to {target_language_code}")
                     translated_item = translate_text(item, "en", target_language_code)
@@ -360,7 +416,7 @@ def translate_response_data(response_data, target_language_code):
                     result.append(item)  # Keep original on error
             # Recursively process nested dictionaries and lists in the list
             elif isinstance(item, (dict, list)):
-                result.append(translate_response_data(item, target_language_code))
+                result.append(translate_response_data(item, target_language_code, pretranslated))
             else:
                 result.append(item)
         return result
@@ -369,7 +425,7 @@ def translate_response_data(response_data, target_language_code):
     else:
         return response_data
 
-def call_perplexity_lambda(user_query, user_id, zipcode=None, language='english'):
+def call_perplexity_lambda(user_query, user_id, zipcode=None, language='english', stream_to=None, asynchronous=False):
     """
     Call the Perplexity Lambda function as a fallback when no services are found
 
@@ -378,9 +434,14 @@ def call_perplexity_lambda(user_query, user_id, zipcode=None, language='english'
         user_id: The ID of the user
         zipcode: Optional zipcode
         language: Language for the response
+        stream_to: Optional WebSocket connection (connection_id, domain_name, stage, request_id)
+            that the Perplexity Lambda sends each service to as soon as it's parsed. With a
+            "reply" of "frames" or "message", it also sends its response there; a "message"
+            reply gets only the response, without service frames.
+        asynchronous: Invoke without waiting for the response (use with a stream_to reply)
 
     Returns:
-        Response from Perplexity Lambda
+        Response from Perplexity Lambda, or {"statusCode": 202} when invoked asynchronously
     """
     try:
         logger.info(f"Calling Perplexity Lambda for query: {user_query}")
@@ -392,13 +453,17 @@ def call_perplexity_lambda(user_query, user_id, zipcode=None, language='english'
             "zipcode": zipcode,
             "language": language
         }
+        if stream_to:
+            payload["stream_to"] = stream_to
 
         # Invoke Perplexity Lambda
         response = lambda_client.invoke(
             FunctionName=PERPLEXITY_LAMBDA_ARN,
-            InvocationType='RequestResponse',
+            InvocationType='Event' if asynchronous else 'RequestResponse',
             Payload=json.dumps(payload)
         )
+        if asynchronous:
+            return {"statusCode": 202}
 
         # Parse response and return it directly without additional processing
         return json.loads(response['Payload'].read().decode('utf-8'))
@@ -408,9 +473,39 @@ def call_perplexity_lambda(user_query, user_id, zipcode=None, language='english'
         logger.error(traceback.format_exc())
         return {"statusCode": 500, "body": json.dumps({"status": "error", "message": f"Error calling Perplexity service: {str(e)}"})}
 
+def send_phase(connection_id, domain_name, stage, request_id, phase, data):
+    """
+    Send one frame of a progressive response
+
+    Args:
+        request_id (str): Identifies the query the frame belongs to
+        phase (str): ack, extracted, results, translated, enrichment or final
+        data (dict): Frame contents
+    """
+    frame = {'request_id': request_id, 'phase': phase}
+    frame.update(data)
+    send_to_connection(connection_id, domain_name, stage, frame)
+
 def process_query_websocket(event, connection_id, domain_name, stage):
     """
     Process a query from WebSocket and send the result back
+
+    When the message sets "progressive": true, the result is sent as a series of frames,
+    each with the request_id (taken from the message, or generated) and a phase:
+    - ack: the query was received
+    - extracted: the detected service_categories and zipcode
+    - results: the matching services, in English
+    - translated: the same results in the requested language (non-English queries only)
+    - searching: no services matched, and the Perplexity fallback has started
+    - service: one service from the Perplexity fallback, sent by perplexityLambda while
+      Perplexity is still responding (an index and the service; a cached response sends none)
+    - enrichment: the Perplexity fallback response, when no services matched
+    - final: nothing more will be sent for this request_id
+    Otherwise a single message is sent, as before (preceded by a "searching" status message
+    when the Perplexity fallback runs asynchronously).
+
+    With PERPLEXITY_ASYNC_FALLBACK on, the fallback's enrichment and final frames (or its
+    single message) are sent by perplexityLambda, so this function returns without waiting for it.
     """
     try:
         # Parse body from the WebSocket message
@@ -422,15 +517,18 @@ def process_query_websocket(event, connection_id, domain_name, stage):
         original_query = user_query  # Save original query before any translation
         zipcode = body.get('zipcode')
         language = body.get('language', 'english').lower()  # Default to English
+        progressive = bool(body.get('progressive'))
+        request_id = body.get('request_id') or str(uuid.uuid4())
 
         logger.info(f"WebSocket query - User ID: {user_id}, Query: {user_query}, Language: {language}")
 
+        def progress(phase, data):
+            if progressive:
+                send_phase(connection_id, domain_name, stage, request_id, phase, data)
+
         # Validate input
         if not user_id:
-            error_message = 'Missing required parameter: user_id'
-            if language != 'english':
-                target_lang = get_language_code(language)
-                error_message = translate_text(error_message, "en", target_lang)
+            error_message = localized_message('missing_user_id', 'Missing required parameter: user_id', language)
 
             send_to_connection(connection_id, domain_name, stage, {
                 'error': error_message
@@ -438,11 +536,11 @@ def process_query_websocket(event, connection_id, domain_name, stage):
             return {'statusCode': 400, 'body': 'Missing user_id'}
 
         if not user_query:
-            error_message = "I didn't receive a question. Please provide a query about services you're looking for."
-            # Translate error message if needed
-            if language != 'english':
-                target_lang = get_language_code(language)
-                error_message = translate_text(error_message, "en", target_lang)
+            error_message = localized_message(
+                'missing_query',
+                "I didn't receive a question. Please provide a query about services you're looking for.",
+                language
+            )
 
             send_to_connection(connection_id, domain_name, stage, {
                 'user_id': user_id,
@@ -452,6 +550,8 @@ def process_query_websocket(event, connection_id, domain_name, stage):
             })
             return {'statusCode': 400, 'body': 'Missing user_query'}
 
+        progress('ack', {'user_id': user_id, 'language': language})
+
         # Use bedrockAgent functions to get DynamoDB results
         extracted_data = bedrockAgent.extract_categories_and_zipcode(user_query)
 
@@ -465,6 +565,8 @@ def process_query_websocket(event, connection_id, domain_name, stage):
 
         logger.info(f"Actual Zipcode: {actual_zipcode}")
 
+        progress('extracted', {'service_categories': service_categories, 'zipcode': actual_zipcode})
+
         # Ensure zipcode is in the correct format for DynamoDB queries
         if actual_zipcode and actual_zipcode.isdigit():
             logger.info(f"Using numeric zipcode: {actual_zipcode}")
@@ -475,6 +577,11 @@ def process_query_websocket(event, connection_id, domain_name, stage):
         services = bedrockAgent.query_dynamodb_for_services(service_categories, actual_zipcode)
         logger.info(f"Found {len(services)} matching services in DynamoDB")
 
+        # Look in nearby zip codes before paying for the Perplexity fallback
+        nearby_zipcodes = []
+        if not services and actual_zipcode:
+            services, nearby_zipcodes = bedrockAgent.find_nearby_services(service_categories, actual_zipcode)
+
         # Log a sample service for debugging
         if services and len(services) > 0:
             logger.info(f"Service sample (first item): {json.dumps(services[0], cls=DecimalEncoder)}")
@@ -482,40 +589,96 @@ def process_query_websocket(event, connection_id, domain_name, stage):
         # If services are found in DynamoDB, format and return them
         if services and len(services) > 0:
             logger.info("Returning results from DynamoDB")
-            response_data = bedrockAgent.format_response(services, service_categories, actual_zipcode, user_id)
+            response_data = bedrockAgent.format_response(services, service_categories, actual_zipcode, user_id,
+                                                         nearby_zipcodes)
+            # History keeps the English response
+            english_response_data = response_data
 
-            # Update user query history
-            update_user_query_history(
-                user_id=user_id,
-                user_query=user_query,
-                original_query=original_query,
-                response_data=response_data,
-                zipcode=actual_zipcode,
-                language=language
-            )
+            # Untranslated results can be shown while the translation runs
+            progress('results', {
+                'user_id': user_id,
+                'zipcode': actual_zipcode,
+                'language': 'english',
+                'response_data': response_data
+            })
 
             # Translate response if needed
             if language != 'english':
                 target_lang = get_language_code(language)
                 logger.info(f"Translating response to {language} ({target_lang})")
-                response_data = translate_response_data(response_data, target_lang)
-
-            # Send formatted response through WebSocket
-            send_to_connection(connection_id, domain_name, stage, {
+                # Referral fields translated at ingest are used as stored; only the rest is translated
+                response_data = bedrockAgent.format_response(services, service_categories, actual_zipcode, user_id,
+                                                             nearby_zipcodes, language_code=target_lang,
+                                                             store_referrals=False)
+                response_data = translate_response_data(response_data, target_lang,
+                                                        bedrockAgent.localized_texts(services, target_lang))
+
+            result_message = {
                 'user_id': user_id,
                 'zipcode': actual_zipcode,
                 'language': language,
                 'response_data': response_data
-            })
+            }
+            if not progressive:
+                # Send formatted response through WebSocket
+                send_to_connection(connection_id, domain_name, stage, result_message)
+            elif language != 'english':
+                progress('translated', result_message)
+            progress('final', {'status': 'success'})
+
+            # Update user query history once the client has its answer
+            update_user_query_history(
+                user_id=user_id,
+                user_query=user_query,
+                original_query=original_query,
+                response_data=english_response_data,
+                zipcode=actual_zipcode,
+                language=language
+            )
 
             return {'statusCode': 200, 'body': 'Query processed successfully'}
         else:
             # No services found in DynamoDB, call Perplexity Lambda as fallback
             logger.info("No services found in DynamoDB, calling Perplexity Lambda")
-            perplexity_response = call_perplexity_lambda(user_query, user_id, actual_zipcode, language)
+            stream_to = None
+            if progressive or PERPLEXITY_ASYNC_FALLBACK:
+                stream_to = {
+                    'connection_id': connection_id,
+                    'domain_name': domain_name,
+                    'stage': stage,
+                    'request_id': request_id
+                }
+
+            if PERPLEXITY_ASYNC_FALLBACK:
+                searching_message = localized_message('searching_wider', "No exact matches yet, searching wider for services...", language)
+                if progressive:
+                    progress('searching', {'message': searching_message})
+                else:
+                    send_to_connection(connection_id, domain_name, stage, {
+                        'user_id': user_id,
+                        'zipcode': actual_zipcode,
+                        'language': language,
+                        'status': 'searching',
+                        'message': searching_message
+                    })
+
+                # The Perplexity Lambda sends its response to the connection itself
+                handoff = call_perplexity_lambda(user_query, user_id, actual_zipcode, language,
+                                                 dict(stream_to, reply='frames' if progressive else 'message'),
+                                                 asynchronous=True)
+                if handoff.get('statusCode') == 202:
+                    return {'statusCode': 200, 'body': 'Query handed to Perplexity Lambda'}
+                logger.warning("Asynchronous Perplexity invoke failed, waiting for the response instead")
+
+            perplexity_response = call_perplexity_lambda(user_query, user_id, actual_zipcode, language,
+                                                         stream_to if progressive else None)
 
             # Send Perplexity response through WebSocket
-            send_to_connection(connection_id, domain_name, stage, perplexity_response)
+            if progressive:
+                progress('enrichment', {'perplexity_response': perplexity_response})
+                progress('final', {'status': 'success'})
+            else:
+                send_to_connection(connection_id, domain_name, stage, perplexity_response)
 
             return {'statusCode': 200, 'body': 'Query processed successfully with Perplexity fallback'}
 
@@ -523,16 +686,17 @@ def process_query_websocket(event, connection_id, domain_name, stage):
         logger.error(f"Error processing WebSocket query: {str(e)}")
         logger.error(traceback.format_exc())
 
-        error_message = 'Error processing query'
-        # Translate error message if needed
-        if 'language' in locals() and language != 'english':
-            target_lang = get_language_code(language)
-            error_message = translate_text(error_message, "en", target_lang)
+        error_message = localized_message('query_error', 'Error processing query',
+                                          language if 'language' in locals() else 'english')
 
-        send_to_connection(connection_id, domain_name, stage, {
+        error_frame = {
             'error': error_message,
             'message': str(e)
-        })
+        }
+        if 'progressive' in locals() and progressive:
+            send_phase(connection_id, domain_name, stage, request_id, 'final', dict(error_frame, status='error'))
+        else:
+            send_to_connection(connection_id, domain_name, stage, error_frame)
 
         return {'statusCode': 500, 'body': 'Error processing query'}
 
@@ -575,6 +739,26 @@ def send_to_connection(connection_id, domain_name, stage, data):
             logger.error(f"Error sending message to connection {connection_id}: {str(e)}")
             raise e
 
+def handle_extract_many(body):
+    """
+    Extract service categories and zipcodes for a list of queries without searching or storing anything.
+    Only reachable by direct Lambda invoke, with at most EXTRACT_MANY_MAX_QUERIES queries.
+
+    Expected input:
+    {
+        "action": "extractMany",
+        "queries": ["Where can I find food pantries?", "shelters near 60505", ...]
+    }
+    """
+    queries = body.get('queries')
+    if not isinstance(queries, list) or not all(isinstance(query, str) for query in queries):
+        return format_response(400, {'error': 'queries must be a list of strings'})
+    if len(queries) > EXTRACT_MANY_MAX_QUERIES:
+        return format_response(400, {'error': f'At most {EXTRACT_MANY_MAX_QUERIES} queries can be extracted per call'})
+
+    results = bedrockAgent.extract_categories_and_zipcode_many(queries)
+    return format_response(200, {'results': results})
+
 def handle_rest_event(event, context):
     """
     Handle REST API events (original functionality)
@@ -588,6 +772,10 @@ def handle_rest_event(event, context):
             # Direct Lambda invocation (for AWS Lambda console testing)
             body = event
 
+        # Bulk classification (used by query-analytics-backfill); direct invokes only, never through API Gateway
+        if 'body' not in event and body.get('action') == 'extractMany':
+            return handle_extract_many(body)
+
         # Extract parameters
         user_id = body.get('user_id')
         user_query = body.get('user_query', '')
@@ -599,10 +787,7 @@ def handle_rest_event(event, context):
 
         # Validate input
         if not user_id:
-            error_message = 'Missing required parameter: user_id'
-            if language != 'english':
-                target_lang = get_language_code(language)
-                error_message = translate_text(error_message, "en", target_lang)
+            error_message = localized_message('missing_user_id', 'Missing required parameter: user_id', language)
 
             return format_response(400, {
                 'error': error_message,
@@ -610,11 +795,11 @@ def handle_rest_event(event, context):
             })
 
         if not user_query:
-            error_message = "I didn't receive a question. Please provide a query about services you're looking for."
-            # Translate error message if needed
-            if language != 'english':
-                target_lang = get_language_code(language)
-                error_message = translate_text(error_message, "en", target_lang)
+            error_message = localized_message(
+                'missing_query',
+                "I didn't receive a question. Please provide a query about services you're looking for.",
+                language
+            )
 
             return format_response(400, {
                 'user_id': user_id,
@@ -646,6 +831,11 @@ def handle_rest_event(event, context):
         services = bedrockAgent.query_dynamodb_for_services(service_categories, actual_zipcode)
         logger.info(f"Found {len(services)} matching services in DynamoDB")
 
+        # Look in nearby zip codes before paying for the Perplexity fallback
+        nearby_zipcodes = []
+        if not services and actual_zipcode:
+            services, nearby_zipcodes = bedrockAgent.find_nearby_services(service_categories, actual_zipcode)
+
         # Log a sample service for debugging
         if services and len(services) > 0:
             logger.info(f"Service sample (first item): {json.dumps(services[0], cls=DecimalEncoder)}")
@@ -653,7 +843,8 @@ def handle_rest_event(event, context):
         # If services are found in DynamoDB, format and return them
         if services and len(services) > 0:
             logger.info("Returning results from DynamoDB")
-            response_data = bedrockAgent.format_response(services, service_categories, actual_zipcode, user_id)
+            response_data = bedrockAgent.format_response(services, service_categories, actual_zipcode, user_id,
+                                                         nearby_zipcodes)
 
             # Update user query history
             update_user_query_history(
@@ -669,7 +860,12 @@ def handle_rest_event(event, context):
             if language != 'english':
                 target_lang = get_language_code(language)
                 logger.info(f"Translating response to {language} ({target_lang})")
-                response_data = translate_response_data(response_data, target_lang)
+                # Referral fields translated at ingest are used as stored; only the rest is translated
+                response_data = bedrockAgent.format_response(services, service_categories, actual_zipcode, user_id,
+                                                             nearby_zipcodes, language_code=target_lang,
+                                                             store_referrals=False)
+                response_data = translate_response_data(response_data, target_lang,
+                                                        bedrockAgent.localized_texts(services, target_lang))
 
             return format_response(200, {
                 'user_id': user_id,
@@ -686,13 +882,12 @@ def handle_rest_event(event, context):
         logger.error(f"Error in handle_rest_event: {str(e)}")
         logger.error(traceback.format_exc())
 
-        error_message = "I encountered an error while processing your request. Please try again or rephrase your question."
         language = body.get('language', 'english').lower() if isinstance(body, dict) else 'english'
-
-        # Translate error message if needed
-        if language != 'english':
-            target_lang = get_language_code(language)
-            error_message = translate_text(error_message, "en", target_lang)
+        error_message = localized_message(
+            'request_error',
+            "I encountered an error while processing your request. Please try again or rephrase your question.",
+            language
+        )
 
         error_response = {
             'user_id': body.get('user_id', 'unknown') if isinstance(body, dict) else 'unknown',
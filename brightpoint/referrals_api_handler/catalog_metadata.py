@@ -0,0 +1,76 @@
+import os
+import logging
+from decimal import Decimal
+from datetime import datetime
+from typing import Dict, Any, Optional
+import boto3
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Single item holding per-category referral counts and a catalog version.
+# The chatbot caches the category list from it and reloads its catalog when the version changes.
+metadata_table = boto3.resource('dynamodb').Table(os.environ.get('CATALOG_METADATA_TABLE', 'referral_catalog_metadata'))
+TAXONOMY_METADATA_KEY = 'service_categories'
+# Only writes to this table change the chatbot's catalog. Defaults to the table the
+# referrals API writes to, so a renamed table doesn't silently stop version bumps.
+CATALOG_TABLE_NAME = os.environ.get('CATALOG_TABLE_NAME', os.environ.get('REFERRALS_TABLE_NAME', 'referral_data'))
+
+def item_category(item: Optional[Dict[str, Any]]) -> Optional[str]:
+    if not item:
+        return None
+    category = item.get('Service Category Type') or item.get('\ufeffService Category Type')
+    return str(category) if category else None
+
+def record_referral_write(table_name: str, old_item: Optional[Dict[str, Any]], new_item: Optional[Dict[str, Any]]) -> None:
+    """
+    Apply a referral create/update/delete to the catalog metadata item:
+    moves the referral's category count and bumps the catalog version.
+
+    The item is only updated if it exists; when it doesn't, the chatbot builds it
+    from a full scan on first use, which already includes this write.
+
+    Args:
+        table_name: Table the referral was written to
+        old_item: Referral before the write (None for a create)
+        new_item: Referral after the write (None for a delete)
+    """
+    if table_name != CATALOG_TABLE_NAME:
+        logger.warning(f"Referral written to {table_name}, not the catalog table {CATALOG_TABLE_NAME}; catalog version not bumped")
+        return
+
+    deltas = {}
+    old_category = item_category(old_item)
+    new_category = item_category(new_item)
+    if old_category != new_category:
+        if old_category:
+            deltas[old_category] = deltas.get(old_category, 0) - 1
+        if new_category:
+            deltas[new_category] = deltas.get(new_category, 0) + 1
+
+    update_expression = "SET #updated_at = :updated_at ADD #version :one"
+    expression_attribute_names = {'#version': 'version', '#updated_at': 'updated_at', '#counts': 'category_counts'}
+    expression_attribute_values = {':one': Decimal(1), ':updated_at': datetime.now().isoformat()}
+    for i, (category, delta) in enumerate(deltas.items()):
+        update_expression += f", #counts.#cat{i} :delta{i}"
+        expression_attribute_names[f'#cat{i}'] = category
+        expression_attribute_values[f':delta{i}'] = Decimal(delta)
+
+    try:
+        metadata_table.update_item(
+            Key={'metadata_key': TAXONOMY_METADATA_KEY},
+            UpdateExpression=update_expression,
+            ConditionExpression="attribute_exists(metadata_key)",
+            ExpressionAttributeNames=expression_attribute_names,
+            ExpressionAttributeValues=expression_attribute_values
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            logger.info("Catalog metadata item doesn't exist yet, skipping update")
+        else:
+            logger.error(f"Error updating catalog metadata: {str(e)}")
+    except Exception as e:
+        # The referral write already succeeded. Counts stay off until the item is rebuilt
+        # (deleting it makes the chatbot rebuild it from a scan on next use).
+        logger.error(f"Error updating catalog metadata: {str(e)}")
@@ -3,17 +3,37 @@ import boto3
 import uuid
 import os
 from boto3.dynamodb.types import TypeSerializer
+from boto3.dynamodb.conditions import Key
 from typing import Dict, Any, Optional, List
 import decimal
 import json
 import time
 import logging
 import decimal
+import search_index
+import paging
+import catalog_metadata
+
+try:
+    import catalog_translations
+except ImportError:
+    # The shared layer isn't attached; referrals are stored in English only
+    catalog_translations = None
 
 # Initialize DynamoDB clients
 dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(os.environ.get('REFERRALS_TABLE_NAME', 'Referrals'))
+# The chatbot's catalog table; writes here bump the catalog version the chatbot reloads on
+table = dynamodb.Table(os.environ.get('REFERRALS_TABLE_NAME', 'referral_data'))
 connections_table = dynamodb.Table(os.environ.get('CONNECTIONS_TABLE_NAME', 'WebSocketConnections'))
+translate_client = boto3.client('translate')
+REFERRALS_ZIP_INDEX = os.environ.get('REFERRALS_ZIP_INDEX', 'ServiceAreaZip-index')
+# How long a container's search index is used before it is rebuilt from the table
+SEARCH_INDEX_TTL_SECONDS = int(os.environ.get('SEARCH_INDEX_TTL_SECONDS', '300'))
+# Default and maximum number of referrals per page for getReferrals, searchReferrals and GET /referrals
+REFERRALS_PAGE_SIZE = int(os.environ.get('REFERRALS_PAGE_SIZE', '100'))
+MAX_PAGE_SIZE = 1000
+# API Gateway rejects WebSocket frames over 128 KB, so leave room for the rest of the message
+FRAME_BYTE_BUDGET = int(os.environ.get('FRAME_BYTE_BUDGET', str(96 * 1024)))
 serializer = TypeSerializer()
 
 logger = logging.getLogger()
@@ -23,11 +43,8 @@ logger.setLevel(logging.INFO)
 # API Gateway Management API client
 api_gateway_management = None
 
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, decimal.Decimal):
-            return float(obj)  # Convert Decimal to float for JSON serialization
-        return super(DecimalEncoder, self).default(obj)
+# Shared with the paging helpers so frames are measured the same way they are sent
+DecimalEncoder = paging.DecimalEncoder
 
 def lambda_handler(event, context):
     """
@@ -52,7 +69,7 @@ def lambda_handler(event, context):
             referral_id = path.split('/')[-1]
             return delete_referral(referral_id)
         elif http_method == 'GET' and path == '/referrals':
-            return get_all_referrals()
+            return get_all_referrals(event)
         elif http_method == 'GET' and path.startswith('/referrals/'):
             referral_id = path.split('/')[-1]
             return get_referral(referral_id)
@@ -165,13 +182,23 @@ def handle_search_referrals(connection_id, event):
 
         logger.info(f"Search params are {search_params}")
         # Perform the search
-        results = perform_search(search_params)
-
-        # Send results back to the client
-        send_to_connection(connection_id, {
-            'action': 'searchReferrals',
-            'referrals': results
-        })
+        results, facets = perform_search(search_params)
+        page_size = get_page_size(message.get('pageSize'))
+
+        # Send results back to the client, one page at a time
+        if 'cursor' in message or 'page' in message:
+            # Only the requested page
+            start, end = paging.page_bounds(len(results), message.get('cursor'), message.get('page'), page_size)
+            send_search_page(connection_id, results, facets, start, end, page_size)
+        else:
+            # Every page, in order
+            start = 0
+            while True:
+                end = min(start + page_size, len(results))
+                send_search_page(connection_id, results, facets, start, end, page_size)
+                if end >= len(results):
+                    break
+                start = end
 
         return {'statusCode': 200, 'body': 'Search processed'}
     except Exception as e:
@@ -191,19 +218,32 @@ def handle_custom_route(connection_id, route_key, event):
 
         # Route to appropriate handler based on the route_key
         if route_key == 'getReferrals':
-            # Get all referrals and send them to the client
-            response = table.scan()
-            items = response.get('Items', [])
-
-            # Handle pagination for large datasets
-            while 'LastEvaluatedKey' in response:
-                response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
-                items.extend(response.get('Items', []))
-
-            send_to_connection(connection_id, {
-                'action': 'getReferrals',
-                'referrals': items
-            })
+            # Send referrals to the client one scan page at a time
+            page_size = get_page_size(message.get('pageSize'))
+
+            if 'cursor' in message or 'page' in message:
+                # Only the requested page
+                cursor = message.get('cursor')
+                if not cursor and message.get('page'):
+                    cursor = skip_referral_pages(int(message['page']), page_size)
+                items, next_cursor, page = scan_referral_page(cursor, page_size)
+                send_referral_frames(connection_id, 'getReferrals', items, {
+                    'page': page,
+                    'nextCursor': next_cursor,
+                    'hasMore': next_cursor is not None
+                })
+            else:
+                # The whole table, without holding more than one page in memory
+                cursor = None
+                while True:
+                    items, cursor, page = scan_referral_page(cursor, page_size)
+                    send_referral_frames(connection_id, 'getReferrals', items, {
+                        'page': page,
+                        'nextCursor': cursor,
+                        'hasMore': cursor is not None
+                    })
+                    if cursor is None:
+                        break
 
         elif route_key == 'getReferral':
             # Get a specific referral by ID
@@ -224,7 +264,7 @@ def handle_custom_route(connection_id, route_key, event):
             else:
                 send_to_connection(connection_id, {
                     'action': 'getReferral',
-                    'referral': response['Item']
+                    'referral': public_fields(response['Item'])
                 })
 
         elif route_key == 'createReferral':
@@ -240,7 +280,7 @@ def handle_custom_route(connection_id, route_key, event):
             }
 
             # Add all fields from the request
-            data = message.get('data', {})
+            data = public_fields(message.get('data', {}))
             for key, value in data.items():
                 if key not in ['referral_id', 'id']:  # Skip IDs as we've already set them
                     if key == 'Service Area Zip Code':
@@ -248,14 +288,17 @@ def handle_custom_route(connection_id, route_key, event):
                         item[key] = int(value)
                     else:
                         item[key] = str(value)
+            item.update(catalog_translation_attributes(item))
 
             # Write to DynamoDB
             table.put_item(Item=item)
+            search_index.index_upsert(item)
+            catalog_metadata.record_referral_write(table.name, None, item)
 
             # Broadcast to all connected clients
             broadcast_to_all({
                 'action': 'newReferral',
-                'referral': item
+                'referral': public_fields(item)
             })
 
             # Also send direct confirmation to the requesting client
@@ -268,7 +311,7 @@ def handle_custom_route(connection_id, route_key, event):
         elif route_key == 'updateReferral':
             # Update an existing referral
             referral_id = message.get('referral_id')
-            data = message.get('data', {})
+            data = public_fields(message.get('data', {}))
 
             if not referral_id:
                 send_to_connection(connection_id, {
@@ -308,6 +351,15 @@ def handle_custom_route(connection_id, route_key, event):
                     else:
                         expression_attribute_values[attr_val] = str(value)
 
+            # Translations follow the English fields as they'll be after the update
+            updated_fields = dict(response['Item'], **{key: str(value) for key, value in data.items()
+                                                       if key not in ['referral_id', 'id', 'Service Area Zip Code']})
+            for key, value in catalog_translation_attributes(updated_fields).items():
+                i += 1
+                update_expression += f"#attr{i} = :val{i}, "
+                expression_attribute_names[f"#attr{i}"] = key
+                expression_attribute_values[f":val{i}"] = value
+
             # Remove trailing comma and space
             update_expression = update_expression.rstrip(', ')
 
@@ -319,11 +371,13 @@ def handle_custom_route(connection_id, route_key, event):
                 ExpressionAttributeValues=expression_attribute_values,
                 ReturnValues='ALL_NEW'
             ).get('Attributes', {})
+            search_index.index_upsert(updated_item)
+            catalog_metadata.record_referral_write(table.name, response['Item'], updated_item)
 
             # Broadcast to all connected clients
             broadcast_to_all({
                 'action': 'updatedReferral',
-                'referral': updated_item
+                'referral': public_fields(updated_item)
             })
 
             # Also send direct confirmation to the requesting client
@@ -355,6 +409,8 @@ def handle_custom_route(connection_id, route_key, event):
 
             # Delete the item
             table.delete_item(Key={'referral_id': referral_id})
+            search_index.index_remove(referral_id)
+            catalog_metadata.record_referral_write(table.name, response['Item'], None)
 
             # Broadcast to all connected clients
             broadcast_to_all({
@@ -428,12 +484,35 @@ def broadcast_to_all(data):
         send_to_connection(connection['connectionId'], data)
 
 # Original REST API functions
+def public_fields(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    A referral without its stored catalog translations. They are kept out of API and broadcast
+    output, and out of request bodies, where they would clash with the ones written on update.
+    """
+    if catalog_translations is None:
+        return item
+    return {key: value for key, value in item.items() if key not in catalog_translations.LOCALIZED_ATTRIBUTES}
+
+def catalog_translation_attributes(item: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Spanish and Polish versions of a referral's text fields, to store with it. Empty when its
+    English fields haven't changed since they were translated, or translation isn't available.
+    A write never fails because of translation; the chatbot translates the fields itself then.
+    """
+    if catalog_translations is None:
+        return {}
+    try:
+        return catalog_translations.translate_catalog_items([item], translate_client)[0]
+    except Exception as e:
+        logger.error(f"Error translating referral fields: {str(e)}")
+        return {}
+
 def create_referral(event):
     """
     Create a new referral entry in DynamoDB
     """
     try:
-        body = json.loads(event['body'])
+        body = public_fields(json.loads(event['body']))
 
         # Add unique IDs
         referral_id = str(uuid.uuid4())
@@ -453,6 +532,8 @@ def create_referral(event):
                     item[key] = {'N': str(value)}
                 else:
                     item[key] = {'S': str(value)}
+        translations = catalog_translation_attributes({key: value['S'] for key, value in item.items() if 'S' in value})
+        item.update({key: {'S': value} for key, value in translations.items()})
 
         # Write to DynamoDB using low-level put_item
         dynamodb_client = boto3.client('dynamodb')
@@ -461,6 +542,14 @@ def create_referral(event):
             Item=item
         )
 
+        # Keep this container's search index in step, using the shape the table returns items in
+        created_item = {
+            key: decimal.Decimal(value['N']) if 'N' in value else value['S']
+            for key, value in item.items()
+        }
+        search_index.index_upsert(created_item)
+        catalog_metadata.record_referral_write(table.name, None, created_item)
+
         # Notify all WebSocket connections about the new referral
         broadcast_to_all({
             'action': 'newReferral',
@@ -482,7 +571,7 @@ def update_referral(event, referral_id):
     Update an existing referral in DynamoDB
     """
     try:
-        body = json.loads(event['body'])
+        body = public_fields(json.loads(event['body']))
 
         # Get the existing item first to confirm it exists
         response = table.get_item(Key={'referral_id': referral_id})
@@ -511,6 +600,15 @@ def update_referral(event, referral_id):
                 else:
                     expression_attribute_values[attr_val] = str(value)
 
+        # Translations follow the English fields as they'll be after the update
+        updated_fields = dict(response['Item'], **{key: str(value) for key, value in body.items()
+                                                   if key not in ['referral_id', 'id', 'Service Area Zip Code']})
+        for key, value in catalog_translation_attributes(updated_fields).items():
+            i += 1
+            update_expression += f"#attr{i} = :val{i}, "
+            expression_attribute_names[f"#attr{i}"] = key
+            expression_attribute_values[f":val{i}"] = value
+
         # Remove trailing comma and space
         update_expression = update_expression.rstrip(', ')
 
@@ -522,11 +620,13 @@ def update_referral(event, referral_id):
             ExpressionAttributeValues=expression_attribute_values,
             ReturnValues='ALL_NEW'
         ).get('Attributes', {})
+        search_index.index_upsert(updated_item)
+        catalog_metadata.record_referral_write(table.name, response['Item'], updated_item)
 
         # Notify all WebSocket connections about the updated referral
         broadcast_to_all({
             'action': 'updatedReferral',
-            'referral': updated_item
+            'referral': public_fields(updated_item)
         })
 
         return build_response(200, {'message': f'Referral {referral_id} updated successfully'})
@@ -546,6 +646,8 @@ def delete_referral(referral_id):
 
         # Delete the item
         table.delete_item(Key={'referral_id': referral_id})
+        search_index.index_remove(referral_id)
+        catalog_metadata.record_referral_write(table.name, response['Item'], None)
 
         # Notify all WebSocket connections about the deleted referral
         broadcast_to_all({
@@ -558,21 +660,29 @@ def delete_referral(referral_id):
     except Exception as e:
         return build_response(400, {'error': f'Failed to delete referral: {str(e)}'})
 
-def get_all_referrals():
+def get_all_referrals(event):
     """
-    Get all referrals from DynamoDB
+    Get one page of referrals from DynamoDB.
+    Query string parameters: cursor (from the previous page), page (zero-based) and limit.
     """
     try:
-        response = table.scan()
-        items = response.get('Items', [])
-
-        # Handle pagination for large datasets
-        while 'LastEvaluatedKey' in response:
-            response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
-            items.extend(response.get('Items', []))
-
-        return build_response(200, {'referrals': items})
+        query_params = event.get('queryStringParameters') or {}
+        page_size = get_page_size(query_params.get('limit'))
+
+        cursor = query_params.get('cursor')
+        if not cursor and query_params.get('page'):
+            cursor = skip_referral_pages(int(query_params['page']), page_size)
+        items, next_cursor, page = scan_referral_page(cursor, page_size)
+
+        return build_response(200, {
+            'referrals': items,
+            'page': page,
+            'nextCursor': next_cursor,
+            'hasMore': next_cursor is not None
+        })
 
+    except ValueError as e:
+        return build_response(400, {'error': f'Invalid paging parameters: {str(e)}'})
     except Exception as e:
         return build_response(500, {'error': f'Failed to retrieve referrals: {str(e)}'})
 
@@ -586,7 +696,7 @@ def get_referral(referral_id):
         if 'Item' not in response:
             return build_response(404, {'error': f'Referral with ID {referral_id} not found'})
 
-        return build_response(200, {'referral': response['Item']})
+        return build_response(200, {'referral': public_fields(response['Item'])})
 
     except Exception as e:
         return build_response(500, {'error': f'Failed to retrieve referral: {str(e)}'})
@@ -600,30 +710,157 @@ def search_referrals(event):
         search_params = body.get('searchParams', {})
         logger.info("Performing search operation")
 
-        results = perform_search(search_params)
+        results, facets = perform_search(search_params)
+
+        if 'cursor' in body or 'page' in body or 'pageSize' in body:
+            page_size = get_page_size(body.get('pageSize'))
+            start, end = paging.page_bounds(len(results), body.get('cursor'), body.get('page'), page_size)
+            next_cursor = paging.encode_cursor({'offset': end}) if end < len(results) else None
+            return build_response(200, {
+                'referrals': results[start:end],
+                'facets': facets,
+                'page': start // page_size,
+                'totalCount': len(results),
+                'nextCursor': next_cursor,
+                'hasMore': next_cursor is not None
+            })
 
-        return build_response(200, {'referrals': results})
+        return build_response(200, {'referrals': results, 'facets': facets})
     except Exception as e:
         return build_response(400, {'error': f'Failed to search referrals: {str(e)}'})
 
-def perform_search(search_params):
+def get_page_size(value):
     """
-    Perform a search based on the provided parameters
-    Supports search by agency names, zip codes, service categories, or cities
+    Parse a requested page size, falling back to the default and capping it at MAX_PAGE_SIZE
     """
     try:
-        logger.info(f"Starting search with parameters: {search_params}")
+        page_size = int(value) if value else REFERRALS_PAGE_SIZE
+    except (ValueError, TypeError):
+        page_size = REFERRALS_PAGE_SIZE
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+def scan_referral_page(cursor, page_size):
+    """
+    Read one page of referrals with a Scan
+
+    Args:
+        cursor: Cursor returned with the previous page, or None for the first page
+        page_size: Maximum number of items to read
+
+    Returns:
+        tuple: (items, cursor for the next page or None, zero-based page number)
+    """
+    state = paging.decode_cursor(cursor) or {}
+    scan_args = {'Limit': page_size}
+    if state.get('end'):
+        # Cursor for a page past the end of the table
+        return [], None, int(state.get('page', 0))
+    if state.get('key'):
+        scan_args['ExclusiveStartKey'] = state['key']
+
+    response = table.scan(**scan_args)
+    page = int(state.get('page', 0))
+    next_cursor = None
+    if 'LastEvaluatedKey' in response:
+        next_cursor = paging.encode_cursor({'key': response['LastEvaluatedKey'], 'page': page + 1})
+    return [public_fields(item) for item in response.get('Items', [])], next_cursor, page
+
+def skip_referral_pages(page, page_size):
+    """
+    Build the cursor for page N of the table by walking the pages before it, reading keys only
+    """
+    state = {'page': 0}
+    while state['page'] < page:
+        scan_args = {'Limit': page_size, 'ProjectionExpression': 'referral_id'}
+        if state.get('key'):
+            scan_args['ExclusiveStartKey'] = state['key']
+        response = table.scan(**scan_args)
+        if 'LastEvaluatedKey' not in response:
+            return paging.encode_cursor({'end': True, 'page': page})
+        state = {'key': response['LastEvaluatedKey'], 'page': state['page'] + 1}
+    return paging.encode_cursor(state) if state.get('key') else None
+
+def send_referral_frames(connection_id, action, items, envelope, first_frame_fields=None):
+    """
+    Send a page of referrals as one or more WebSocket frames packed to FRAME_BYTE_BUDGET.
+    Every frame carries the page envelope plus its position (frame, frameCount) within the page.
+    """
+    frames = paging.pack_frames(items, FRAME_BYTE_BUDGET)
+    for frame_number, frame_items in enumerate(frames):
+        data = {
+            'action': action,
+            'referrals': frame_items,
+            **envelope,
+            'frame': frame_number,
+            'frameCount': len(frames)
+        }
+        if frame_number == 0 and first_frame_fields:
+            data.update(first_frame_fields)
+        send_to_connection(connection_id, data)
 
-        # Get all items from DynamoDB
+def send_search_page(connection_id, results, facets, start, end, page_size):
+    """
+    Send results[start:end] of a search, with the facets on the page's first frame
+    """
+    next_cursor = paging.encode_cursor({'offset': end}) if end < len(results) else None
+    send_referral_frames(connection_id, 'searchReferrals', results[start:end], {
+        'page': start // page_size,
+        'totalCount': len(results),
+        'nextCursor': next_cursor,
+        'hasMore': next_cursor is not None
+    }, {'facets': facets})
+
+def scan_all_referrals():
+    """
+    Read every referral with a paginated Scan
+    """
+    response = table.scan()
+    items = response.get('Items', [])
+
+    while 'LastEvaluatedKey' in response:
+        response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+        items.extend(response.get('Items', []))
+
+    return items
+
+def load_search_candidates(zip_codes):
+    """
+    Load the items a search has to consider.
+    With zip codes, only items in those zips can match, so they are fetched with
+    one Query per zip on the zip index. Otherwise (or if the index is missing) the table is scanned.
+    """
+    if not zip_codes:
         logger.info("Scanning DynamoDB table for items...")
-        response = table.scan()
-        items = response.get('Items', [])
+        return scan_all_referrals()
 
-        while 'LastEvaluatedKey' in response:
-            response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+    try:
+        items = []
+        for zip_code in dict.fromkeys(zip_codes):
+            query_args = {
+                'IndexName': REFERRALS_ZIP_INDEX,
+                'KeyConditionExpression': Key('Service Area Zip Code').eq(zip_code)
+            }
+            response = table.query(**query_args)
             items.extend(response.get('Items', []))
 
-        logger.info(f"Retrieved total of {len(items)} items from DynamoDB")
+            while 'LastEvaluatedKey' in response:
+                response = table.query(ExclusiveStartKey=response['LastEvaluatedKey'], **query_args)
+                items.extend(response.get('Items', []))
+        return items
+    except Exception as e:
+        logger.warning(f"Zip index query failed, scanning table instead: {e}")
+        return scan_all_referrals()
+
+def perform_search(search_params):
+    """
+    Perform a search based on the provided parameters
+    Supports search by agency names, zip codes, service categories, or cities
+
+    Returns:
+        tuple: (matching items, per-category and per-city counts over the matches)
+    """
+    try:
+        logger.info(f"Starting search with parameters: {search_params}")
 
         # Prepare search terms
         agency_names = [name.lower() for name in search_params.get('Agency Names', []) if name]
@@ -633,6 +870,17 @@ def perform_search(search_params):
 
         logger.debug(f"Processed search parameters: agencies={agency_names}, zips={zip_codes}, categories={service_categories}, cities={cities}")
 
+        # Serve from the container's search index when it is available
+        index = search_index.get_search_index(scan_all_referrals, SEARCH_INDEX_TTL_SECONDS)
+        if index is not None:
+            filtered_items, facets = index.search(agency_names, zip_codes, service_categories, cities)
+            logger.info(f"Search completed from index: Found {len(filtered_items)} matching items.")
+            return [public_fields(item) for item in filtered_items], facets
+
+        # Every criterion must match, so a zip filter narrows the candidates to a few index Queries
+        items = load_search_candidates(zip_codes)
+        logger.info(f"Retrieved total of {len(items)} items from DynamoDB")
+
         filtered_items = []
 
         for item in items:
@@ -679,234 +927,12 @@ def perform_search(search_params):
                 filtered_items.append(item)
 
         logger.info(f"Search completed: Found {len(filtered_items)} matching items.")
-        return filtered_items
+        return [public_fields(item) for item in filtered_items], search_index.facet_counts(filtered_items)
 
     except Exception as e:
         logger.error(f"Error during search: {e}", exc_info=True)
         raise e
 
-    """
-    Perform a search based on the provided parameters
-    Supports search by agency names, zip codes, service categories, or cities
-    """
-    try:
-        logger.info(f"Starting search with parameters: {search_params}")
-
-        # Get all items from DynamoDB
-        logger.info("Scanning DynamoDB table for items...")
-        response = table.scan()
-        items = response.get('Items', [])
-
-        # Handle pagination for large datasets
-        page_count = 1
-        while 'LastEvaluatedKey' in response:
-            logger.info(f"Retrieving additional page {page_count} of results")
-            response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
-            items.extend(response.get('Items', []))
-            page_count += 1
-
-        logger.info(f"Retrieved total of {len(items)} items from DynamoDB")
-
-        # Filter items based on search criteria
-        filtered_items = []
-
-        # Extract search parameters
-        agency_names = search_params.get('Agency Names', [])
-        zip_codes = search_params.get('Service Area Zip Codes', [])
-        service_categories = search_params.get('Service Category Types', [])
-        cities = search_params.get('Cities', [])
-
-        logger.debug(f"Raw search parameters - Agency Names: {agency_names}, Zip Codes: {zip_codes}, "
-                   f"Service Categories: {service_categories}, Cities: {cities}")
-
-        # Convert zip codes to integers if they're provided
-        try:
-            zip_codes = [int(zip_code) for zip_code in zip_codes]
-            logger.debug(f"Converted zip codes to integers: {zip_codes}")
-        except (ValueError, TypeError) as e:
-            logger.warning(f"Error converting zip codes to integers: {e}. Setting to empty list.")
-            # Handle case where zip codes might not be valid integers
-            zip_codes = []
-
-        # Case-insensitive search for text fields
-        agency_names = [name.lower() if name else "" for name in agency_names]
-        service_categories = [category.lower() if category else "" for category in service_categories]
-        cities = [city.lower() if city else "" for city in cities]
-
-        logger.debug(f"Processed search parameters - Agency Names: {agency_names}, Zip Codes: {zip_codes}, "
-                   f"Service Categories: {service_categories}, Cities: {cities}")
-
-        # Filter the items
-        items_processed = 0
-        matches_found = 0
-
-        logger.info("Starting to filter items based on search criteria")
-        for item in items:
-            items_processed += 1
-            if items_processed % 100 == 0:
-                logger.debug(f"Processed {items_processed}/{len(items)} items")
-
-            # If no search parameters are provided, include all items
-            if not any([agency_names, zip_codes, service_categories, cities]):
-                logger.debug("No search parameters provided, including all items")
-                filtered_items.append(item)
-                matches_found += 1
-                continue
-
-            # Debug item contents for troubleshooting
-            item_id = item.get('id', 'unknown')
-            referral_id = item.get('referral_id', 'unknown')
-            logger.debug(f"Processing item ID: {item_id}, Referral ID: {referral_id}")
-
-            # Check agency name match (if agency_names is provided)
-            agency_match = False
-            if not agency_names:
-                agency_match = True
-            elif 'Agency Name' in item:
-                for name in agency_names:
-                    if name in item['Agency Name'].lower():
-                        logger.debug(f"Agency name match found: '{name}' in '{item['Agency Name']}'")
-                        agency_match = True
-                        break
-            elif 'Organization' in item:  # Check alternative field name
-                for name in agency_names:
-                    if name in item['Organization'].lower():
-                        logger.debug(f"Organization name match found: '{name}' in '{item['Organization']}'")
-                        agency_match = True
-                        break
-
-            # Check zip code match (if zip_codes is provided)
-            zip_match = False
-            if not zip_codes:
-                zip_match = True
-            elif 'Service Area Zip Code' in item:
-                try:
-                    item_zip = int(item['Service Area Zip Code']) if isinstance(item['Service Area Zip Code'], (int, decimal.Decimal)) else None
-                    if item_zip in zip_codes:
-                        logger.debug(f"Zip code match found: {item_zip} in {zip_codes}")
-                        zip_match = True
-                except (ValueError, TypeError) as e:
-                    logger.warning(f"Error comparing zip code: {e} for item {item_id}")
-            elif 'Zipcode' in item:  # Check alternative field name
-                try:
-                    item_zip = int(item['Zipcode']) if item['Zipcode'].isdigit() else None
-                    if item_zip in zip_codes:
-                        logger.debug(f"Zipcode match found: {item_zip} in {zip_codes}")
-                        zip_match = True
-                except (ValueError, TypeError, AttributeError) as e:
-                    logger.warning(f"Error comparing zipcode: {e} for item {item_id}")
-
-            # Check service category match (if service_categories is provided)
-            category_match = False
-            if not service_categories:
-                category_match = True
-            elif 'Service Category Type' in item:
-                for category in service_categories:
-                    if category in item['Service Category Type'].lower():
-                        logger.debug(f"Service category match found: '{category}' in '{item['Service Category Type']}'")
-                        category_match = True
-                        break
-
-            # Check city match (if cities is provided)
-            city_match = False
-            if not cities:
-                city_match = True
-            elif 'City' in item:
-                for city in cities:
-                    if city in item['City'].lower():
-                        logger.debug(f"City match found: '{city}' in '{item['City']}'")
-                        city_match = True
-                        break
-
-            # Include item if it matches at least one criterion
-            if agency_match or zip_match or category_match or city_match:
-                logger.debug(f"Adding item {item_id} to results. Matches: Agency={agency_match}, Zip={zip_match}, Category={category_match}, City={city_match}")
-                filtered_items.append(item)
-                matches_found += 1
-            else:
-                logger.debug(f"Item {item_id} did not match any criteria")
-
-        logger.info(f"Search complete. Found {matches_found} matches out of {len(items)} items.")
-        return filtered_items
-
-    except Exception as e:
-        logger.error(f"Error performing search: {str(e)}", exc_info=True)
-        raise e
-    """
-    Perform a search based on the provided parameters
-    Supports search by agency names, zip codes, service categories, or cities
-    """
-    try:
-        # Get all items from DynamoDB
-        response = table.scan()
-        items = response.get('Items', [])
-
-        # Handle pagination for large datasets
-        while 'LastEvaluatedKey' in response:
-            response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
-            items.extend(response.get('Items', []))
-
-        # Filter items based on search criteria
-        filtered_items = []
-
-        # Extract search parameters
-        agency_names = search_params.get('Agency Names', [])
-        zip_codes = search_params.get('Service Area Zip Codes', [])
-        service_categories = search_params.get('Service Category Types', [])
-        cities = search_params.get('Cities', [])
-
-        # Convert zip codes to integers if they're provided
-        try:
-            zip_codes = [int(zip_code) for zip_code in zip_codes]
-        except (ValueError, TypeError):
-            # Handle case where zip codes might not be valid integers
-            zip_codes = []
-
-        # Case-insensitive search for text fields
-        agency_names = [name.lower() if name else "" for name in agency_names]
-        service_categories = [category.lower() if category else "" for category in service_categories]
-        cities = [city.lower() if city else "" for city in cities]
-
-        # Filter the items
-        for item in items:
-            # If no search parameters are provided, include all items
-            if not any([agency_names, zip_codes, service_categories, cities]):
-                filtered_items.append(item)
-                continue
-
-            # Check agency name match (if agency_names is provided)
-            agency_match = not agency_names or (
-                'Agency Name' in item and
-                any(name in item['Agency Name'].lower() for name in agency_names)
-            )
-
-            # Check zip code match (if zip_codes is provided)
-            zip_match = not zip_codes or (
-                'Service Area Zip Code' in item and
-                (isinstance(item['Service Area Zip Code'], (int, decimal.Decimal)) and int(item['Service Area Zip Code']) in zip_codes)
-            )
-
-            # Check service category match (if service_categories is provided)
-            category_match = not service_categories or (
-                'Service Category Type' in item and
-                any(category in item['Service Category Type'].lower() for category in service_categories)
-            )
-
-            # Check city match (if cities is provided)
-            city_match = not cities or (
-                'City' in item and
-                any(city in item['City'].lower() for city in cities)
-            )
-
-            # Include item if it matches at least one criterion
-            if agency_match or zip_match or category_match or city_match:
-                filtered_items.append(item)
-
-        return filtered_items
-    except Exception as e:
-        print(f"Error performing search: {str(e)}")
-        raise e
-
 def build_response(status_code, body):
     """
     Build a standardized API response with custom JSON encoder
@@ -0,0 +1,85 @@
+import json
+import base64
+import decimal
+from typing import Dict, Any, Optional, List, Tuple
+
+class DecimalEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, decimal.Decimal):
+            return float(obj)
+        return super(DecimalEncoder, self).default(obj)
+
+def encode_cursor(state: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    Encode paging state (a LastEvaluatedKey or a result offset) as an opaque, URL-safe cursor
+
+    Returns:
+        Optional[str]: The cursor, or None when there are no more pages
+    """
+    if not state:
+        return None
+    raw = json.dumps(state, cls=DecimalEncoder, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Decode a cursor produced by encode_cursor
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')), parse_float=decimal.Decimal)
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(state, dict):
+        raise ValueError('Invalid cursor')
+    return state
+
+def pack_frames(items: List[Dict[str, Any]], byte_budget: int) -> List[List[Dict[str, Any]]]:
+    """
+    Split items into groups whose serialized size stays under a byte budget,
+    so each group fits in one WebSocket frame. An item larger than the budget gets its own group.
+    """
+    frames = []
+    current = []
+    current_size = 0
+
+    for item in items:
+        # +1 for the separating comma in the serialized list
+        size = len(json.dumps(item, cls=DecimalEncoder).encode('utf-8')) + 1
+        if current and current_size + size > byte_budget:
+            frames.append(current)
+            current = []
+            current_size = 0
+        current.append(item)
+        current_size += size
+
+    if current or not frames:
+        frames.append(current)
+    return frames
+
+def page_bounds(total: int, cursor: Optional[str], page: Optional[int], page_size: int) -> Tuple[int, int]:
+    """
+    Work out which slice of an in-memory result list a request asks for.
+    A cursor (from a previous page) takes precedence over a page number.
+
+    Args:
+        total: Number of results
+        cursor: Cursor returned with the previous page
+        page: Zero-based page number
+        page_size: Results per page
+
+    Returns:
+        Tuple[int, int]: Start and end offsets
+    """
+    state = decode_cursor(cursor)
+    if state is not None:
+        start = int(state.get('offset', 0))
+    else:
+        start = max(int(page or 0), 0) * page_size
+    start = min(max(start, 0), total)
+    return start, min(start + page_size, total)
@@ -0,0 +1,250 @@
+import time
+import decimal
+import logging
+import threading
+from typing import Dict, Any, Optional, List, Iterable, Set, Tuple
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Posting lists are sets of document ids. A search materializes the postings of its most
+# selective criterion only and checks the other criteria against each candidate's own values,
+# and facets are counted over the result rows, so a search costs the size of its smallest
+# criterion plus its result set rather than the size of the table.
+
+def trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def item_agency(item: Dict[str, Any]) -> Optional[str]:
+    value = item.get('Agency Name') or item.get('Organization')
+    return str(value) if value else None
+
+def item_zip(item: Dict[str, Any]) -> Optional[int]:
+    """
+    Zip code used for search matching. 'Service Area Zip Code' wins when present
+    (and only counts if numeric); 'Zipcode' is used for older items without it.
+    """
+    if 'Service Area Zip Code' in item:
+        value = item['Service Area Zip Code']
+        if isinstance(value, (int, decimal.Decimal)) and not isinstance(value, bool):
+            return int(value)
+        return None
+    if 'Zipcode' in item and str(item['Zipcode']).isdigit():
+        return int(item['Zipcode'])
+    return None
+
+def item_text(item: Dict[str, Any], key: str) -> Optional[str]:
+    value = item.get(key)
+    return str(value) if value else None
+
+class SubstringField:
+    """
+    Case-insensitive substring index over one text attribute.
+    Documents are grouped by distinct value, and a trigram index over the distinct
+    values narrows down which values can contain a search term.
+    """
+
+    def __init__(self):
+        self.postings = {}   # value -> set of documents with that value
+        self.lowered = {}    # value -> lowercased value
+        self.trigrams = {}   # trigram -> set of values containing it
+
+    def add(self, doc_id: int, value: Optional[str]) -> None:
+        if not value:
+            return
+        if value not in self.postings:
+            self.postings[value] = set()
+            self.lowered[value] = value.lower()
+            for trigram in trigrams(self.lowered[value]):
+                self.trigrams.setdefault(trigram, set()).add(value)
+        self.postings[value].add(doc_id)
+
+    def remove(self, doc_id: int, value: Optional[str]) -> None:
+        if not value or value not in self.postings:
+            return
+        self.postings[value].discard(doc_id)
+        if not self.postings[value]:
+            # Drop values no document uses anymore so they stop being candidates
+            for trigram in trigrams(self.lowered[value]):
+                values = self.trigrams.get(trigram)
+                if values is not None:
+                    values.discard(value)
+                    if not values:
+                        del self.trigrams[trigram]
+            del self.postings[value]
+            del self.lowered[value]
+
+    def values_containing(self, term: str) -> Iterable[str]:
+        """
+        Distinct values that contain a lowercased search term
+        """
+        term_trigrams = trigrams(term)
+        if not term_trigrams:
+            # Terms shorter than a trigram are checked against every distinct value
+            candidates = self.postings.keys()
+        else:
+            candidate_sets = sorted((self.trigrams.get(trigram, set()) for trigram in term_trigrams), key=len)
+            candidates = set.intersection(*candidate_sets)
+        return [value for value in candidates if term in self.lowered[value]]
+
+    def values_matching(self, terms: List[str]) -> Set[str]:
+        """
+        Distinct values that contain any of the terms
+        """
+        return {value for term in terms for value in self.values_containing(term)}
+
+class SearchIndex:
+    """
+    In-memory search index over the Referrals table.
+    Matches agency/organization, city and category by substring and zip codes exactly,
+    with AND semantics across criteria and OR within a criterion.
+    """
+
+    def __init__(self, items: Iterable[Dict[str, Any]] = ()):
+        self.built_at = time.time()
+        self.documents = {}       # doc id -> item
+        self.doc_keys = {}        # doc id -> (agency, city, category, zip) it is indexed under
+        self.doc_ids = {}         # referral_id -> doc id
+        self.free_doc_ids = []    # ids of removed documents, reused so ids stay below the item count
+        self.agency = SubstringField()
+        self.city = SubstringField()
+        self.category = SubstringField()
+        self.zip_postings = {}    # zip -> set of documents
+
+        for item in items:
+            self.upsert(item)
+
+    def upsert(self, item: Dict[str, Any]) -> None:
+        """
+        Add an item, replacing any indexed item with the same referral_id
+        """
+        referral_id = item.get('referral_id')
+        if referral_id is not None:
+            self.remove(referral_id)
+
+        doc_id = self.free_doc_ids.pop() if self.free_doc_ids else len(self.documents)
+        keys = (item_agency(item), item_text(item, 'City'), item_text(item, 'Service Category Type'), item_zip(item))
+        self.documents[doc_id] = item
+        self.doc_keys[doc_id] = keys
+        if referral_id is not None:
+            self.doc_ids[referral_id] = doc_id
+
+        agency, city, category, zip_code = keys
+        self.agency.add(doc_id, agency)
+        self.city.add(doc_id, city)
+        self.category.add(doc_id, category)
+        if zip_code is not None:
+            self.zip_postings.setdefault(zip_code, set()).add(doc_id)
+
+    def remove(self, referral_id: str) -> None:
+        """
+        Remove the item with this referral_id, if it is indexed
+        """
+        doc_id = self.doc_ids.pop(referral_id, None)
+        if doc_id is None:
+            return
+
+        del self.documents[doc_id]
+        agency, city, category, zip_code = self.doc_keys.pop(doc_id)
+        self.free_doc_ids.append(doc_id)
+        self.agency.remove(doc_id, agency)
+        self.city.remove(doc_id, city)
+        self.category.remove(doc_id, category)
+        if zip_code in self.zip_postings:
+            self.zip_postings[zip_code].discard(doc_id)
+            if not self.zip_postings[zip_code]:
+                del self.zip_postings[zip_code]
+
+    def search(self, agency_names: List[str], zip_codes: List[int],
+               service_categories: List[str], cities: List[str]) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, int]]]:
+        """
+        Run a search. Text terms must already be lowercased.
+
+        Returns:
+            Tuple[List[Dict[str, Any]], Dict[str, Dict[str, int]]]: Matching items in document id
+            order, and per-category / per-city counts over the matches
+        """
+        # (position in doc_keys, accepted keys, postings of each accepted key) per criterion
+        criteria = []
+        if agency_names:
+            values = self.agency.values_matching(agency_names)
+            criteria.append((0, values, [self.agency.postings[value] for value in values]))
+        if zip_codes:
+            zips = {zip_code for zip_code in zip_codes if zip_code in self.zip_postings}
+            criteria.append((3, zips, [self.zip_postings[zip_code] for zip_code in zips]))
+        if service_categories:
+            values = self.category.values_matching(service_categories)
+            criteria.append((2, values, [self.category.postings[value] for value in values]))
+        if cities:
+            values = self.city.values_matching(cities)
+            criteria.append((1, values, [self.city.postings[value] for value in values]))
+
+        if not criteria:
+            doc_ids = sorted(self.documents)
+        else:
+            # Candidates come from the criterion with the fewest documents; the rest are checked per candidate
+            criteria.sort(key=lambda criterion: sum(len(postings) for postings in criterion[2]))
+            _, _, smallest = criteria[0]
+            candidates = set().union(*smallest)
+            doc_ids = sorted(doc_id for doc_id in candidates
+                             if all(self.doc_keys[doc_id][position] in accepted for position, accepted, _ in criteria[1:]))
+
+        results = [self.documents[doc_id] for doc_id in doc_ids]
+        return results, facet_counts(results)
+
+def facet_counts(items: List[Dict[str, Any]]) -> Dict[str, Dict[str, int]]:
+    """
+    Per-category / per-city counts over a list of search results
+    """
+    facets = {'Service Category Type': {}, 'City': {}}
+    for item in items:
+        for key, counts in facets.items():
+            value = item.get(key)
+            if value:
+                counts[str(value)] = counts.get(str(value), 0) + 1
+    return facets
+
+# Per-container index, rebuilt from the table when it is older than the TTL
+# so writes made through other containers are picked up
+_index_lock = threading.Lock()
+_index = None
+
+def get_search_index(load_items, ttl_seconds: int) -> Optional[SearchIndex]:
+    """
+    Return the container's search index, building it with load_items() when missing or expired
+
+    Returns:
+        Optional[SearchIndex]: The index, or None if it could not be built
+    """
+    global _index
+
+    if _index is not None and time.time() - _index.built_at < ttl_seconds:
+        return _index
+
+    with _index_lock:
+        if _index is not None and time.time() - _index.built_at < ttl_seconds:
+            return _index
+        try:
+            start = time.time()
+            _index = SearchIndex(load_items())
+            logger.info(f"Built search index over {len(_index.documents)} referrals in {(time.time() - start) * 1000:.1f} ms")
+        except Exception as e:
+            logger.error(f"Error building search index: {str(e)}")
+            # Keep serving the previous index if there is one
+        return _index
+
+def index_upsert(item: Dict[str, Any]) -> None:
+    """
+    Apply a created/updated referral to the index, if this container has one
+    """
+    with _index_lock:
+        if _index is not None:
+            _index.upsert(item)
+
+def index_remove(referral_id: str) -> None:
+    """
+    Apply a deleted referral to the index, if this container has one
+    """
+    with _index_lock:
+        if _index is not None:
+            _index.remove(referral_id)
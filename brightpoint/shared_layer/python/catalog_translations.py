@@ -0,0 +1,93 @@
+import os
+import json
+import hashlib
+from typing import Any, Dict, List, Optional
+import translation_engine
+
+# Referral text fields stored in every catalog language next to the English value
+CATALOG_TRANSLATED_FIELDS = ('Organization', 'Hours', 'Eligibility Requirements', 'Service Availability', 'Referral Process')
+CATALOG_TRANSLATION_LANGUAGES = tuple(
+    code.strip() for code in os.environ.get('CATALOG_TRANSLATION_LANGUAGES', 'es,pl').split(',') if code.strip()
+)
+# Fingerprint of the English fields the stored translations were made from
+SOURCE_ATTRIBUTE = 'translations_source'
+
+def localized_attribute(field: str, language_code: str) -> str:
+    return f"{field}#{language_code}"
+
+# Every attribute catalog translation adds to an item, so they can be left out of English output
+LOCALIZED_ATTRIBUTES = frozenset(
+    [localized_attribute(field, code) for field in CATALOG_TRANSLATED_FIELDS for code in CATALOG_TRANSLATION_LANGUAGES]
+    + [SOURCE_ATTRIBUTE]
+)
+
+def english_value(item: Dict[str, Any], field: str) -> Optional[str]:
+    value = item.get(field)
+    if value is None and field == 'Organization':
+        # Older rows were imported with the CSV's byte order mark in the column name
+        value = item.get('\ufeffOrganization')
+    return value if isinstance(value, str) and value.strip() else None
+
+def source_fingerprint(item: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps([english_value(item, field) for field in CATALOG_TRANSLATED_FIELDS]).encode('utf-8')).hexdigest()
+
+def has_current_translations(item: Dict[str, Any]) -> bool:
+    """
+    Whether the item's stored translations were made from its current English fields
+    """
+    return item.get(SOURCE_ATTRIBUTE) == source_fingerprint(item)
+
+def localized_fields(item: Dict[str, Any], language_code: str) -> Dict[str, str]:
+    """
+    The item's stored translations into a language, by English field name.
+    Empty when the language isn't stored or the English fields have changed since.
+    """
+    if language_code not in CATALOG_TRANSLATION_LANGUAGES or not has_current_translations(item):
+        return {}
+    localized = {}
+    for field in CATALOG_TRANSLATED_FIELDS:
+        value = item.get(localized_attribute(field, language_code))
+        if english_value(item, field) and isinstance(value, str) and value:
+            localized[field] = value
+    return localized
+
+def translate_catalog_items(items: List[Dict[str, Any]], translate_client: Any) -> List[Dict[str, str]]:
+    """
+    Translate the text fields of referral items about to be written into every catalog language.
+    Items whose English fields haven't changed since they were translated are skipped, and the
+    texts of all the other items are translated together, each distinct text once.
+
+    Args:
+        items: Items in the shape the boto3 DynamoDB resource takes
+        translate_client: AWS Translate client
+
+    Returns:
+        List[Dict[str, str]]: For each item, the attributes to set on it (empty when its
+        translations are current). The fingerprint is only included when every field translated,
+        so an item with a failed translation is retried on its next write.
+    """
+    updates = [{} for _ in items]
+    stale = [i for i, item in enumerate(items) if not has_current_translations(item)]
+    if not stale:
+        return updates
+
+    texts = [english_value(items[i], field) for i in stale for field in CATALOG_TRANSLATED_FIELDS]
+    complete = set(stale)
+    for code in CATALOG_TRANSLATION_LANGUAGES:
+        translations, failed = translation_engine.translate_strings([text for text in texts if text], 'en', code, translate_client)
+        failed = set(failed)
+        for i in stale:
+            for field in CATALOG_TRANSLATED_FIELDS:
+                text = english_value(items[i], field)
+                if not text:
+                    continue
+                if text in failed:
+                    complete.discard(i)
+                else:
+                    updates[i][localized_attribute(field, code)] = translations.get(text, text)
+
+    for i in complete:
+        updates[i][SOURCE_ATTRIBUTE] = source_fingerprint(items[i])
+    print(f"Translated {len(stale)} of {len(items)} catalog items into {', '.join(CATALOG_TRANSLATION_LANGUAGES)} "
+          f"({len(stale) - len(complete)} incomplete)")
+    return updates
@@ -0,0 +1,109 @@
+import string
+from typing import Dict, Tuple
+
+# Fixed system messages in every supported language, by message id. Placeholders are
+# str.format fields and must be the same in every language of a message.
+MESSAGES = {
+    "missing_user_id": {
+        "en": "Missing required parameter: user_id",
+        "es": "Falta el parámetro obligatorio: user_id",
+        "pl": "Brak wymaganego parametru: user_id"
+    },
+    "missing_query": {
+        "en": "I didn't receive a question. Please provide a query about services you're looking for.",
+        "es": "No recibí ninguna pregunta. Escriba una consulta sobre los servicios que está buscando.",
+        "pl": "Nie otrzymałem pytania. Napisz zapytanie dotyczące usług, których szukasz."
+    },
+    "searching_wider": {
+        "en": "No exact matches yet, searching wider for services...",
+        "es": "Aún no hay coincidencias exactas, ampliando la búsqueda de servicios...",
+        "pl": "Brak dokładnych dopasowań, rozszerzam wyszukiwanie usług..."
+    },
+    "query_error": {
+        "en": "Error processing query",
+        "es": "Error al procesar la consulta",
+        "pl": "Błąd podczas przetwarzania zapytania"
+    },
+    "request_error": {
+        "en": "I encountered an error while processing your request. Please try again or rephrase your question.",
+        "es": "Se produjo un error al procesar su solicitud. Inténtelo de nuevo o reformule su pregunta.",
+        "pl": "Wystąpił błąd podczas przetwarzania Twojej prośby. Spróbuj ponownie lub sformułuj pytanie inaczej."
+    },
+    "user_not_found": {
+        "en": "User not found",
+        "es": "Usuario no encontrado",
+        "pl": "Nie znaleziono użytkownika"
+    },
+    "user_data_retrieved": {
+        "en": "User data retrieved successfully.",
+        "es": "Los datos del usuario se recuperaron correctamente.",
+        "pl": "Dane użytkownika zostały pobrane."
+    },
+    "user_data_error": {
+        "en": "Error retrieving user data",
+        "es": "Error al recuperar los datos del usuario",
+        "pl": "Błąd podczas pobierania danych użytkownika"
+    },
+    "feedback_question": {
+        "en": "Hi {user_id}, Did the referral {agency}, {address}, {zipcode} help you in {service_category}? Please reply with yes or no.",
+        "es": "Hola {user_id}, ¿le ayudó la referencia {agency}, {address}, {zipcode} con {service_category}? Responda sí o no.",
+        "pl": "Cześć {user_id}, czy skierowanie {agency}, {address}, {zipcode} pomogło Ci w sprawie {service_category}? Odpowiedz tak lub nie."
+    },
+    "services_found": {
+        "en": "Here are {service_category} services.",
+        "es": "Aquí están los servicios de {service_category}.",
+        "pl": "Oto usługi {service_category}."
+    },
+    "services_found_in_zipcode": {
+        "en": "Here are {service_category} services in {zipcode}.",
+        "es": "Aquí están los servicios de {service_category} en {zipcode}.",
+        "pl": "Oto usługi {service_category} w {zipcode}."
+    }
+}
+
+def _placeholders(template: str) -> frozenset:
+    return frozenset(field for _, field, _, _ in string.Formatter().parse(template) if field is not None)
+
+def _compile(messages: Dict[str, Dict[str, str]]) -> Dict[Tuple[str, str], Tuple[str, frozenset]]:
+    """
+    Index every usable (message id, language) variant with its placeholders. A variant whose
+    placeholders differ from the English message's is left out, so it falls back to English.
+    """
+    compiled = {}
+    for message_id, variants in messages.items():
+        english_fields = _placeholders(variants['en'])
+        for language_code, template in variants.items():
+            fields = _placeholders(template)
+            if fields != english_fields:
+                print(f"Message {message_id} ({language_code}) has placeholders {sorted(fields)}, "
+                      f"expected {sorted(english_fields)}; using English")
+                continue
+            compiled[(message_id, language_code)] = (template, fields)
+    return compiled
+
+# Compiled once per container, when the module is first imported
+_compiled = _compile(MESSAGES)
+LANGUAGES = frozenset(language_code for _, language_code in _compiled)
+
+def has_message(message_id: str, language_code: str) -> bool:
+    return (message_id, language_code) in _compiled
+
+def get_message(message_id: str, language_code: str = 'en', **values: str) -> str:
+    """
+    A fixed message in a language, with its placeholders filled in. No Translate request is made.
+
+    Args:
+        message_id (str): Key of the message in MESSAGES
+        language_code (str): Language code ('en', 'es', 'pl'); other languages get English
+        **values: Value of each of the message's placeholders
+
+    Returns:
+        str: The message
+
+    Raises:
+        KeyError: For an unknown message id, or a placeholder without a value
+    """
+    template, fields = _compiled.get((message_id, language_code)) or _compiled[(message_id, 'en')]
+    if not fields:
+        return template
+    return template.format(**{field: values[field] for field in fields})
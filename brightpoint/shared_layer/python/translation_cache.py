@@ -0,0 +1,228 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import boto3
+
+# Shared tier: AWS Translate results, readable by every container of every Lambda using this layer
+translation_cache_table = boto3.resource('dynamodb', region_name='us-east-1').Table(
+    os.environ.get('TRANSLATION_CACHE_TABLE', 'translation_cache')
+)
+
+TRANSLATION_CACHE_ENABLED = os.environ.get('TRANSLATION_CACHE_ENABLED', 'true').lower() == 'true'
+# How long a shared entry lives (enforced by the table's TTL on expires_at)
+TRANSLATION_CACHE_TTL_SECONDS = int(os.environ.get('TRANSLATION_CACHE_TTL_SECONDS', str(90 * 24 * 60 * 60)))
+# Maximum number of entries in the per-container tier
+TRANSLATION_CACHE_MAX_ENTRIES = int(os.environ.get('TRANSLATION_CACHE_MAX_ENTRIES', '5000'))
+# Longer texts (whole Perplexity responses etc.) are one-offs and go straight to Translate
+TRANSLATION_CACHE_MAX_TEXT_CHARS = int(os.environ.get('TRANSLATION_CACHE_MAX_TEXT_CHARS', '2000'))
+
+# Per-container tier: cache key -> translated text, least recently used first
+_lru_lock = threading.Lock()
+_lru = OrderedDict()
+
+# Counters since the container started, and for the current invocation.
+# characters_saved is what Translate would have billed for the hits.
+cache_stats = {"memory_hits": 0, "dynamodb_hits": 0, "misses": 0, "evictions": 0, "writes": 0,
+               "uncached": 0, "characters_saved": 0, "characters_translated": 0}
+invocation_stats = dict.fromkeys(cache_stats, 0)
+
+def cache_key(text: str, source_language: str, target_language: str) -> str:
+    return f"{source_language}#{target_language}#{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+def is_cacheable(text: str) -> bool:
+    return TRANSLATION_CACHE_ENABLED and len(text) <= TRANSLATION_CACHE_MAX_TEXT_CHARS
+
+def _count(counter: str, amount: int = 1) -> None:
+    cache_stats[counter] += amount
+    invocation_stats[counter] += amount
+
+def _remember(key: str, translated_text: str) -> None:
+    with _lru_lock:
+        _lru[key] = translated_text
+        _lru.move_to_end(key)
+        while len(_lru) > TRANSLATION_CACHE_MAX_ENTRIES:
+            _lru.popitem(last=False)
+            _count("evictions")
+
+def get_cached_translation(text: str, source_language: str, target_language: str) -> Optional[str]:
+    """
+    Look up a previous translation of this exact text between these languages
+
+    Returns:
+        Optional[str]: The translated text, or None on a miss
+    """
+    key = cache_key(text, source_language, target_language)
+
+    with _lru_lock:
+        translated_text = _lru.get(key)
+        if translated_text is not None:
+            _lru.move_to_end(key)
+    if translated_text is not None:
+        _count("memory_hits")
+        _count("characters_saved", len(text))
+        return translated_text
+
+    try:
+        item = translation_cache_table.get_item(Key={'cache_key': key}).get('Item')
+        # TTL deletion can lag by hours, so check expiry here too
+        if item and int(item.get('expires_at', 0)) > time.time():
+            translated_text = item['translated_text']
+            _remember(key, translated_text)
+            _count("dynamodb_hits")
+            _count("characters_saved", len(text))
+            return translated_text
+    except Exception as e:
+        print(f"Error reading translation cache: {str(e)}")
+
+    _count("misses")
+    return None
+
+def put_cached_translation(text: str, source_language: str, target_language: str, translated_text: str) -> None:
+    """
+    Store a successful translation in both tiers
+    """
+    key = cache_key(text, source_language, target_language)
+    _remember(key, translated_text)
+
+    try:
+        now = int(time.time())
+        translation_cache_table.put_item(Item={
+            'cache_key': key,
+            'source_language': source_language,
+            'target_language': target_language,
+            'translated_text': translated_text,
+            'created_at': now,
+            'expires_at': now + TRANSLATION_CACHE_TTL_SECONDS
+        })
+        _count("writes")
+    except Exception as e:
+        print(f"Error writing translation cache: {str(e)}")
+
+def get_cached_translations(texts: List[str], source_language: str, target_language: str) -> Dict[str, str]:
+    """
+    Look up many texts at once: the in-memory tier first, then one BatchGetItem per 100 texts
+
+    Returns:
+        Dict[str, str]: Translated text for each text found
+    """
+    found = {}
+    remaining = {}
+    for text in dict.fromkeys(texts):
+        key = cache_key(text, source_language, target_language)
+        with _lru_lock:
+            translated_text = _lru.get(key)
+            if translated_text is not None:
+                _lru.move_to_end(key)
+        if translated_text is not None:
+            found[text] = translated_text
+            _count("memory_hits")
+            _count("characters_saved", len(text))
+        else:
+            remaining[key] = text
+
+    keys = list(remaining)
+    table_hits = 0
+    now = time.time()
+    for i in range(0, len(keys), 100):
+        request = {translation_cache_table.name: {'Keys': [{'cache_key': key} for key in keys[i:i + 100]]}}
+        try:
+            while request:
+                response = translation_cache_table.meta.client.batch_get_item(RequestItems=request)
+                for item in response.get('Responses', {}).get(translation_cache_table.name, []):
+                    text = remaining.get(item['cache_key'])
+                    if text is not None and int(item.get('expires_at', 0)) > now:
+                        found[text] = item['translated_text']
+                        _remember(item['cache_key'], item['translated_text'])
+                        _count("dynamodb_hits")
+                        _count("characters_saved", len(text))
+                        table_hits += 1
+                request = response.get('UnprocessedKeys')
+        except Exception as e:
+            print(f"Error reading translation cache: {str(e)}")
+
+    _count("misses", len(remaining) - table_hits)
+    return found
+
+def put_cached_translations(translations: Dict[str, str], source_language: str, target_language: str) -> None:
+    """
+    Store many successful translations in both tiers, writing the table in batches
+    """
+    if not translations:
+        return
+    now = int(time.time())
+    try:
+        with translation_cache_table.batch_writer(overwrite_by_pkeys=['cache_key']) as batch:
+            for text, translated_text in translations.items():
+                key = cache_key(text, source_language, target_language)
+                _remember(key, translated_text)
+                batch.put_item(Item={
+                    'cache_key': key,
+                    'source_language': source_language,
+                    'target_language': target_language,
+                    'translated_text': translated_text,
+                    'created_at': now,
+                    'expires_at': now + TRANSLATION_CACHE_TTL_SECONDS
+                })
+                _count("writes")
+    except Exception as e:
+        print(f"Error writing translation cache: {str(e)}")
+
+def record_translated(characters: int) -> None:
+    """
+    Count characters sent to Translate outside translate(), for the characters saved comparison
+    """
+    _count("characters_translated", characters)
+
+def translate(text: str, source_language: str, target_language: str, translate_client: Any) -> str:
+    """
+    Translate text with AWS Translate, reusing earlier translations of the same text
+
+    Args:
+        text (str): Text to translate
+        source_language (str): Source language code
+        target_language (str): Target language code
+        translate_client: The caller's AWS Translate client
+
+    Returns:
+        str: Translated text
+
+    Raises:
+        Whatever the Translate call raises; failed translations aren't cached
+    """
+    if not text or source_language == target_language:
+        return text
+
+    cacheable = is_cacheable(text)
+    if cacheable:
+        translated_text = get_cached_translation(text, source_language, target_language)
+        if translated_text is not None:
+            return translated_text
+    else:
+        _count("uncached")
+
+    response = translate_client.translate_text(
+        Text=text,
+        SourceLanguageCode=source_language,
+        TargetLanguageCode=target_language
+    )
+    translated_text = response['TranslatedText']
+    _count("characters_translated", len(text))
+
+    if cacheable:
+        put_cached_translation(text, source_language, target_language, translated_text)
+    return translated_text
+
+def log_invocation_stats() -> None:
+    """
+    Log this invocation's cache counters next to the container totals, then reset them
+    """
+    if any(invocation_stats.values()):
+        lookups = cache_stats["memory_hits"] + cache_stats["dynamodb_hits"] + cache_stats["misses"]
+        hit_rate = (cache_stats["memory_hits"] + cache_stats["dynamodb_hits"]) / lookups if lookups else 0.0
+        print(f"Translation cache: invocation {invocation_stats}, container {cache_stats}, "
+              f"hit rate {hit_rate:.1%}, {len(_lru)} entries in memory")
+    for counter in invocation_stats:
+        invocation_stats[counter] = 0
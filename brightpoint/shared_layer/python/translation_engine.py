@@ -0,0 +1,251 @@
+import os
+import re
+import html
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+import translation_cache
+
+# Texts packed into one TranslateDocument request, in bytes of HTML (the synchronous limit is 100 KB)
+TRANSLATION_BATCH_MAX_BYTES = int(os.environ.get('TRANSLATION_BATCH_MAX_BYTES', '90000'))
+# Translate requests in flight at once for one response
+TRANSLATION_CONCURRENCY = int(os.environ.get('TRANSLATION_CONCURRENCY', '4'))
+# Attempts per request when Translate throttles, including the first
+TRANSLATION_MAX_ATTEMPTS = int(os.environ.get('TRANSLATION_MAX_ATTEMPTS', '4'))
+TRANSLATION_BACKOFF_BASE_SECONDS = float(os.environ.get('TRANSLATION_BACKOFF_BASE_SECONDS', '0.2'))
+TRANSLATION_BACKOFF_MAX_SECONDS = float(os.environ.get('TRANSLATION_BACKOFF_MAX_SECONDS', '5'))
+
+THROTTLING_ERRORS = {'ThrottlingException', 'TooManyRequestsException', 'ServiceUnavailableException'}
+
+# Each text is one <div> of the HTML document; line breaks become <br/> so they survive
+SEGMENT_PATTERN = re.compile(r'<div[^>]*>(.*?)</div>', re.S | re.I)
+BREAK_PATTERN = re.compile(r'<br\s*/?>', re.I)
+
+# Delay every request waits before starting; doubles when Translate throttles and decays on success,
+# so all workers in the container slow down together
+_throttle_lock = threading.Lock()
+_throttle_delay = 0.0
+
+# Per-container counters
+engine_stats = {"texts": 0, "duplicates": 0, "cached": 0, "requests": 0, "documents": 0, "throttled": 0, "failed": 0}
+
+def is_translatable(text: Any) -> bool:
+    return isinstance(text, str) and bool(text.strip()) and text != "-"
+
+def encode_segment(text: str) -> str:
+    return f"<div>{html.escape(text, quote=False).replace(chr(10), '<br/>')}</div>"
+
+def decode_segments(document: str) -> List[str]:
+    return [html.unescape(BREAK_PATTERN.sub('\n', segment.strip())) for segment in SEGMENT_PATTERN.findall(document)]
+
+def pack_batches(texts: List[str]) -> List[List[str]]:
+    """
+    Split texts into as few batches as fit in TRANSLATION_BATCH_MAX_BYTES each, keeping their order
+    """
+    batches = []
+    current = []
+    size = 0
+    for text in texts:
+        segment_size = len(encode_segment(text).encode('utf-8'))
+        if current and size + segment_size > TRANSLATION_BATCH_MAX_BYTES:
+            batches.append(current)
+            current = []
+            size = 0
+        current.append(text)
+        size += segment_size
+    if current:
+        batches.append(current)
+    return batches
+
+def _error_code(error: Exception) -> str:
+    return getattr(error, 'response', {}).get('Error', {}).get('Code', '')
+
+def _wait_for_throttle() -> None:
+    delay = _throttle_delay
+    if delay > 0:
+        time.sleep(random.uniform(delay / 2, delay))
+
+def _record_throttle() -> None:
+    global _throttle_delay
+    with _throttle_lock:
+        _throttle_delay = min(TRANSLATION_BACKOFF_MAX_SECONDS, max(TRANSLATION_BACKOFF_BASE_SECONDS, _throttle_delay * 2))
+    engine_stats["throttled"] += 1
+
+def _record_success() -> None:
+    global _throttle_delay
+    with _throttle_lock:
+        _throttle_delay = _throttle_delay / 2 if _throttle_delay > TRANSLATION_BACKOFF_BASE_SECONDS else 0.0
+
+def _call_with_backoff(call: Callable[[], Any]) -> Any:
+    """
+    Make a Translate request, retrying it while Translate throttles
+
+    Raises:
+        The request's error when it isn't throttling, or when attempts run out
+    """
+    for attempt in range(TRANSLATION_MAX_ATTEMPTS):
+        _wait_for_throttle()
+        engine_stats["requests"] += 1
+        try:
+            result = call()
+            _record_success()
+            return result
+        except Exception as e:
+            if _error_code(e) not in THROTTLING_ERRORS or attempt + 1 == TRANSLATION_MAX_ATTEMPTS:
+                raise
+            _record_throttle()
+            print(f"Translate throttled, retrying (attempt {attempt + 1})")
+
+def _translate_one(text: str, source_language: str, target_language: str, translate_client: Any) -> str:
+    response = _call_with_backoff(lambda: translate_client.translate_text(
+        Text=text,
+        SourceLanguageCode=source_language,
+        TargetLanguageCode=target_language
+    ))
+    return response['TranslatedText']
+
+def _translate_batch(batch: List[str], source_language: str, target_language: str, translate_client: Any) -> Dict[str, str]:
+    """
+    Translate a batch as one HTML document, or the text itself when it's alone.
+    A batch whose document doesn't come back segment for segment is translated text by text.
+
+    Returns:
+        Dict[str, str]: Translation of each text that could be translated
+    """
+    translations = {}
+    if len(batch) > 1:
+        document = ''.join(encode_segment(text) for text in batch)
+        try:
+            engine_stats["documents"] += 1
+            response = _call_with_backoff(lambda: translate_client.translate_document(
+                Document={'Content': document.encode('utf-8'), 'ContentType': 'text/html'},
+                SourceLanguageCode=source_language,
+                TargetLanguageCode=target_language
+            ))
+            segments = decode_segments(response['TranslatedDocument']['Content'].decode('utf-8'))
+            if len(segments) == len(batch):
+                translation_cache.record_translated(sum(len(text) for text in batch))
+                return dict(zip(batch, segments))
+            print(f"Translated document has {len(segments)} segments for {len(batch)} texts, translating them one by one")
+        except Exception as e:
+            print(f"Error translating document of {len(batch)} texts, translating them one by one: {str(e)}")
+
+    for text in batch:
+        try:
+            translations[text] = _translate_one(text, source_language, target_language, translate_client)
+            translation_cache.record_translated(len(text))
+        except Exception as e:
+            print(f"Error translating text: {str(e)}")
+    return translations
+
+def translate_strings(texts: Iterable[str], source_language: str, target_language: str,
+                      translate_client: Any) -> Tuple[Dict[str, str], List[str]]:
+    """
+    Translate many texts with as few Translate requests as possible: duplicates are translated
+    once, cached translations are reused, and the rest are packed into HTML documents
+    translated TRANSLATION_CONCURRENCY at a time.
+
+    Args:
+        texts (Iterable[str]): Texts to translate, in any order, duplicates allowed
+        source_language (str): Source language code
+        target_language (str): Target language code
+        translate_client: The caller's AWS Translate client
+
+    Returns:
+        Tuple: Translation of every translatable text (a text that failed maps to itself),
+        and the texts that failed
+    """
+    texts = [text for text in texts if is_translatable(text)]
+    unique_texts = list(dict.fromkeys(texts))
+    if not unique_texts or source_language == target_language:
+        return {text: text for text in unique_texts}, []
+
+    start = time.perf_counter()
+    engine_stats["texts"] += len(texts)
+    engine_stats["duplicates"] += len(texts) - len(unique_texts)
+
+    cacheable = [text for text in unique_texts if translation_cache.is_cacheable(text)]
+    translations = translation_cache.get_cached_translations(cacheable, source_language, target_language) if cacheable else {}
+    engine_stats["cached"] += len(translations)
+
+    missing = [text for text in unique_texts if text not in translations]
+    batches = pack_batches(missing)
+    if len(batches) > 1 and TRANSLATION_CONCURRENCY > 1:
+        with ThreadPoolExecutor(max_workers=min(TRANSLATION_CONCURRENCY, len(batches))) as executor:
+            results = list(executor.map(
+                lambda batch: _translate_batch(batch, source_language, target_language, translate_client), batches
+            ))
+    else:
+        results = [_translate_batch(batch, source_language, target_language, translate_client) for batch in batches]
+
+    translated = {}
+    for result in results:
+        translated.update(result)
+    translation_cache.put_cached_translations(
+        {text: translation for text, translation in translated.items() if translation_cache.is_cacheable(text)},
+        source_language, target_language
+    )
+    translations.update(translated)
+
+    failed = [text for text in missing if text not in translated]
+    engine_stats["failed"] += len(failed)
+    print(f"Translated {len(texts)} texts to {target_language} ({len(texts) - len(unique_texts)} duplicates, "
+          f"{len(unique_texts) - len(missing)} cached, {len(missing)} in {len(batches)} batches, {len(failed)} failed) "
+          f"in {(time.perf_counter() - start) * 1000:.0f} ms; container {engine_stats}")
+
+    for text in missing:
+        translations.setdefault(text, text)
+    return translations, failed
+
+def _walk(data: Any, skip_keys: Iterable[str], visit: Callable[[str], str]) -> Any:
+    """
+    Rebuild a response tree with visit applied to every translatable string, except
+    values under skip_keys (and empty values) in dicts
+    """
+    if isinstance(data, dict):
+        result = {}
+        for key, value in data.items():
+            if key in skip_keys or not value:
+                result[key] = value
+            elif isinstance(value, (dict, list)):
+                result[key] = _walk(value, skip_keys, visit)
+            else:
+                result[key] = visit(value) if is_translatable(value) else value
+        return result
+    if isinstance(data, list):
+        return [_walk(item, skip_keys, visit) if isinstance(item, (dict, list))
+                else visit(item) if is_translatable(item) else item
+                for item in data]
+    return data
+
+def translate_tree(data: Any, source_language: str, target_language: str, translate_client: Any,
+                   skip_keys: Iterable[str] = (), pretranslated: Iterable[str] = ()) -> Tuple[Any, int]:
+    """
+    Translate every string value in a nested dict/list response (keys stay as they are),
+    collecting the strings first so they're translated together by translate_strings
+
+    Args:
+        data: Dictionary or list containing response data
+        source_language (str): Source language code
+        target_language (str): Target language code
+        translate_client: The caller's AWS Translate client
+        skip_keys (Iterable[str]): Keys whose values are technical and stay untranslated
+        pretranslated (Iterable[str]): Values already in the target language, kept as they are
+
+    Returns:
+        Tuple: A new structure with translated string values, and how many texts failed
+    """
+    skip_keys = frozenset(skip_keys)
+    pretranslated = frozenset(pretranslated)
+    texts = []
+
+    def collect(text: str) -> str:
+        if text not in pretranslated:
+            texts.append(text)
+        return text
+
+    _walk(data, skip_keys, collect)
+    translations, failed = translate_strings(texts, source_language, target_language, translate_client)
+    return _walk(data, skip_keys, lambda text: text if text in pretranslated else translations.get(text, text)), len(failed)
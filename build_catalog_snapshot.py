@@ -0,0 +1,99 @@
+import os
+import sys
+import csv
+import boto3
+
+# Reuse the snapshot writer that ships with the chatbot Lambda
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'brightpoint', 'referral_chatbot'))
+from catalogSnapshot import write_catalog_snapshot
+from csv_to_ddb import clean_csv_row
+
+def load_catalog_version(dynamodb, metadata_table_name='referral_catalog_metadata'):
+    """
+    Read the current catalog version from the catalog metadata item.
+    A snapshot tagged with it stays valid until the next referral write, whatever its age.
+
+    Returns:
+        int: The version, or None if the metadata item doesn't exist yet
+    """
+    response = dynamodb.Table(metadata_table_name).get_item(Key={'metadata_key': 'service_categories'})
+    version = response.get('Item', {}).get('version')
+    return int(version) if version is not None else None
+
+def load_items_from_table(table_name, region='us-east-1', profile_name='Brightpoint'):
+    """
+    Read every referral from DynamoDB with a paginated Scan.
+
+    Args:
+        table_name (str): Name of the referral table
+        region (str): AWS region name (default: 'us-east-1')
+        profile_name (str): AWS profile name (default: 'Brightpoint')
+
+    Returns:
+        tuple: (items in the shape the chatbot reads them, catalog version read before the scan)
+    """
+    session = boto3.Session(profile_name=profile_name)
+    dynamodb = session.resource('dynamodb', region_name=region)
+    table = dynamodb.Table(table_name)
+
+    # Read the version first, so a write during the scan leaves the snapshot marked as older
+    catalog_version = load_catalog_version(dynamodb)
+
+    response = table.scan()
+    items = response.get('Items', [])
+    while 'LastEvaluatedKey' in response:
+        response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+        items.extend(response.get('Items', []))
+
+    return items, catalog_version
+
+def load_items_from_csv(csv_file_path):
+    """
+    Read referrals from the same CSV that csv_to_ddb.py imports.
+    Note: referral_id values are generated, so they won't match the table. The chatbot
+    ignores snapshots built this way; they are for local benchmarks only.
+
+    Args:
+        csv_file_path (str): Path to the CSV file
+
+    Returns:
+        list: Items cleaned the same way csv_to_ddb.py cleans them
+    """
+    with open(csv_file_path, 'r', encoding='utf-8') as file:
+        return [clean_csv_row(row) for row in csv.DictReader(file)]
+
+def build_catalog_snapshot(output_path, table_name=None, csv_file_path=None, region='us-east-1', profile_name='Brightpoint'):
+    """
+    Compile the referral catalog into the snapshot file loaded by the chatbot Lambda.
+
+    Args:
+        output_path (str): Where to write the snapshot
+        table_name (str): Referral table to read (used when set)
+        csv_file_path (str): CSV file to read when no table name is given
+        region (str): AWS region name (default: 'us-east-1')
+        profile_name (str): AWS profile name (default: 'Brightpoint')
+    """
+    catalog_version = None
+    if table_name:
+        items, catalog_version = load_items_from_table(table_name, region, profile_name)
+        source = "table"
+    else:
+        items = load_items_from_csv(csv_file_path)
+        source = "csv"
+        print("Building from the CSV: the chatbot Lambda won't load this snapshot, build from the table to deploy")
+
+    header = write_catalog_snapshot(items, output_path, catalog_version=catalog_version, source=source)
+    print(f"Wrote {header['row_count']} referrals "
+          f"({len(header['dictionaries']['Service Category Type'])} categories) to {output_path} "
+          f"({os.path.getsize(output_path)} bytes)")
+
+if __name__ == "__main__":
+    # Define your variables here
+    output_path = "brightpoint/referral_chatbot/catalog_snapshot.bin"
+    table_name = "referral_data"   # Set to None to build from the CSV instead
+    csv_file_path = "ProviderReferralData.csv"
+    region = "us-east-1"
+    profile_name = "Brightpoint"
+
+    # Build the snapshot
+    build_catalog_snapshot(output_path, table_name, csv_file_path, region, profile_name)
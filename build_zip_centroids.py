@@ -0,0 +1,81 @@
+import io
+import csv
+import zipfile
+import urllib.request
+
+# Census Bureau ZIP Code Tabulation Area gazetteer (internal point latitude/longitude per ZCTA)
+GAZETTEER_URL = "https://www2.census.gov/geo/docs/maps-data/data/gazetteer/2023_Gazetteer/2023_Gaz_zcta_national.zip"
+
+def download_gazetteer(url):
+    """
+    Download the gazetteer archive and return its rows.
+
+    Args:
+        url (str): URL of the zipped, tab-separated gazetteer file
+
+    Returns:
+        list: Rows as dictionaries with stripped column names
+    """
+    print(f"Downloading {url}...")
+    with urllib.request.urlopen(url) as response:
+        archive = zipfile.ZipFile(io.BytesIO(response.read()))
+
+    name = archive.namelist()[0]
+    text = archive.read(name).decode('utf-8')
+    reader = csv.DictReader(io.StringIO(text), delimiter='\t')
+    # The last header in the gazetteer has trailing whitespace
+    return [{key.strip(): value.strip() for key, value in row.items() if key} for row in reader]
+
+def load_zipcodes_package():
+    """
+    Read zip coordinates from the `zipcodes` package (pip install zipcodes), which bundles
+    them, for building the table without downloading the gazetteer
+
+    Returns:
+        list: (zip, latitude, longitude) for every active zip with coordinates
+    """
+    import zipcodes
+
+    return [(row['zip_code'], row['lat'], row['long']) for row in zipcodes.list_all()
+            if row.get('active') and row.get('lat') and row.get('long')]
+
+def build_zip_centroids(output_path, zip_prefixes=None, source='gazetteer', url=GAZETTEER_URL):
+    """
+    Write the zip centroid table loaded by the chatbot Lambda for nearby zip search.
+
+    Args:
+        output_path (str): Where to write the CSV
+        zip_prefixes (tuple): Only keep zips starting with one of these prefixes (default: all)
+        source (str): 'gazetteer' (Census ZCTA internal points) or 'zipcodes' (the zipcodes package)
+        url (str): Gazetteer URL
+    """
+    if source == 'zipcodes':
+        centroids = load_zipcodes_package()
+    else:
+        centroids = [(row['GEOID'], row['INTPTLAT'], row['INTPTLONG']) for row in download_gazetteer(url)]
+
+    written = 0
+    with open(output_path, 'w', newline='', encoding='utf-8') as output:
+        writer = csv.writer(output)
+        writer.writerow(['zip', 'lat', 'lon'])
+        for zip_code, lat, lon in sorted(centroids):
+            if zip_prefixes and not zip_code.startswith(tuple(zip_prefixes)):
+                continue
+            writer.writerow([zip_code, lat, lon])
+            written += 1
+
+    print(f"Wrote {written} zip centroids to {output_path}")
+
+if __name__ == "__main__":
+    # Define your variables here
+    output_path = "brightpoint/referral_chatbot/zip_centroids.csv"
+    # Illinois and nearby zips; set to None to include the whole country
+    zip_prefixes = ("600", "601", "602", "603", "604", "605", "606", "607", "608", "609",
+                    "610", "611", "612", "613", "614", "615", "616", "617", "618", "619",
+                    "620", "622", "623", "624", "625", "626", "627", "628", "629",
+                    "460", "463", "464", "530", "531", "535")
+    # The committed table was built from the zipcodes package; 'gazetteer' downloads the Census file
+    source = "zipcodes"
+
+    # Build the centroid table
+    build_zip_centroids(output_path, zip_prefixes, source)
@@ -2,9 +2,124 @@ import boto3
 import csv
 import uuid
 from decimal import Decimal
+from datetime import datetime
+from botocore.exceptions import ClientError
 import os
+import sys
 
-def import_csv_to_dynamodb(csv_file_path, table_name, region='us-east-1', profile_name='default'):
+# Catalog translations are made with the shared layer's modules, like the referrals API does
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'brightpoint', 'shared_layer', 'python'))
+import translation_cache
+import catalog_translations
+
+def clean_csv_row(row):
+    """
+    Convert one CSV row into a referral_data item.
+
+    Args:
+        row (dict): Row from csv.DictReader
+
+    Returns:
+        dict: Item with cleaned keys, numeric values as Decimal and new referral_id/id values
+    """
+    # Create a clean item dictionary
+    item = {}
+
+    for key, value in row.items():
+        # Remove any non-printable characters and strip spaces
+        clean_key = ''.join(char for char in key if char.isprintable()).strip()
+
+        # Fix specifically for "Organization" field
+        if "Organization" in clean_key:
+            clean_key = "Organization"  # Force correct key name
+
+        # Skip columns with no header name
+        if not clean_key or clean_key == '':
+            continue
+
+        if 'referral_id' not in item:
+            item['referral_id'] = str(uuid.uuid4())
+
+        if clean_key.lower() == 'zipcode' or clean_key.lower() == 'zip_code' or clean_key.lower() == 'zip':
+            if value is None or value.strip() == '':
+                # Use a default value for empty zipcodes
+                item[clean_key] = "00000"
+            else:
+                item[clean_key] = value
+        # Handle all other fields
+        else:
+            # Skip empty values for other fields
+            if value is None or value.strip() == '':
+                continue
+
+            # Try to convert to Decimal if it's a number
+            try:
+                float_val = float(value)
+                item[clean_key] = Decimal(str(float_val))
+            except (ValueError, TypeError):
+                # Keep as string if not a number
+                item[clean_key] = value
+
+    # Add a unique ID if not present
+    if 'id' not in item:
+        item['id'] = str(uuid.uuid4())
+
+    return item
+
+def update_catalog_metadata(dynamodb, category_counts, metadata_table_name='referral_catalog_metadata'):
+    """
+    Add imported referrals to the catalog metadata item the chatbot reads its category list from,
+    and bump the catalog version so chatbot containers reload their catalog.
+    If the item doesn't exist yet, the chatbot builds it from a full scan on first use.
+
+    Args:
+        dynamodb: DynamoDB resource
+        category_counts (dict): Number of imported referrals per category
+        metadata_table_name (str): Name of the catalog metadata table
+    """
+    update_expression = "SET #updated_at = :updated_at ADD #version :one"
+    names = {'#version': 'version', '#updated_at': 'updated_at'}
+    values = {':one': Decimal(1), ':updated_at': datetime.now().isoformat()}
+    if category_counts:
+        names['#counts'] = 'category_counts'
+    for i, (category, count) in enumerate(category_counts.items()):
+        update_expression += f", #counts.#cat{i} :count{i}"
+        names[f'#cat{i}'] = category
+        values[f':count{i}'] = Decimal(count)
+
+    try:
+        dynamodb.Table(metadata_table_name).update_item(
+            Key={'metadata_key': 'service_categories'},
+            UpdateExpression=update_expression,
+            ConditionExpression="attribute_exists(metadata_key)",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+        print(f"Updated catalog metadata for {len(category_counts)} categories")
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            print("Catalog metadata item doesn't exist yet; the chatbot will build it on first use")
+        else:
+            print(f"Error updating catalog metadata: {str(e)}")
+
+def add_catalog_translations(session, dynamodb, items, region='us-east-1'):
+    """
+    Store Spanish and Polish versions of each item's text fields on it (see catalog_translations).
+    Texts repeated across rows are translated once, and texts translated before come from
+    the translation_cache table.
+
+    Args:
+        session: boto3 session to translate with
+        dynamodb: DynamoDB resource
+        items (list): Items about to be imported, updated in place
+    """
+    translation_cache.translation_cache_table = dynamodb.Table('translation_cache')
+    translate_client = session.client('translate', region_name=region)
+    for item, attributes in zip(items, catalog_translations.translate_catalog_items(items, translate_client)):
+        item.update(attributes)
+    translation_cache.log_invocation_stats()
+
+def import_csv_to_dynamodb(csv_file_path, table_name, region='us-east-1', profile_name='default', translate=True):
     """
     Import data from a CSV file to a DynamoDB table.
 
@@ -13,6 +128,7 @@ def import_csv_to_dynamodb(csv_file_path, table_name, region='us-east-1', profil
         table_name (str): Name of the DynamoDB table
         region (str): AWS region name (default: 'us-east-1')
         profile_name (str): AWS profile name (default: 'default')
+        translate (bool): Store Spanish and Polish versions of the referral text fields (default: True)
     """
     # Create a boto3 session with the specified profile
     session = boto3.Session(profile_name="Brightpoint")
@@ -33,56 +149,23 @@ def import_csv_to_dynamodb(csv_file_path, table_name, region='us-east-1', profil
         # Track imported items
         item_count = 0
         error_count = 0
+        category_counts = {}
 
-        # Process each row
-        for row in csv_reader:
-            # Create a clean item dictionary
-            item = {}
-
-            for key, value in row.items():
-                # Remove any non-printable characters and strip spaces
-                clean_key = ''.join(char for char in key if char.isprintable()).strip()
-
-                # Fix specifically for "Organization" field
-                if "Organization" in clean_key:
-                    clean_key = "Organization"  # Force correct key name
-
-                # Skip columns with no header name
-                if not clean_key or clean_key == '':
-                    continue
-
-                if 'referral_id' not in item:
-                    item['referral_id'] = str(uuid.uuid4())
-
-                if clean_key.lower() == 'zipcode' or clean_key.lower() == 'zip_code' or clean_key.lower() == 'zip':
-                    if value is None or value.strip() == '':
-                        # Use a default value for empty zipcodes
-                        item[clean_key] = "00000"
-                    else:
-                        item[clean_key] = value
-                # Handle all other fields
-                else:
-                    # Skip empty values for other fields
-                    if value is None or value.strip() == '':
-                        continue
-
-                    # Try to convert to Decimal if it's a number
-                    try:
-                        float_val = float(value)
-                        item[clean_key] = Decimal(str(float_val))
-                    except (ValueError, TypeError):
-                        # Keep as string if not a number
-                        item[clean_key] = value
-
-            # Add a unique ID if not present
-            if 'id' not in item:
-                item['id'] = str(uuid.uuid4())
+        items = [clean_csv_row(row) for row in csv_reader]
+        if translate and items and table_name == 'referral_data':
+            add_catalog_translations(session, dynamodb, items, region)
 
+        # Process each row
+        for item in items:
             try:
                 # Insert into DynamoDB
                 table.put_item(Item=item)
                 item_count += 1
 
+                category = item.get('Service Category Type')
+                if category:
+                    category_counts[category] = category_counts.get(category, 0) + 1
+
                 # Print progress every 10 items
                 if item_count % 10 == 0:
                     print(f"Progress: {item_count} items imported...")
@@ -93,12 +176,16 @@ def import_csv_to_dynamodb(csv_file_path, table_name, region='us-east-1', profil
 
         print(f"Import complete: {item_count} items imported successfully, {error_count} errors")
 
+        if item_count and table_name == 'referral_data':
+            update_catalog_metadata(dynamodb, category_counts)
+
 if __name__ == "__main__":
     # Define your variables here
     csv_file_path = "ProviderReferralData.csv"
     table_name = "referral_data"
     region = "us-east-1"
     profile_name = "default"
+    translate = True   # Translate the referral text fields into Spanish and Polish while importing
 
     # Run the import
-    import_csv_to_dynamodb(csv_file_path, table_name, region, profile_name)
\ No newline at end of file
+    import_csv_to_dynamodb(csv_file_path, table_name, region, profile_name, translate)
\ No newline at end of file
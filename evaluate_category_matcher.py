@@ -0,0 +1,138 @@
+import os
+import sys
+import csv
+import time
+import boto3
+
+# Evaluate the matcher that ships with the chatbot Lambda (needs NumPy installed locally)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'brightpoint', 'referral_chatbot'))
+import categoryMatcher
+
+def load_labels_from_csv(csv_file_path):
+    """
+    Read a labeled query set from a CSV with "query" and "categories" columns
+    (categories separated by semicolons)
+
+    Returns:
+        list: (query, set of categories) pairs
+    """
+    labeled = []
+    with open(csv_file_path, 'r', encoding='utf-8-sig') as csvfile:
+        for row in csv.DictReader(csvfile):
+            categories = {category.strip() for category in (row.get('categories') or '').split(';') if category.strip()}
+            if row.get('query'):
+                labeled.append((row['query'], categories))
+    return labeled
+
+def load_labels_from_user_data(dynamodb, table_name='user_data'):
+    """
+    Use the categories Bedrock extracted for stored user queries (written onto each query
+    by query-analytics-backfill) as labels
+
+    Returns:
+        list: (query, set of categories) pairs
+    """
+    table = dynamodb.Table(table_name)
+    labeled = []
+    scan_args = {'ProjectionExpression': 'queries'}
+    while True:
+        response = table.scan(**scan_args)
+        for item in response.get('Items', []):
+            for query in (item.get('queries') or {}).values():
+                text = query.get('english_query') or query.get('query')
+                if text and 'service_categories' in query:
+                    labeled.append((text, set(query['service_categories'])))
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return labeled
+
+def load_categories(dynamodb, metadata_table_name='referral_catalog_metadata'):
+    """
+    Read the live category list from the catalog metadata item
+
+    Returns:
+        list: Categories with at least one referral, or None if the item doesn't exist
+    """
+    response = dynamodb.Table(metadata_table_name).get_item(Key={'metadata_key': 'service_categories'})
+    counts = response.get('Item', {}).get('category_counts')
+    if counts is None:
+        return None
+    return sorted(category for category, count in counts.items() if count > 0)
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def evaluate_category_matcher(csv_file_path=None, region='us-east-1', profile_name='Brightpoint',
+                              thresholds=(0.1, 0.15, 0.2, 0.25, 0.3, 0.35)):
+    """
+    Report the category matcher's latency and how often it agrees with Bedrock's labels.
+
+    Args:
+        csv_file_path (str): Labeled query CSV; when None, labels are read from user_data
+        region (str): AWS region name (default: 'us-east-1')
+        profile_name (str): AWS profile name (default: 'Brightpoint')
+        thresholds (tuple): CATEGORY_MATCHER_MIN_SCORE values to report answer-mode results for
+    """
+    session = boto3.Session(profile_name=profile_name)
+    dynamodb = session.resource('dynamodb', region_name=region)
+
+    labeled = load_labels_from_csv(csv_file_path) if csv_file_path else load_labels_from_user_data(dynamodb)
+    labeled = [(query, categories) for query, categories in labeled if categories]
+    categories = load_categories(dynamodb) or sorted(set().union(*(labels for _, labels in labeled)))
+    if not labeled:
+        print("No labeled queries found")
+        return
+
+    start = time.perf_counter()
+    categoryMatcher.get_model(categories)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    timings = []
+    scored = []
+    for query, labels in labeled:
+        start = time.perf_counter()
+        scores = categoryMatcher.score_categories(query, categories)
+        timings.append((time.perf_counter() - start) * 1000)
+        scored.append((scores, labels))
+
+    top_agreement = sum(1 for scores, labels in scored if scores[0][0] in labels) / len(scored)
+    top_k = categoryMatcher.CATEGORY_MATCHER_PRUNE_TOP_K
+    prune_recall = sum(1 for scores, labels in scored
+                       if labels <= {category for category, _ in scores[:top_k]}) / len(scored)
+
+    print(f"{len(labeled)} labeled queries, {len(categories)} categories")
+    print(f"Model build: {build_ms:.1f} ms")
+    print(f"Scoring latency: p50 {percentile(timings, 0.5):.3f} ms, p95 {percentile(timings, 0.95):.3f} ms, "
+          f"max {max(timings):.3f} ms")
+    print(f"Top category agrees with Bedrock: {top_agreement:.1%}")
+    print(f"All of Bedrock's categories in the top {top_k} (prune mode): {prune_recall:.1%}")
+
+    print("Answer mode by CATEGORY_MATCHER_MIN_SCORE:")
+    for threshold in thresholds:
+        answered = 0
+        exact = 0
+        overlap = 0.0
+        for scores, labels in scored:
+            if scores[0][1] < threshold:
+                continue
+            cutoff = max(threshold, scores[0][1] * categoryMatcher.RELATIVE_SCORE)
+            predicted = {category for category, score in scores if score >= cutoff}
+            answered += 1
+            exact += predicted == labels
+            overlap += len(predicted & labels) / len(predicted | labels)
+        if answered:
+            print(f"  {threshold:.2f}: answers {answered / len(scored):.1%} of queries, "
+                  f"exact match {exact / answered:.1%}, mean Jaccard {overlap / answered:.2f}")
+        else:
+            print(f"  {threshold:.2f}: answers no queries")
+
+if __name__ == "__main__":
+    # Define your variables here
+    csv_file_path = None   # e.g. "labeled_queries.csv"; None reads Bedrock's labels from user_data
+    region = "us-east-1"
+    profile_name = "Brightpoint"
+
+    # Run the evaluation
+    evaluate_category_matcher(csv_file_path, region, profile_name)
@@ -0,0 +1,141 @@
+import os
+import sys
+import time
+import random
+import boto3
+from botocore.exceptions import ClientError
+
+# Reuse the key function the Perplexity Lambda looks entries up with
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'brightpoint', 'perplexity_lambda'))
+from lambda_function import cache_query_id
+
+def rekey_cache_entries(table):
+    """
+    Move perplexity_query_cache entries stored under random query_ids to the deterministic
+    key for their query and zipcode. When several entries share a key, the most recent one is kept.
+
+    Args:
+        table: DynamoDB Table resource for perplexity_query_cache
+
+    Returns:
+        dict: Old query_id -> new query_id for every entry that was moved or dropped
+    """
+    moved_count = 0
+    dropped_count = 0
+    renamed = {}
+
+    response = table.scan()
+    while True:
+        for item in response.get('Items', []):
+            query = item.get('normalized_query') or item.get('english_query')
+            if not query:
+                continue
+            zipcode = item.get('zipcode')
+            new_id = cache_query_id(query, None if zipcode == "none" else zipcode)
+            if item['query_id'] == new_id:
+                continue
+
+            try:
+                # Only replace an entry under the new key if this one is more recent
+                table.put_item(
+                    Item=dict(item, query_id=new_id),
+                    ConditionExpression="attribute_not_exists(query_id) OR #ts < :ts",
+                    ExpressionAttributeNames={'#ts': 'timestamp'},
+                    ExpressionAttributeValues={':ts': item.get('timestamp', '')}
+                )
+                moved_count += 1
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                dropped_count += 1
+
+            table.delete_item(Key={'query_id': item['query_id']})
+            renamed[item['query_id']] = new_id
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+
+    print(f"Re-keyed {moved_count} cache entries, dropped {dropped_count} older duplicates")
+    return renamed
+
+def rekey_semantic_index(table, renamed):
+    """
+    Point perplexity_semantic_index entries at the cache entries' new query_ids
+    """
+    updated_count = 0
+
+    response = table.scan()
+    while True:
+        for item in response.get('Items', []):
+            new_id = renamed.get(item['query_id'])
+            if not new_id:
+                continue
+            table.put_item(Item=dict(item, query_id=new_id))
+            table.delete_item(Key={'zip_bucket': item['zip_bucket'], 'query_id': item['query_id']})
+            updated_count += 1
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+
+    print(f"Updated {updated_count} semantic index entries")
+
+def measure_lookup_latency(table, client, table_name, samples=200):
+    """
+    Time keyed lookups for a sample of cache entries, next to the table's size,
+    to confirm a lookup costs the same however large the table is
+    """
+    keys = []
+    response = table.scan(ProjectionExpression='query_id', Limit=1000)
+    keys.extend(item['query_id'] for item in response.get('Items', []))
+    if not keys:
+        print("Cache is empty, nothing to measure")
+        return
+
+    timings = []
+    for query_id in random.sample(keys, min(samples, len(keys))):
+        start = time.perf_counter()
+        table.get_item(Key={'query_id': query_id})
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+
+    item_count = client.describe_table(TableName=table_name)['Table']['ItemCount']
+    print(f"GetItem latency over {len(timings)} lookups with ~{item_count} entries: "
+          f"p50 {timings[len(timings) // 2]:.1f} ms, p95 {timings[int(len(timings) * 0.95)]:.1f} ms")
+
+def migrate_perplexity_cache_keys(table_name, semantic_index_table_name, region='us-east-1', profile_name='Brightpoint'):
+    """
+    Re-key the Perplexity response cache so lookups are a single GetItem.
+
+    Args:
+        table_name (str): Name of the Perplexity response cache table
+        semantic_index_table_name (str): Name of the semantic cache index table
+        region (str): AWS region name (default: 'us-east-1')
+        profile_name (str): AWS profile name (default: 'Brightpoint')
+    """
+    session = boto3.Session(profile_name=profile_name)
+    dynamodb = session.resource('dynamodb', region_name=region)
+    client = session.client('dynamodb', region_name=region)
+    table = dynamodb.Table(table_name)
+
+    renamed = rekey_cache_entries(table)
+
+    try:
+        rekey_semantic_index(dynamodb.Table(semantic_index_table_name), renamed)
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ResourceNotFoundException':
+            raise
+        print(f"{semantic_index_table_name} doesn't exist, skipping")
+
+    measure_lookup_latency(table, client, table_name)
+
+if __name__ == "__main__":
+    # Define your variables here
+    table_name = "perplexity_query_cache"
+    semantic_index_table_name = "perplexity_semantic_index"
+    region = "us-east-1"
+    profile_name = "Brightpoint"
+
+    # Run the migration
+    migrate_perplexity_cache_keys(table_name, semantic_index_table_name, region, profile_name)
@@ -0,0 +1,97 @@
+import os
+import sys
+import time
+import boto3
+from datetime import datetime
+from botocore.exceptions import ClientError
+
+# Reuse the encoding and lifetimes the Perplexity Lambda stores entries with
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'brightpoint', 'perplexity_lambda'))
+from lambda_function import encode_cached_response, PERPLEXITY_CACHE_FRESH_SECONDS, PERPLEXITY_CACHE_TTL_SECONDS
+
+def enable_ttl(client, table_name):
+    """
+    Turn on DynamoDB TTL on the expires_at attribute (the table predates the stack, so CDK can't)
+    """
+    try:
+        client.update_time_to_live(
+            TableName=table_name,
+            TimeToLiveSpecification={'Enabled': True, 'AttributeName': 'expires_at'}
+        )
+        print(f"Enabled TTL on {table_name}.expires_at")
+    except ClientError as e:
+        if 'already enabled' in str(e).lower():
+            print(f"TTL already enabled on {table_name}")
+        else:
+            raise
+
+def compress_cache_entries(table):
+    """
+    Convert entries stored as nested response_data maps to compressed response_blob
+    attributes, and give them the lifetimes new entries get, counted from when they were stored
+    """
+    converted_count = 0
+    original_bytes = 0
+    compressed_bytes = 0
+
+    response = table.scan()
+    while True:
+        for item in response.get('Items', []):
+            if 'response_data' not in item:
+                continue
+
+            try:
+                stored_at = int(datetime.fromisoformat(item['timestamp']).timestamp())
+            except (KeyError, ValueError):
+                stored_at = int(time.time())
+
+            response_blob = encode_cached_response(item['response_data'])
+            table.update_item(
+                Key={'query_id': item['query_id']},
+                UpdateExpression="SET response_blob = :blob, size_bytes = :size, stored_at = :stored_at, "
+                                 "stale_at = :stale_at, expires_at = :expires_at, "
+                                 "hit_count = if_not_exists(hit_count, :zero) REMOVE response_data",
+                ExpressionAttributeValues={
+                    ':blob': response_blob,
+                    ':size': len(response_blob),
+                    ':stored_at': stored_at,
+                    ':stale_at': stored_at + PERPLEXITY_CACHE_FRESH_SECONDS,
+                    ':expires_at': stored_at + PERPLEXITY_CACHE_TTL_SECONDS,
+                    ':zero': 0
+                }
+            )
+            converted_count += 1
+            original_bytes += len(str(item['response_data']))
+            compressed_bytes += len(response_blob)
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+
+    print(f"Compressed {converted_count} cache entries "
+          f"(~{original_bytes} bytes of response data down to {compressed_bytes} bytes)")
+
+def migrate_perplexity_cache_storage(table_name, region='us-east-1', profile_name='Brightpoint'):
+    """
+    Move the Perplexity response cache to compressed storage with TTL.
+
+    Args:
+        table_name (str): Name of the Perplexity response cache table
+        region (str): AWS region name (default: 'us-east-1')
+        profile_name (str): AWS profile name (default: 'Brightpoint')
+    """
+    session = boto3.Session(profile_name=profile_name)
+    dynamodb = session.resource('dynamodb', region_name=region)
+    client = session.client('dynamodb', region_name=region)
+
+    enable_ttl(client, table_name)
+    compress_cache_entries(dynamodb.Table(table_name))
+
+if __name__ == "__main__":
+    # Define your variables here
+    table_name = "perplexity_query_cache"
+    region = "us-east-1"
+    profile_name = "Brightpoint"
+
+    # Run the migration
+    migrate_perplexity_cache_storage(table_name, region, profile_name)
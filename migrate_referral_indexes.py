@@ -0,0 +1,137 @@
+import boto3
+import time
+from decimal import Decimal, InvalidOperation
+
+CATEGORY_ATTRIBUTE = "Service Category Type"
+ZIP_ATTRIBUTE = "Service Area Zip Code"
+
+# Secondary indexes used for key-based lookups by the chatbot and the referrals API
+REFERRAL_INDEXES = [
+    {
+        "IndexName": "ServiceCategory-Zip-index",
+        "KeySchema": [
+            {"AttributeName": CATEGORY_ATTRIBUTE, "KeyType": "HASH"},
+            {"AttributeName": ZIP_ATTRIBUTE, "KeyType": "RANGE"}
+        ],
+        "Projection": {"ProjectionType": "ALL"}
+    },
+    {
+        "IndexName": "ServiceAreaZip-index",
+        "KeySchema": [
+            {"AttributeName": ZIP_ATTRIBUTE, "KeyType": "HASH"}
+        ],
+        "Projection": {"ProjectionType": "ALL"}
+    }
+]
+
+def backfill_index_attributes(table):
+    """
+    Normalize the index key attributes on existing items so every referral can be indexed.
+
+    - Copies the category from the BOM-prefixed column name ("\ufeffService Category Type")
+      into "Service Category Type" where only the former exists
+    - Converts string zip codes in "Service Area Zip Code" to numbers, since items whose key
+      attribute has the wrong type are rejected by the index
+
+    Args:
+        table: DynamoDB Table resource for referral_data
+    """
+    updated_count = 0
+    skipped_count = 0
+
+    response = table.scan()
+    while True:
+        for item in response.get('Items', []):
+            updates = {}
+
+            category = item.get(CATEGORY_ATTRIBUTE) or item.get("\ufeff" + CATEGORY_ATTRIBUTE)
+            if isinstance(category, str) and category.strip() and category != item.get(CATEGORY_ATTRIBUTE):
+                updates[CATEGORY_ATTRIBUTE] = category
+
+            zip_code = item.get(ZIP_ATTRIBUTE)
+            if isinstance(zip_code, str):
+                try:
+                    updates[ZIP_ATTRIBUTE] = Decimal(int(zip_code.strip()))
+                except (ValueError, InvalidOperation):
+                    print(f"Skipping non-numeric zip code '{zip_code}' for referral {item.get('referral_id')}")
+                    skipped_count += 1
+
+            if updates:
+                names = {f"#attr{i}": key for i, key in enumerate(updates)}
+                values = {f":val{i}": value for i, value in enumerate(updates.values())}
+                table.update_item(
+                    Key={'referral_id': item['referral_id']},
+                    UpdateExpression="SET " + ", ".join(f"#attr{i} = :val{i}" for i in range(len(updates))),
+                    ExpressionAttributeNames=names,
+                    ExpressionAttributeValues=values
+                )
+                updated_count += 1
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+
+    print(f"Backfill complete: {updated_count} items updated, {skipped_count} items skipped")
+
+def wait_for_index(client, table_name, index_name):
+    """
+    Wait until a global secondary index has finished backfilling and is ACTIVE
+    """
+    while True:
+        description = client.describe_table(TableName=table_name)['Table']
+        indexes = {index['IndexName']: index['IndexStatus'] for index in description.get('GlobalSecondaryIndexes', [])}
+        status = indexes.get(index_name)
+        if status == 'ACTIVE':
+            print(f"Index {index_name} is ACTIVE")
+            return
+        print(f"Waiting for index {index_name} (status: {status})...")
+        time.sleep(30)
+
+def create_referral_indexes(client, table_name):
+    """
+    Create the category/zip and zip indexes on referral_data if they don't exist yet.
+    DynamoDB only allows one index to be created per UpdateTable call.
+    """
+    description = client.describe_table(TableName=table_name)['Table']
+    existing = {index['IndexName'] for index in description.get('GlobalSecondaryIndexes', [])}
+
+    for index in REFERRAL_INDEXES:
+        if index['IndexName'] in existing:
+            print(f"Index {index['IndexName']} already exists")
+            continue
+
+        print(f"Creating index {index['IndexName']}...")
+        client.update_table(
+            TableName=table_name,
+            AttributeDefinitions=[
+                {"AttributeName": CATEGORY_ATTRIBUTE, "AttributeType": "S"},
+                {"AttributeName": ZIP_ATTRIBUTE, "AttributeType": "N"}
+            ],
+            GlobalSecondaryIndexUpdates=[{"Create": index}]
+        )
+        wait_for_index(client, table_name, index['IndexName'])
+
+def migrate_referral_indexes(table_name, region='us-east-1', profile_name='Brightpoint'):
+    """
+    Backfill index key attributes on existing referrals, then create the secondary indexes.
+
+    Args:
+        table_name (str): Name of the referral table
+        region (str): AWS region name (default: 'us-east-1')
+        profile_name (str): AWS profile name (default: 'Brightpoint')
+    """
+    session = boto3.Session(profile_name=profile_name)
+    dynamodb = session.resource('dynamodb', region_name=region)
+    client = session.client('dynamodb', region_name=region)
+
+    backfill_index_attributes(dynamodb.Table(table_name))
+    create_referral_indexes(client, table_name)
+
+if __name__ == "__main__":
+    # Define your variables here
+    table_name = "referral_data"   # Read by the chatbot and the referrals API (REFERRALS_TABLE_NAME)
+    region = "us-east-1"
+    profile_name = "Brightpoint"
+
+    # Run the migration
+    migrate_referral_indexes(table_name, region, profile_name)
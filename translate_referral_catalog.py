@@ -0,0 +1,82 @@
+import os
+import sys
+import boto3
+
+# Translate with the shared layer's modules, and bump the catalog version the way the CSV import does
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'brightpoint', 'shared_layer', 'python'))
+import translation_cache
+import catalog_translations
+from csv_to_ddb import update_catalog_metadata
+
+def translate_page(table, items, translate_client):
+    """
+    Store current Spanish and Polish translations on a page of referral items
+
+    Returns:
+        tuple: (items updated, items left without complete translations)
+    """
+    updated_count = 0
+    incomplete_count = 0
+    for item, attributes in zip(items, catalog_translations.translate_catalog_items(items, translate_client)):
+        if not attributes:
+            continue
+        if catalog_translations.SOURCE_ATTRIBUTE not in attributes:
+            incomplete_count += 1
+        names = {f'#a{i}': key for i, key in enumerate(attributes)}
+        table.update_item(
+            Key={'referral_id': item['referral_id']},
+            UpdateExpression="SET " + ", ".join(f"#a{i} = :v{i}" for i in range(len(attributes))),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues={f':v{i}': value for i, value in enumerate(attributes.values())}
+        )
+        updated_count += 1
+    return updated_count, incomplete_count
+
+def translate_referral_catalog(table_name, region='us-east-1', profile_name='Brightpoint'):
+    """
+    Translate the text fields of every referral whose translations are missing or older than
+    its English fields. Rows that are already current are skipped, so it's safe to run again.
+
+    Args:
+        table_name (str): Name of the referral table
+        region (str): AWS region name (default: 'us-east-1')
+        profile_name (str): AWS profile name (default: 'Brightpoint')
+    """
+    session = boto3.Session(profile_name=profile_name)
+    dynamodb = session.resource('dynamodb', region_name=region)
+    translate_client = session.client('translate', region_name=region)
+    translation_cache.translation_cache_table = dynamodb.Table('translation_cache')
+    table = dynamodb.Table(table_name)
+
+    scanned_count = 0
+    updated_count = 0
+    incomplete_count = 0
+    response = table.scan()
+    while True:
+        items = response.get('Items', [])
+        scanned_count += len(items)
+        updated, incomplete = translate_page(table, items, translate_client)
+        updated_count += updated
+        incomplete_count += incomplete
+        print(f"Progress: {scanned_count} referrals scanned, {updated_count} translated...")
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+
+    translation_cache.log_invocation_stats()
+    print(f"Translated {updated_count} of {scanned_count} referrals "
+          f"({incomplete_count} incomplete, retried on the next run)")
+
+    # Chatbot containers reload the catalog when its version changes
+    if updated_count and table_name == 'referral_data':
+        update_catalog_metadata(dynamodb, {})
+
+if __name__ == "__main__":
+    # Define your variables here
+    table_name = "referral_data"
+    region = "us-east-1"
+    profile_name = "Brightpoint"
+
+    # Run the translation
+    translate_referral_catalog(table_name, region, profile_name)